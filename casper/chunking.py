@@ -0,0 +1,174 @@
+"""Reads aligned to the on-disk chunking of a granule's variables.
+
+HDF5 decompresses whole chunks. When tiles cut across chunks, the same
+chunk is needed by several tiles and is decompressed again for each of
+them unless the variable's chunk cache still holds it. For every schema
+the chunk layout of its variables is read with netCDF4's ``chunking()``:
+
+- tiles along the sliced dimension are aligned to chunk boundaries, see
+  `casper.tiling.iter_tiles`
+- each variable's chunk cache is sized to hold the chunks later tiles
+  come back to, so every chunk is decompressed once per conversion
+
+Caches are bounded by the memory budget shared between the variables of
+the schema; variables needing more keep the library's default cache.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Mapping
+from logging import Logger
+from typing import TYPE_CHECKING, NamedTuple
+
+import netCDF4 as nc
+import numpy as np
+import xarray as xr
+
+from casper.tiling import dimension_sizes, estimate_row_bytes, split_dimension
+
+if TYPE_CHECKING:
+    from casper.session import GranuleSession
+
+# Module constants
+MIN_HASH_SLOTS = 1009
+HASH_SLOTS_PER_CHUNK = 10
+
+
+class ChunkLayout(NamedTuple):
+    """On-disk layout of one variable."""
+
+    chunks: dict[str, int] | None
+    itemsize: int
+
+    @classmethod
+    def of(cls, var: nc.Variable) -> ChunkLayout:
+        """Layout of a netCDF4 variable; contiguous variables have no chunks.
+
+        Variables of NETCDF3 files have no chunking at all and are read like
+        contiguous ones.
+        """
+        # Variable-length types, e.g. strings, have a str or VLType dtype and
+        # store a pointer per element in their chunks
+        itemsize = var.dtype.itemsize if isinstance(var.dtype, np.dtype) else 8
+        chunking = var.chunking()
+        if chunking == "contiguous" or chunking is None:
+            return cls(None, itemsize)
+        return cls(dict(zip(var.dimensions, chunking, strict=True)), itemsize)
+
+    @property
+    def chunk_bytes(self) -> int:
+        """Uncompressed size of one chunk."""
+        return math.prod((self.chunks or {}).values()) * self.itemsize
+
+
+def schema_chunks(dims: tuple[str, ...], layouts: list[ChunkLayout]) -> dict[str, int]:
+    """
+    Chunk length along each dimension of a schema.
+
+    The least common multiple of the chunk lengths of the chunked variables,
+    so a slab boundary on it is a chunk boundary for each of them.
+    """
+    chunks = {}
+    for dim in dims:
+        lengths = [
+            layout.chunks[dim] for layout in layouts if layout.chunks and dim in layout.chunks
+        ]
+        if lengths:
+            chunks[dim] = math.lcm(*lengths)
+    return chunks
+
+
+def cache_chunks(
+    layout: ChunkLayout, sizes: Mapping[str, int], split: str | None, step: int
+) -> int:
+    """
+    Number of chunks a variable's cache must hold to decompress each once.
+
+    Parameters
+    ----------
+    layout
+        Layout of the variable, whose dimensions are those of ``sizes``
+        in any order
+    sizes
+        Dimension lengths of the schema, in order
+    split
+        Dimension sliced into tiles, or None for a single tile
+    step
+        Slab length along the sliced dimension
+
+    Returns
+    -------
+    int
+        0 when no chunk is read by more than one tile
+    """
+    if split is None or layout.chunks is None:
+        return 0
+    dims = list(sizes)
+    k = dims.index(split)
+    chunks = [layout.chunks.get(dim, 1) for dim in dims]
+    counts = [math.ceil(sizes[dim] / chunk) for dim, chunk in zip(dims, chunks, strict=True)]
+    if any(chunk > 1 for chunk in chunks[:k]):
+        # Dimensions ahead of the split are read one index at a time, so every
+        # chunk from the split dimension inwards is read again for each index
+        return math.prod(counts[k:])
+    if step % chunks[k]:
+        # Tiles share the chunks on their boundaries
+        return min(2, counts[k]) * math.prod(counts[k + 1 :])
+    return 0
+
+
+def tune_chunk_caches(
+    session: GranuleSession,
+    ds: xr.Dataset,
+    vvs: list[str],
+    memory_budget: int,
+    logger: Logger,
+) -> dict[str, int]:
+    """
+    Size the chunk caches of a schema's variables for its tiles.
+
+    Parameters
+    ----------
+    session
+        Session holding the granule open
+    ds
+        Dataset holding the schema, as it is written
+    vvs
+        Variables of the schema
+    memory_budget
+        Approximate number of bytes each tile may use; the chunk caches of
+        the schema's variables share the same budget
+    logger
+        Logger instance for output messages
+
+    Returns
+    -------
+    dict[str, int]
+        Chunk length along each dimension, to align the tiles to
+    """
+    variables = {vv: session.dataset[vv] for vv in vvs}
+    layouts = {vv: ChunkLayout.of(var) for vv, var in variables.items()}
+    sizes = dimension_sizes(ds)
+    chunks = schema_chunks(tuple(sizes), list(layouts.values()))
+    split, step = split_dimension(sizes, estimate_row_bytes(ds), memory_budget, chunks)
+
+    cache_budget = memory_budget // max(1, len(vvs))
+    for vv, layout in layouts.items():
+        num_chunks = cache_chunks(layout, sizes, split, step)
+        if num_chunks == 0:
+            continue
+        cache_bytes = num_chunks * layout.chunk_bytes
+        if cache_bytes > cache_budget:
+            logger.debug(f"Chunk cache of {vv} would need {cache_bytes} bytes")
+            continue
+        slots = max(MIN_HASH_SLOTS, HASH_SLOTS_PER_CHUNK * num_chunks)
+        variables[vv].set_var_chunk_cache(size=cache_bytes, nelems=_next_prime(slots))
+    return chunks
+
+
+def _next_prime(n: int) -> int:
+    """Smallest prime at least n; HDF5 recommends a prime number of hash slots."""
+    while any(n % d == 0 for d in range(2, math.isqrt(n) + 1)):
+        n += 1
+    return n
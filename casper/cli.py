@@ -1,34 +1,388 @@
 """A Harmony CLI wrapper around casper"""
 
+from __future__ import annotations
+
 import logging
+import multiprocessing
+import shutil
 import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
 
-from casper.convert_to_csv import convert_to_csv
+from casper.columnar import CSV_ENGINES, OUTPUT_FORMATS
 from casper.file_ops import (
+    expand_input_paths,
     valid_input_file,
     valid_workable_file,
 )
+from casper.metrics import ConversionMetrics
+from casper.output_cache import DEFAULT_OUTPUT_CACHE_SIZE, Checkpoints, OutputCache, output_key
+from casper.schema_cache import DEFAULT_CACHE_SIZE, SchemaPlanCache
+from casper.tiling import DEFAULT_MEMORY_BUDGET, parse_byte_size
+from casper.zip_writer import COMPRESSION_METHODS
+
+# Modules needing xarray, netCDF4 or pandas are imported once a file is to
+# be converted, so usage errors and invalid input files are reported fast
+if TYPE_CHECKING:
+    from casper.subset import Subset
+
+module_logger = logging.getLogger(__name__)
+
 
+class FileResult(NamedTuple):
+    """Outcome of converting one input file of a batch."""
 
-def run_casper(input_file: str):
-    """Parse arguments and run casper on specified input file."""
+    input_file: str
+    zip_file: str | None
+    error: str | None = None
+    seconds: float = 0.0
+
+
+def run_casper(
+    input_file: str,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    engine: str = "pandas",
+    float_precision: int | None = None,
+    workers: int = 1,
+    compression_threads: int = 1,
+    schema_cache_dir: str | None = None,
+    schema_cache_size: int = DEFAULT_CACHE_SIZE,
+    profile: bool = False,
+    output_format: str = "csv",
+    compression: str = "deflate",
+    compression_level: int | None = None,
+    subset: Subset | None = None,
+    variables: list[str] | None = None,
+    shard_rows: int | None = None,
+    shard_size: int | None = None,
+    output_cache_dir: str | None = None,
+    output_cache_size: int = DEFAULT_OUTPUT_CACHE_SIZE,
+) -> str:
+    """Parse arguments and run casper on specified input file, returning the zip file name."""
     if not valid_input_file(input_file):
         raise ValueError("Input filename not valid")
 
-    if not valid_workable_file(input_file):
-        raise ValueError("Input file not valid")
-    zip_file_name = f"{input_file.split('/')[-1].split('.')[0]}.zip"
-    convert_to_csv(input_file, zip_file_name)
+    zip_file_name = _zip_file_name(input_file)
+
+    # Profiled conversions are always run, for the sake of their reports
+    key: str | None = None
+    checkpoints: Checkpoints | None = None
+    output_cache = (
+        OutputCache(output_cache_dir, output_cache_size)
+        if output_cache_dir and not profile
+        else None
+    )
+    if output_cache is not None:
+        key = output_key(
+            input_file,
+            engine=engine,
+            float_precision=float_precision,
+            output_format=output_format,
+            compression=compression,
+            compression_level=compression_level,
+            subset=subset,
+            variables=sorted(variables) if variables else None,
+            shard_rows=shard_rows,
+            shard_size=shard_size,
+        )
+        cached = output_cache.get(key)
+        if cached is not None:
+            shutil.copyfile(cached, zip_file_name)
+            module_logger.info(f"{zip_file_name} copied from the output cache")
+            return zip_file_name
+        checkpoints = output_cache.checkpoints(key)
 
+    from casper.convert_to_csv import convert_to_csv
+    from casper.session import GranuleSession
 
-def main() -> None:
-    """Entry point for the casper command line tool."""
+    schema_cache = (
+        SchemaPlanCache(schema_cache_dir, schema_cache_size) if schema_cache_dir else None
+    )
+
+    metrics = ConversionMetrics(Path(input_file).name)
+
+    # Validation and conversion share a single open granule
+    with metrics.stage("validation"):
+        try:
+            session = GranuleSession(input_file, variables=variables)
+        except OSError as e:
+            raise ValueError("Input file not valid") from e
+        if not valid_workable_file(session):
+            session.close()
+            raise ValueError("Input file not valid")
+
+    with session:
+        convert_to_csv(
+            session,
+            zip_file_name,
+            memory_budget=memory_budget,
+            engine=engine,
+            float_precision=float_precision,
+            workers=workers,
+            compression_threads=compression_threads,
+            schema_cache=schema_cache,
+            metrics=metrics,
+            profile=profile,
+            output_format=output_format,
+            compression=compression,
+            compression_level=compression_level,
+            subset=subset,
+            shard_rows=shard_rows,
+            shard_size=shard_size,
+            checkpoints=checkpoints,
+        )
+    metrics.log(module_logger)
+    if output_cache is not None and key is not None:
+        output_cache.put(key, zip_file_name)
+    return zip_file_name
+
+
+def run_batch(input_files: list[str], jobs: int = 1, **options) -> list[FileResult]:
+    """
+    Convert several input files, each to its own zip file.
+
+    Every input is validated before any is converted; invalid inputs, and
+    inputs whose zip file name is taken by an earlier input, fail without
+    stopping the others.
+
+    Parameters
+    ----------
+    input_files
+        Files to convert, see `expand_input_paths`
+    jobs
+        Number of files converted concurrently, each in its own process
+    options
+        Keyword arguments of `run_casper`
+
+    Returns
+    -------
+    list[FileResult]
+        Outcome of every input, in the order given
+    """
+    if jobs < 1:
+        raise ValueError("Number of jobs must be at least 1")
+
+    results: dict[str, FileResult] = {}
+    zip_files: dict[str, str] = {}
+    for input_file in input_files:
+        try:
+            valid_input_file(input_file)
+        except ValueError as e:
+            results[input_file] = FileResult(input_file, None, str(e))
+            continue
+        zip_file = _zip_file_name(input_file)
+        if zip_file in zip_files:
+            error = f"{zip_file} is already written for {zip_files[zip_file]}"
+            results[input_file] = FileResult(input_file, None, error)
+        else:
+            zip_files[zip_file] = input_file
+
+    pending = list(zip_files.values())
+    if jobs == 1 or len(pending) <= 1:
+        converted = [_convert_file(input_file, options) for input_file in pending]
+    else:
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=jobs, mp_context=mp_context, initializer=_setup_logging
+        ) as pool:
+            converted = list(pool.map(_convert_file, pending, [options] * len(pending)))
+    results.update((result.input_file, result) for result in converted)
+    return [results[input_file] for input_file in input_files]
+
+
+def _convert_file(input_file: str, options: dict) -> FileResult:
+    """Convert one input file of a batch, capturing any error."""
+    start = time.perf_counter()
+    try:
+        zip_file = run_casper(input_file, **options)
+    except Exception as e:
+        module_logger.error("Converting %s failed", input_file, exc_info=True)
+        return FileResult(input_file, None, str(e) or type(e).__name__, time.perf_counter() - start)
+    return FileResult(input_file, zip_file, None, time.perf_counter() - start)
+
+
+def _zip_file_name(input_file: str) -> str:
+    """Name of the zip file written for an input file, in the working directory."""
+    return f"{input_file.split('/')[-1].split('.')[0]}.zip"
+
+
+def _print_summary(results: list[FileResult]):
+    """Print the outcome of every input file of a batch."""
+    failed = [result for result in results if result.error is not None]
+    print(f"Converted {len(results) - len(failed)} of {len(results)} files")
+    for result in results:
+        if result.error is None:
+            print(f"  ok      {result.input_file} -> {result.zip_file} ({result.seconds:.1f} s)")
+        else:
+            print(f"  failed  {result.input_file}: {result.error}")
+
+
+def _setup_logging():
+    """Log to stdout, in the main process and in batch worker processes."""
     logging.basicConfig(
         stream=sys.stdout,
         format="[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s",
         level=logging.INFO,
     )
-    run_casper(sys.argv[1])
+
+
+def main() -> None:
+    """Entry point for the casper command line tool."""
+    _setup_logging()
+    parser = ArgumentParser(
+        prog="casper",
+        description="Convert NetCDF files to one or more CSV files each, one per dimensional "
+        "schema, with one zip file per input",
+    )
+    parser.add_argument(
+        "input_files",
+        nargs="+",
+        metavar="input_file",
+        help="NetCDF file to convert; also a glob pattern or a directory of NetCDF files",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of input files converted concurrently, each in its own process",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=parse_byte_size,
+        default=DEFAULT_MEMORY_BUDGET,
+        help="Approximate memory each tile read from the file may use, e.g. 256M or 1G",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=CSV_ENGINES,
+        default="pandas",
+        help="CSV writer to use; numpy formats whole columns without pandas DataFrames",
+    )
+    parser.add_argument(
+        "--float-precision",
+        type=int,
+        default=None,
+        help="Number of decimal places floating point values are rounded to",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes converting dimensional schemas concurrently",
+    )
+    parser.add_argument(
+        "--compression-threads",
+        type=int,
+        default=1,
+        help="Number of threads compressing the zip file members",
+    )
+    parser.add_argument(
+        "--schema-cache-dir",
+        default=None,
+        help="Directory caching the schema plans of granules with the same structure",
+    )
+    parser.add_argument(
+        "--schema-cache-size",
+        type=parse_byte_size,
+        default=DEFAULT_CACHE_SIZE,
+        help="Maximum size of the schema plan cache, e.g. 64M",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the conversion and add the reports to the zip file under profile/",
+    )
+    parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Format of the file written for each dimensional schema",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSION_METHODS,
+        default="deflate",
+        help="Compression of the zip file members; zstd needs Python 3.14 or zstandard",
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        default=None,
+        help="Compression level, 1-9 for deflate and 1-22 for zstd",
+    )
+    parser.add_argument(
+        "--bbox",
+        nargs=4,
+        type=float,
+        metavar=("WEST", "SOUTH", "EAST", "NORTH"),
+        help="Only convert data within a bounding box, in degrees",
+    )
+    parser.add_argument("--start", help="Only convert data at or after an ISO 8601 time")
+    parser.add_argument("--end", help="Only convert data at or before an ISO 8601 time")
+    parser.add_argument(
+        "--variables",
+        nargs="+",
+        metavar="PATH",
+        help="Full paths of the data variables to convert, e.g. /product/vertical_column",
+    )
+    parser.add_argument(
+        "--shard-rows",
+        type=int,
+        default=None,
+        help="Split each schema into files of at most this many rows",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=parse_byte_size,
+        default=None,
+        help="Split each schema into files of roughly at most this size, e.g. 1G",
+    )
+    parser.add_argument(
+        "--output-cache-dir",
+        default=None,
+        help="Directory caching zip files, reused for identical granules and options, and "
+        "the checkpoints interrupted conversions resume from",
+    )
+    parser.add_argument(
+        "--output-cache-size",
+        type=parse_byte_size,
+        default=DEFAULT_OUTPUT_CACHE_SIZE,
+        help="Maximum size of the cached zip files and checkpoints, e.g. 10G",
+    )
+    args = parser.parse_args()
+    subset = None
+    if args.bbox or args.start or args.end:
+        from casper.subset import Subset
+
+        subset = Subset.create(args.bbox, args.start, args.end)
+    results = run_batch(
+        expand_input_paths(args.input_files),
+        jobs=args.jobs,
+        memory_budget=args.memory_budget,
+        engine=args.engine,
+        float_precision=args.float_precision,
+        workers=args.workers,
+        compression_threads=args.compression_threads,
+        schema_cache_dir=args.schema_cache_dir,
+        schema_cache_size=args.schema_cache_size,
+        profile=args.profile,
+        output_format=args.output_format,
+        compression=args.compression,
+        compression_level=args.compression_level,
+        subset=subset,
+        variables=args.variables,
+        shard_rows=args.shard_rows,
+        shard_size=args.shard_size,
+        output_cache_dir=args.output_cache_dir,
+        output_cache_size=args.output_cache_size,
+    )
+    _print_summary(results)
+    if any(result.error is not None for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
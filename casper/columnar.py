@@ -0,0 +1,147 @@
+"""Columnar output of dimensional schemas as Parquet or Arrow IPC files.
+
+Each schema is written with the same columns, in the same order, as its
+CSV file: dimensions, then non-dimensional coordinates, then variables,
+with rows where every variable is missing dropped. Tables are written one
+tile at a time, so memory use follows the same budget as CSV output.
+
+Writing columnar files needs the optional ``pyarrow`` dependency, installed
+with the ``parquet`` extra.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+from casper.metrics import StageMetrics
+
+if TYPE_CHECKING:
+    import xarray as xr
+
+    from casper.zip_writer import WritableStream
+
+# Module constants
+OUTPUT_FORMATS = ("csv", "parquet", "arrow")
+CSV_ENGINES = ("pandas", "numpy")
+COLUMNAR_FORMATS = ("parquet", "arrow")
+FILE_KINDS = {"csv": "CSV", "parquet": "Parquet", "arrow": "Arrow IPC"}
+MIME_FORMATS = {
+    "text/csv": "csv",
+    "application/x-parquet": "parquet",
+    "application/vnd.apache.parquet": "parquet",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+COLUMNAR_COMPRESSION = "zstd"
+
+
+def output_format_for_mime(mime: str | None) -> str:
+    """
+    Output format for a requested mime type.
+
+    Parameters
+    ----------
+    mime
+        Mime type of the requested output, e.g. from a Harmony message
+
+    Returns
+    -------
+    str
+        One of OUTPUT_FORMATS; CSV unless a columnar format is requested
+    """
+    if mime is None:
+        return "csv"
+    return MIME_FORMATS.get(mime.split(";")[0].strip().lower(), "csv")
+
+
+def write_schema_table(
+    ds: xr.Dataset,
+    vvs: list[str],
+    stream: WritableStream,
+    output_format: str,
+    tiles: Iterable[dict[str, slice]],
+    float_precision: int | None = None,
+    stage: StageMetrics | None = None,
+):
+    """
+    Write a dimensional schema as a Parquet or Arrow IPC file, one tile at a time.
+
+    Parameters
+    ----------
+    ds
+        Dataset holding a single dimensional schema, with a coordinate for
+        every dimension
+    vvs
+        Variables of the schema; rows where all of them are missing are dropped
+    stream
+        Binary stream the file is written to; it is left open
+    output_format
+        Either "parquet" or "arrow"
+    tiles
+        ``isel`` indexers covering ``ds`` in row order
+    float_precision
+        Number of decimal places floating point values are rounded to
+    stage
+        Stage the rows and the read time and bytes are added to
+    """
+    from casper.csv_writer import sparse_dataframe
+
+    pa, pq = _import_pyarrow()
+    stage = stage if stage is not None else StageMetrics("schema")
+    dims = [str(dim) for dim in ds.sizes]
+    metadata = {b"casper:dimensions": ",".join(dims).encode("utf-8")}
+    schema = _arrow_schema(pa, ds, dims).with_metadata(metadata)
+
+    if output_format == "parquet":
+        writer = pq.ParquetWriter(stream, schema, compression=COLUMNAR_COMPRESSION)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=COLUMNAR_COMPRESSION)
+        writer = pa.ipc.new_file(stream, schema, options=options)
+    try:
+        for indexer in tiles:
+            with stage.time("read"):
+                chunk = ds.isel(indexer).compute()
+            stage.bytes_read += chunk.nbytes
+            df = sparse_dataframe(chunk, vvs, float_precision)
+            if dims:
+                # Dimensions become the leading columns, as in the CSV header
+                df = df.reset_index()
+            table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(metadata)
+            if not table.schema.equals(schema):
+                table = table.cast(schema)
+
+            if table.num_rows:
+                writer.write_table(table)
+                stage.rows += table.num_rows
+    finally:
+        writer.close()
+
+
+def _arrow_schema(pa, ds: xr.Dataset, dims: list[str]):
+    """
+    Arrow schema of a dimensional schema's table, from the dtypes of ``ds``.
+
+    The types inferred from a tile's frame depend on its values: an object
+    column holding only missing values has the ``null`` type, which later
+    tiles cannot be cast to.
+    """
+    fields = []
+    for name in dims + [str(name) for name in ds.variables if name not in ds.dims]:
+        dtype = ds[name].dtype
+        # Strings are object or str columns in pandas, which Arrow stores as large strings
+        arrow_type = pa.large_string() if dtype.kind in "OU" else pa.from_numpy_dtype(dtype)
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _import_pyarrow():
+    """Import pyarrow, which is only needed for columnar output."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Parquet and Arrow IPC output need pyarrow; install casper with the parquet extra"
+        ) from e
+    return pa, pq
@@ -1,17 +1,51 @@
 import json
 import logging
+import multiprocessing
 import sys
-import zipfile
+import time
+from collections.abc import Iterable, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
 from logging import Logger
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import NamedTuple
 
+import numpy as np
 import xarray as xr
-from harmony_service_lib.util import generate_output_filename
 
+from casper.chunking import ChunkLayout, schema_chunks, tune_chunk_caches
+from casper.columnar import (
+    COLUMNAR_FORMATS,
+    CSV_ENGINES,
+    FILE_KINDS,
+    OUTPUT_FORMATS,
+    write_schema_table,
+)
+from casper.csv_writer import (
+    datetime_units,
+    format_datetimes,
+    sparse_dataframe,
+    write_csv_numpy,
+)
 from casper.file_ops import (
     valid_input_file,
     valid_workable_file,
 )
+from casper.metrics import ConversionMetrics, MeteredWriter, StageMetrics
+from casper.output_cache import Checkpoints
+from casper.profiling import ConversionProfile
+from casper.schema_cache import SchemaPlan, SchemaPlanCache
+from casper.session import GranuleSession
+from casper.subset import Subset, index_selection, subset_dataset
+from casper.tiling import (
+    DEFAULT_MEMORY_BUDGET,
+    count_tiles,
+    dimension_sizes,
+    estimate_row_bytes,
+    iter_tiles,
+    plan_shards,
+)
+from casper.zip_writer import COMPRESSION_METHODS, ZIP_STORED, WritableStream, ZipWriter
 
 default_logger = logging.getLogger(__name__)
 
@@ -22,34 +56,37 @@ def remove_blank_lines(text):
     return "\n\t\t".join(real_lines)
 
 
-def get_group_attributes(ds):
+def get_group_attributes(attributes):
     """Get group global attributes"""
     group_attrs = ""
-    for node in ds.subtree:
-        if node.path != "/" and len(node.attrs) > 0:
-            group_attrs += f"\n# Group {node.path} Attributes:\n\t"
-            attrs_dict = {k: str(v) for k, v in node.attrs.items()}
+    for path, node_attrs in attributes.items():
+        if path != "/" and len(node_attrs) > 0:
+            group_attrs += f"\n# Group {path} Attributes:\n\t"
+            attrs_dict = {k: str(v) for k, v in node_attrs.items()}
             attrs_dict = dict(sorted(attrs_dict.items()))
             f_attrs = [f"\t{k}: {remove_blank_lines(v)}" for k, v in attrs_dict.items()]
             group_attrs += "\n\t".join(f_attrs)
     return group_attrs
 
 
-def get_global_attributes(ds):
+def get_global_attributes(attributes):
     """Get dataset global attributes"""
-    attrs = ds.attrs
+    attrs = attributes["/"]
     attrs_dict = {k: str(v) for k, v in attrs.items()}
     attrs_dict = dict(sorted(attrs_dict.items()))
     attrs_list = [f"\t{k}: {remove_blank_lines(v)}" for k, v in attrs_dict.items()]
     return attrs_list
 
 
-def create_markdown(md, ds, input_filename):
+def create_markdown(md, attributes, input_filename, file_kind="CSV"):
     """Create markdown file contents"""
-    header = f"# {len(md)} CSV files created for {input_filename} based on dimensional schemas\n\n"
+    num_files = sum(len(v.get("shards", [v["filename"]])) for v in md.values())
+    header = f"# {num_files} {file_kind} files created for {input_filename} based on dimensional schemas\n\n"
     data = ""
     for k, v in md.items():
         data += f"## {v['filename']}\n"
+        if "shards" in v:
+            data += f"\t{len(v['shards'])} shards:  {', '.join(v['shards'])}\n"
         data += "\tdimensions:"
         if len(k) > 0:
             data += f"  {', '.join(k)}"
@@ -61,142 +98,753 @@ def create_markdown(md, ds, input_filename):
         if len(v["vrbs"]) > 0:
             data += f"\t\t{'\n\t\t'.join(v['vrbs'])}\n\n"
 
-    global_attrs = get_global_attributes(ds)
+    global_attrs = get_global_attributes(attributes)
     a_val = f"# {input_filename} Global Attributes:\n\t"
     a_val += "\n\t".join(global_attrs)
-    group_attrs = get_group_attributes(ds)
+    group_attrs = get_group_attributes(attributes)
     content = f"""{header}\n{data}\n{a_val}\n{group_attrs}"""
     return content
 
 
-def json_readme(ds, input_filename, json_obj):
-    attrs = ds.attrs
+def json_readme(attributes, input_filename, json_obj):
+    attrs = attributes["/"]
     attrs_dict = {k: str(v) for k, v in attrs.items()}
     json_obj[f"{input_filename} Global Attributes:"] = dict(sorted(attrs_dict.items()))
-    for node in ds.subtree:
-        if node.path != "/" and len(node.attrs) > 0:
-            node_attrs = {k: str(v) for k, v in node.attrs.items()}
-            json_obj[f"Group {node.path} Attributes:"] = dict(sorted(node_attrs.items()))
+    for path, node_attrs in attributes.items():
+        if path != "/" and len(node_attrs) > 0:
+            node_attrs = {k: str(v) for k, v in node_attrs.items()}
+            json_obj[f"Group {path} Attributes:"] = dict(sorted(node_attrs.items()))
     return
 
 
-def convert_to_csv(fname: str, zip_file: str, logger: Logger = default_logger) -> int:
+def schema_dataset(
+    data: xr.DataTree,
+    dims: tuple[str, ...],
+    vvs: list[str],
+    columns: list[str] | None = None,
+) -> xr.Dataset:
+    """
+    Combine the variables of one dimensional schema into a single dataset.
+
+    Columns are ordered as dimensions, non-dimensional coordinates, then
+    the rest of the variables, unless a cached column order is given.
+    """
+    arrays = _schema_arrays(data, vvs)
+    if _share_indexes(arrays):
+        # Nothing to align, so build the dataset from the variables directly
+        coords: dict[str, xr.Variable] = {}
+        for arr in arrays:
+            for name, coord in arr.coords.items():
+                coords.setdefault(str(name), coord.variable)
+        ds = xr.Dataset(
+            {vv: arr.variable for vv, arr in zip(vvs, arrays, strict=True)}, coords=coords
+        )
+    else:
+        combined = xr.combine_by_coords(
+            [arr.rename(vv) for vv, arr in zip(vvs, arrays, strict=True)]
+        )
+        # Named arrays always combine into a dataset
+        ds = combined if isinstance(combined, xr.Dataset) else combined.to_dataset()
+    cols = columns if columns is not None else list(dims) + list(ds.coords) + vvs
+    return ds[cols]
+
+
+def _schema_arrays(data: xr.DataTree, vvs: list[str]) -> list[xr.DataArray]:
+    """Variables of a schema, with their group's view built once per group."""
+    groups: dict[str, xr.Dataset] = {}
+    arrays = []
+    for vv in vvs:
+        group, _, name = vv.rpartition("/")
+        if group not in groups:
+            groups[group] = data[group or "/"].to_dataset()
+        arrays.append(groups[group][name])
+    return arrays
+
+
+def _schema_slab(
+    data: xr.DataTree,
+    dims: tuple[str, ...],
+    vvs: list[str],
+    columns: list[str] | None,
+    selection: dict[str, slice | np.ndarray],
+    shard: dict[str, slice] | None = None,
+) -> tuple[xr.Dataset, list[str]]:
+    """
+    Dataset of one schema, restricted to a subset selection and a shard.
+
+    Returns
+    -------
+    tuple[xr.Dataset, list[str]]
+        Lazily loaded dataset, and the coordinates of the schema for the
+        Readme files
+    """
+    ds = schema_dataset(data, dims, vvs, columns)
+    coords = [str(name) for name in ds.coords]
+    # Dimensions without coordinate variables are written as their integer
+    # position in the granule, which must not restart per subset or shard
+    ds = ds.assign_coords(
+        {dim: range(size) for dim, size in ds.sizes.items() if dim not in ds.coords}
+    )
+    ds = subset_dataset(ds, selection)
+    return (ds.isel(shard) if shard else ds), coords
+
+
+def _share_indexes(arrays: list[xr.DataArray]) -> bool:
+    """Check if arrays have the same dimension sizes and identical indexes."""
+    first = arrays[0]
+    for arr in arrays[1:]:
+        if arr.sizes != first.sizes or arr.xindexes.keys() != first.xindexes.keys():
+            return False
+        if not all(arr.xindexes[name].equals(first.xindexes[name]) for name in first.xindexes):
+            return False
+    return True
+
+
+def write_schema_csv(
+    ds: xr.Dataset,
+    vvs: list[str],
+    csv_file: WritableStream,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    engine: str = "pandas",
+    float_precision: int | None = None,
+    logger: Logger = default_logger,
+    stage: StageMetrics | None = None,
+    output_format: str = "csv",
+    chunks: Mapping[str, int] | None = None,
+):
+    """
+    Write one dimensional schema as CSV text, or as a columnar file, to an
+    open binary stream.
+
+    Parameter
+    ----------
+    ds: xr.Dataset
+        Dataset holding the schema, as returned by `schema_dataset`
+    vvs: list[str]
+        Variables of the schema; rows where all of them are missing are dropped
+    csv_file: WritableStream
+        Stream the CSV text is written to
+    memory_budget: int
+        Approximate number of bytes each tile read from the file may use
+    engine: str
+        CSV writer, either "pandas" or the vectorized "numpy" writer
+    float_precision: int | None
+        Number of decimal places floating point values are rounded to
+    logger: Logger
+        Logger instance for output messages
+    stage: StageMetrics | None
+        Stage the rows, bytes and the read, format and compress times are
+        added to
+    output_format: str
+        "csv", or "parquet" or "arrow" for a columnar file, see
+        `casper.columnar`. The engine only applies to CSV output.
+    chunks: Mapping[str, int] | None
+        Length of the on-disk chunks along each dimension, to align the
+        tiles to, see `casper.chunking`
+    """
+    stage = stage if stage is not None else StageMetrics("schema")
+    start = time.perf_counter()
+    stream = MeteredWriter(csv_file, stage)
+
+    # Dimensions without coordinate variables are written as
+    # their integer position, which must not restart per tile
+    ds = ds.assign_coords(
+        {dim: range(size) for dim, size in ds.sizes.items() if dim not in ds.coords}
+    )
+
+    sizes = dimension_sizes(ds)
+    row_bytes = estimate_row_bytes(ds)
+    logger.debug(
+        f"{count_tiles(sizes, row_bytes, memory_budget, chunks)} tiles "
+        f"of up to {memory_budget} bytes"
+    )
+    tiles = iter_tiles(sizes, row_bytes, memory_budget, chunks)
+    # CSV tiles are written alike, with the datetime formats of the whole schema
+    units = (
+        datetime_units(ds, iter_tiles(sizes, row_bytes, memory_budget, chunks))
+        if output_format not in COLUMNAR_FORMATS
+        else {}
+    )
+    if output_format in COLUMNAR_FORMATS:
+        write_schema_table(ds, vvs, stream, output_format, tiles, float_precision, stage)
+    elif engine == "numpy":
+        stage.rows += write_csv_numpy(ds, vvs, stream, tiles, float_precision, stage, units)
+    else:
+        for tile_idx, indexer in enumerate(tiles):
+            # Process a tile of the dataset
+            with stage.time("read"):
+                chunk = ds.isel(indexer).compute()
+            stage.bytes_read += chunk.nbytes
+            # Convert the rows of the tile holding data to a pandas DataFrame
+            df_chunk = format_datetimes(sparse_dataframe(chunk, vvs, float_precision), units)
+            stage.rows += len(df_chunk)
+
+            # Write header for the first tile only
+            df_chunk.to_csv(stream, header=(tile_idx == 0))
+
+            del df_chunk
+
+    # Formatting is whatever is left once reading and compressing are accounted for
+    stage.timings["format"] = (
+        time.perf_counter()
+        - start
+        - stage.timings.get("read", 0.0)
+        - stage.timings.get("compress", 0.0)
+    )
+
+
+def _convert_schema(
+    fname: str,
+    dims: tuple[str, ...],
+    vvs: list[str],
+    columns: list[str] | None,
+    shard: dict[str, slice] | None,
+    csv_path: str,
+    memory_budget: int,
+    engine: str,
+    float_precision: int | None,
+    output_format: str,
+    selection: dict[str, slice | np.ndarray],
+    variables: frozenset[str] | None,
+) -> tuple[list[str], StageMetrics]:
+    """
+    Write one dimensional schema, or one shard of it, to an uncompressed
+    CSV or columnar file.
+
+    Runs in a worker process, so the granule is opened again here rather
+    than shared with the parent's session.
+
+    Returns
+    -------
+    tuple[list[str], StageMetrics]
+        Coordinates of the schema, for the Readme files, and the metrics of
+        the conversion in the worker
+    """
+    xr.set_options(use_new_combine_kwarg_defaults=True)
+    stage = StageMetrics(f"schema:{Path(csv_path).name}")
+    start = time.perf_counter()
+    with GranuleSession(fname, variables=variables) as session:
+        ds, coords = _schema_slab(session.tree, dims, vvs, columns, selection, shard)
+        chunks = tune_chunk_caches(session, ds, vvs, memory_budget, default_logger)
+        with open(csv_path, "wb") as csv_file:
+            write_schema_csv(
+                ds,
+                vvs,
+                csv_file,
+                memory_budget,
+                engine,
+                float_precision,
+                stage=stage,
+                output_format=output_format,
+                chunks=chunks,
+            )
+    stage.seconds = time.perf_counter() - start
+    stage.measure_memory()
+    return coords, stage
+
+
+def convert_to_csv(
+    fname: str | GranuleSession,
+    zip_file: str | Path | WritableStream,
+    logger: Logger = default_logger,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    engine: str = "pandas",
+    float_precision: int | None = None,
+    workers: int = 1,
+    compression_threads: int = 1,
+    schema_cache: SchemaPlanCache | None = None,
+    metrics: ConversionMetrics | None = None,
+    profile: bool = False,
+    output_format: str = "csv",
+    compression: str = "deflate",
+    compression_level: int | None = None,
+    subset: Subset | None = None,
+    variables: Iterable[str] | None = None,
+    shard_rows: int | None = None,
+    shard_size: int | None = None,
+    checkpoints: Checkpoints | None = None,
+) -> int:
     """
     Converts NetCDF file to one or more CSV files. The number of files will
     be based on the dimensions identified in the NetCDF file.
 
     Parameter
     ----------
-    fname: str
-        The name of the NetCDF file to be converted to CSV file(s)
-    zip_file: str
-        The name of the zipfile to create
+    fname: str | GranuleSession
+        The name of the NetCDF file to be converted to CSV file(s), or a
+        session already holding it open. A session passed in is left open.
+    zip_file: str | Path | WritableStream
+        The name of the zipfile to create, or a writable binary stream the
+        zip file is written to, e.g. a streaming upload
     logger: Logger
         Logger instance for output messages
+    memory_budget: int
+        Approximate number of bytes each tile read from the file may use
+    engine: str
+        CSV writer, either "pandas" or the vectorized "numpy" writer
+    float_precision: int | None
+        Number of decimal places floating point values are rounded to,
+        or None to write the shortest round-trip representation
+    workers: int
+        Number of worker processes converting schemas concurrently. With a
+        single worker the schemas are converted one after another in this
+        process.
+    compression_threads: int
+        Number of threads compressing the zip file members concurrently
+    schema_cache: SchemaPlanCache | None
+        Cache of schema plans. When it holds a plan for a granule with the
+        same structure, schema discovery is skipped; otherwise the plan
+        found for this granule is added to it.
+    metrics: ConversionMetrics | None
+        Metrics the open, schema discovery, per-schema and Readme stages are
+        added to. When None, the metrics of the conversion are logged once
+        it completes.
+    profile: bool
+        Profile the conversion and track allocations, adding the reports
+        to the zip file, see `casper.profiling`
+    output_format: str
+        "csv", or "parquet" or "arrow" to write each schema as a columnar
+        file with the same columns, see `casper.columnar`
+    compression: str
+        Compression of the zip file members: "stored", "deflate" or "zstd".
+        Columnar files are always stored, being compressed already.
+    compression_level: int | None
+        Compression level, 1-9 for deflate and 1-22 for zstd, or None for
+        the codec's default
+    subset: Subset | None
+        Bounding box and time range to select. Only the slabs of each schema
+        within them are read and written, see `casper.subset`.
+    variables: Iterable[str] | None
+        Full paths of the data variables to convert, or None for all of
+        them, see `GranuleSession`. A session passed in carries its own
+        selection. The schema cache is only used when converting all
+        variables.
+    shard_rows: int | None
+        Split each schema into numbered shards of at most this many rows,
+        each with its own header. Shards are converted concurrently by the
+        workers and listed in the Readme files.
+    shard_size: int | None
+        Split each schema into shards of roughly at most this many bytes of
+        CSV text, see `plan_shards`
+    checkpoints: Checkpoints | None
+        Checkpoints of this conversion, see `casper.output_cache`. Files
+        finished by an interrupted conversion are added to the zip file as
+        they are, every other file is kept as a checkpoint once written, and
+        the checkpoints are removed when the zip file is complete.
 
     Returns
     -------
     int
-        Number of CSV files created
+        Number of CSV files created, counting every shard
     """
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"CSV engine must be one of {', '.join(CSV_ENGINES)}")
+    if workers < 1:
+        raise ValueError("Number of workers must be at least 1")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Output format must be one of {', '.join(OUTPUT_FORMATS)}")
+    if (shard_rows is not None and shard_rows < 1) or (shard_size is not None and shard_size < 1):
+        raise ValueError("Shard limits must be at least 1")
+    if compression not in COMPRESSION_METHODS:
+        raise ValueError(f"Compression must be one of {', '.join(COMPRESSION_METHODS)}")
+    # Columnar files are compressed already
+    compress_type = (
+        ZIP_STORED if output_format in COLUMNAR_FORMATS else COMPRESSION_METHODS[compression]
+    )
+
     xr.set_options(use_new_combine_kwarg_defaults=True)
     num_csv_files = 0
-    schemas: dict[str | tuple[str, ...], list[str]] = {}
     md = {}
     json_obj: dict[str, str | dict] = {}
     json_obj["Notice"] = "The Readme.md file includes the same information"
 
+    log_metrics = metrics is None
+    if metrics is None:
+        metrics = ConversionMetrics(
+            fname.name if isinstance(fname, GranuleSession) else Path(fname).name
+        )
+
+    profiler = ConversionProfile() if profile else None
+    if profiler is not None:
+        profiler.start()
+
+    session = None
     try:
-        # Open file as xarray datatree
-        data = xr.open_datatree(fname)
-
-        # Loops datatree items to gather info for various dimension groups
-        for path, ds in data.to_dict().items():
-            if path == "/":
-                path = ""
-            variables = list(ds.variables)
-            products = [f"{path}/{vv}" for vv in variables if vv not in ds.coords]
-            for varname in products:
-                dims = data[varname].dims
-                if dims not in schemas:
-                    schemas[dims] = []
-                schemas[dims].append(varname)
-
-        input_filename = Path(fname).name
-        vals = list(schemas.items())
+        with metrics.stage("open"):
+            if isinstance(fname, GranuleSession):
+                session = fname
+            else:
+                session = GranuleSession(fname, logger, variables)
+            data = session.tree
+        # Plans hold every variable of a granule structure
+        if session.requested_variables is not None:
+            schema_cache = None
+
+        with metrics.stage("schema_discovery"):
+            plan = None
+            # Column order of each schema, when a cached plan has it
+            columns: list[list[str] | None]
+            if schema_cache is not None:
+                plan = schema_cache.get(session.fingerprint)
+            if plan is not None:
+                logger.info(f"Using cached schema plan {session.fingerprint}")
+                vals = [(schema.dims, schema.variables) for schema in plan]
+                columns = [schema.columns for schema in plan]
+            else:
+                # Group variables by dimensions from the cached metadata
+                vals = list(session.schemas().items())
+                columns = [None] * len(vals)
+            selection = index_selection(data, subset) if subset is not None else {}
+
+        input_filename = session.name
+        parts = _plan_parts(
+            session, vals, columns, selection, output_format, shard_rows, shard_size
+        )
 
         # Create the zip file object in write mode
-        with zipfile.ZipFile(
-            zip_file, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True
+        with ZipWriter(
+            zip_file,
+            compression_threads=compression_threads,
+            compresslevel=compression_level,
+            compression=COMPRESSION_METHODS[compression],
         ) as zf:
-            logger.info(f"Creating {len(vals)} CSV files for {input_filename}")
-
-            for idx in range(len(vals)):
-                dims, vvs = vals[idx]
-                # Use Harmony generated filename
-                op_file = f"{input_filename}-{idx}.csv"
-                op_file = generate_output_filename(op_file, ext="csv", is_reformatted=True)
-                with zf.open(op_file, "w", force_zip64=True) as csv_file:
-                    ds = xr.combine_by_coords([data[vv].rename(vv) for vv in vvs])
-                    # Order columns: dimensions, non-dimensional coordinates, rest of variables
-                    cols = list(dims) + list(ds.coords) + vvs
-                    ds = ds[cols]
-
-                    # Add info to markdown and json dictionaries for creation of Readmes
-                    md[dims] = {
-                        "filename": op_file,
-                        "keys": dims,
-                        "coords": list(ds.coords),
-                        "vrbs": vvs,
-                    }
-                    json_obj[op_file] = {
-                        "dimensions": ",".join(list(dims)),
-                        "non-dimensional coordinates": ",".join(
-                            [c for c in list(ds.coords) if c not in list(dims)]
-                        ),
-                        "variables": vvs,
-                    }
-
-                    chunk_size = 10
-                    data_len = 0
-                    prime_dim = next(iter(ds.sizes.items()))
-                    dim_var = prime_dim[0]
-                    data_len = prime_dim[1]
-                    for i in range(0, data_len, chunk_size):
-                        # Process a slice of the dataset
-                        indexer = {dim_var: slice(i, i + chunk_size)}
-                        ds_chunk = ds.isel(indexer)
-                        chunk = ds_chunk.compute()
-                        # Convert the small chunk to a pandas DataFrame
-                        df_chunk = chunk.to_dataframe().dropna(how="all", subset=vvs)
-
-                        # Write header for the first chunk only
-                        df_chunk.to_csv(csv_file, header=(i == 0))
-
-                        del df_chunk
-
-                logger.info(f" {op_file} added to zip file")
-                num_csv_files += 1
-
-            # Create markdown and json Readme files
-            readme_contents = create_markdown(md, data, input_filename)
-            readme_file = "Readme.md"
-            with zf.open(readme_file, "w") as file:
-                file.write(readme_contents.encode("utf-8"))
-
-            # Create JSON file with pretty printing
-            json_readme(data, input_filename, json_obj)
-            json_file = "Readme.json"
-            json_data = json.dumps(json_obj, indent=4)
-            zf.writestr(json_file, json_data.encode("utf-8"))
+            logger.info(
+                f"Creating {len(parts)} {FILE_KINDS[output_format]} files for {input_filename}"
+            )
+
+            if workers > 1 and len(parts) > 1:
+                part_coords = _convert_schemas_in_pool(
+                    session.filename,
+                    parts,
+                    zf,
+                    zip_file,
+                    workers,
+                    memory_budget,
+                    engine,
+                    float_precision,
+                    logger,
+                    metrics,
+                    output_format,
+                    compress_type,
+                    selection,
+                    session.requested_variables,
+                    checkpoints,
+                )
+            else:
+                part_coords = []
+                for part in parts:
+                    finished = checkpoints.get(part.op_file) if checkpoints is not None else None
+                    if finished is not None:
+                        part_coords.append(
+                            _add_checkpoint(zf, part, finished, compress_type, metrics, logger)
+                        )
+                        continue
+                    with metrics.stage(f"schema:{part.op_file}") as stage:
+                        # With checkpoints the file is kept until the zip file is complete
+                        partial_path = (
+                            checkpoints.partial_path(part.op_file)
+                            if checkpoints is not None
+                            else None
+                        )
+                        with (
+                            open(partial_path, "wb")
+                            if partial_path is not None
+                            else zf.open(part.op_file, compress_type)
+                        ) as csv_file:
+                            coords = _write_part(
+                                session,
+                                part,
+                                csv_file,
+                                selection,
+                                memory_budget,
+                                engine,
+                                float_precision,
+                                logger,
+                                stage,
+                                output_format,
+                            )
+                        if checkpoints is not None and partial_path is not None:
+                            path = checkpoints.put(part.op_file, partial_path, coords)
+                            with stage.time("compress"):
+                                zf.write(path, part.op_file, compress_type)
+                    part_coords.append(coords)
+                    logger.info(f" {part.op_file} added to zip file")
+
+            # Every schema has at least one part, so every entry is replaced
+            schema_coords: list[list[str]] = [[] for _ in vals]
+            schema_files: list[list[str]] = [[] for _ in vals]
+            for part, coords in zip(parts, part_coords, strict=True):
+                schema_coords[part.schema] = coords
+                schema_files[part.schema].append(part.op_file)
+
+            sharded = shard_rows is not None or shard_size is not None
+            for (dims, vvs), op_files, coords in zip(
+                vals, schema_files, schema_coords, strict=True
+            ):
+                # Add info to markdown and json dictionaries for creation of Readmes
+                md[dims] = {
+                    "filename": op_files[0],
+                    "keys": dims,
+                    "coords": coords,
+                    "vrbs": vvs,
+                }
+                schema_json: dict[str, str | list[str]] = {
+                    "dimensions": ",".join(list(dims)),
+                    "non-dimensional coordinates": ",".join(
+                        [c for c in coords if c not in list(dims)]
+                    ),
+                    "variables": vvs,
+                }
+                json_obj[op_files[0]] = schema_json
+                if sharded:
+                    # Shards hold consecutive rows of the schema, each with a header
+                    md[dims]["shards"] = op_files
+                    schema_json["shards"] = op_files
+                num_csv_files += len(op_files)
+
+            with metrics.stage("readme") as stage:
+                # Create markdown and json Readme files
+                readme_contents = create_markdown(
+                    md, session.attributes, input_filename, FILE_KINDS[output_format]
+                )
+                readme_file = "Readme.md"
+                with zf.open(readme_file) as file:
+                    file.write(readme_contents.encode("utf-8"))
+
+                # Create JSON file with pretty printing
+                json_readme(session.attributes, input_filename, json_obj)
+                json_file = "Readme.json"
+                json_data = json.dumps(json_obj, indent=4)
+                zf.writestr(json_file, json_data.encode("utf-8"))
+                stage.bytes_written = len(readme_contents.encode("utf-8")) + len(json_data)
+
+            if profiler is not None:
+                profiler.write_to(zf)
+
+        if checkpoints is not None:
+            # The zip file is complete, so there is nothing left to resume
+            checkpoints.clear()
+
+        if schema_cache is not None and plan is None:
+            schema_cache.put(
+                session.fingerprint,
+                [
+                    SchemaPlan(dims, vvs, list(dims) + coords + vvs)
+                    for (dims, vvs), coords in zip(vals, schema_coords, strict=True)
+                ],
+            )
 
     except Exception as e:
         logger.error("File conversion failed: %s", e)
         raise
-
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        if session is not None and session is not fname:
+            session.close()
+
+    if log_metrics:
+        metrics.log(logger)
     return num_csv_files
 
 
+class _SchemaPart(NamedTuple):
+    """One output file: a whole dimensional schema, or one shard of it."""
+
+    schema: int
+    dims: tuple[str, ...]
+    vvs: list[str]
+    columns: list[str] | None
+    shard: dict[str, slice] | None
+    op_file: str
+
+
+def _write_part(
+    session: GranuleSession,
+    part: _SchemaPart,
+    csv_file: WritableStream,
+    selection: dict[str, slice | np.ndarray],
+    memory_budget: int,
+    engine: str,
+    float_precision: int | None,
+    logger: Logger,
+    stage: StageMetrics,
+    output_format: str,
+) -> list[str]:
+    """Write one part with the session's granule, returning the coordinates of its schema."""
+    ds, coords = _schema_slab(
+        session.tree, part.dims, part.vvs, part.columns, selection, part.shard
+    )
+    chunks = tune_chunk_caches(session, ds, part.vvs, memory_budget, logger)
+    write_schema_csv(
+        ds,
+        part.vvs,
+        csv_file,
+        memory_budget,
+        engine,
+        float_precision,
+        logger,
+        stage,
+        output_format,
+        chunks,
+    )
+    return coords
+
+
+def _add_checkpoint(
+    zf: ZipWriter,
+    part: _SchemaPart,
+    finished: tuple[Path, list[str]],
+    compress_type: int,
+    metrics: ConversionMetrics,
+    logger: Logger,
+) -> list[str]:
+    """Add a part finished by an interrupted conversion, returning the coordinates of its schema."""
+    path, coords = finished
+    with metrics.stage(f"schema:{part.op_file}") as stage, stage.time("compress"):
+        zf.write(path, part.op_file, compress_type)
+    logger.info(f" {part.op_file} added to zip file from its checkpoint")
+    return coords
+
+
+def _plan_parts(
+    session: GranuleSession,
+    vals: list,
+    columns: list,
+    selection: dict[str, slice | np.ndarray],
+    output_format: str,
+    shard_rows: int | None,
+    shard_size: int | None,
+) -> list[_SchemaPart]:
+    """
+    Plan the output files of every schema, in schema order.
+
+    Without a shard limit each schema is written to one file. With one,
+    every schema is split into numbered shards, see `plan_shards`, which
+    start on chunk boundaries where the limits allow.
+    """
+    # Imported here so spawned schema workers never pay for harmony-service-lib
+    from harmony_service_lib.util import generate_output_filename
+
+    input_filename = session.name
+    parts = []
+    for idx, ((dims, vvs), cols) in enumerate(zip(vals, columns, strict=True)):
+        shards: Sequence[dict[str, slice] | None]
+        if shard_rows is None and shard_size is None:
+            shards = [None]
+            names = [f"{input_filename}-{idx}.{output_format}"]
+        else:
+            ds, _ = _schema_slab(session.tree, dims, vvs, cols, selection)
+            layouts = [ChunkLayout.of(session.dataset[vv]) for vv in vvs]
+            shards = plan_shards(ds, shard_rows, shard_size, schema_chunks(dims, layouts))
+            names = [
+                f"{input_filename}-{idx}-{shard_idx}.{output_format}"
+                for shard_idx in range(len(shards))
+            ]
+        for shard, name in zip(shards, names, strict=True):
+            # Use Harmony generated filenames
+            op_file = generate_output_filename(name, ext=output_format, is_reformatted=True)
+            parts.append(_SchemaPart(idx, dims, vvs, cols, shard, op_file))
+    return parts
+
+
+def _convert_schemas_in_pool(
+    fname: str,
+    parts: list[_SchemaPart],
+    zf: ZipWriter,
+    zip_file: str | Path | WritableStream,
+    workers: int,
+    memory_budget: int,
+    engine: str,
+    float_precision: int | None,
+    logger: Logger,
+    metrics: ConversionMetrics,
+    output_format: str,
+    compress_type: int,
+    selection: dict[str, slice | np.ndarray],
+    variables: frozenset[str] | None,
+    checkpoints: Checkpoints | None = None,
+) -> list[list[str]]:
+    """
+    Convert schemas, or their shards, concurrently in worker processes.
+
+    Each worker writes its schema or shard to a temporary file next to the
+    zip file, or in the default temporary directory when writing to a
+    stream. With checkpoints, the files are written to the checkpoints
+    instead and kept, and parts finished earlier are not converted again.
+    Finished files are added to the zip file in order, as soon as every
+    file ahead of them has been added.
+
+    Returns
+    -------
+    list[list[str]]
+        Coordinates of the schema of each part, in part order
+    """
+    part_coords = []
+    temp_parent = Path(zip_file).parent if isinstance(zip_file, str | Path) else None
+    # Spawned workers do not inherit the parent's open HDF5 handles
+    mp_context = multiprocessing.get_context("spawn")
+    with (
+        TemporaryDirectory(dir=temp_parent) as temp_dir,
+        ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool,
+    ):
+        finished = [
+            checkpoints.get(part.op_file) if checkpoints is not None else None for part in parts
+        ]
+        csv_paths = [
+            checkpoints.partial_path(part.op_file)
+            if checkpoints is not None
+            else Path(temp_dir) / part.op_file
+            for part in parts
+        ]
+        # Parts finished by an interrupted conversion are not converted again
+        futures = {
+            idx: pool.submit(
+                _convert_schema,
+                fname,
+                part.dims,
+                part.vvs,
+                part.columns,
+                part.shard,
+                str(csv_path),
+                memory_budget,
+                engine,
+                float_precision,
+                output_format,
+                selection,
+                variables,
+            )
+            for idx, (part, csv_path, done) in enumerate(
+                zip(parts, csv_paths, finished, strict=True)
+            )
+            if done is None
+        }
+        try:
+            for idx, (part, csv_path, done) in enumerate(
+                zip(parts, csv_paths, finished, strict=True)
+            ):
+                if done is not None:
+                    part_coords.append(
+                        _add_checkpoint(zf, part, done, compress_type, metrics, logger)
+                    )
+                    continue
+                coords, stage = futures[idx].result()
+                part_coords.append(coords)
+                if checkpoints is not None:
+                    csv_path = checkpoints.put(part.op_file, csv_path, coords)
+                with stage.time("compress"):
+                    zf.write(csv_path, part.op_file, compress_type)
+                metrics.add(stage)
+                if checkpoints is None:
+                    Path(csv_path).unlink()
+                logger.info(f" {part.op_file} added to zip file")
+        except BaseException:
+            # Do not start converting the remaining schemas
+            pool.shutdown(cancel_futures=True)
+            raise
+    return part_coords
+
+
 def main():
     """Entry point for the casper command line tool."""
     logging.basicConfig(
@@ -0,0 +1,427 @@
+"""Vectorized CSV writer for dimensional schemas.
+
+Formats whole columns with NumPy and writes the encoded bytes directly,
+without building a pandas DataFrame for each tile. The output matches
+``Dataset.to_dataframe().to_csv()``: dimensions, then non-dimensional
+coordinates, then variables, with empty fields for missing values and rows
+where every variable is missing dropped.
+
+Both writers only gather the rows holding data: the valid-data mask is
+computed across the schema's variables first, and coordinates and values
+are taken at its ``nonzero`` rows, so fill values cost no formatting.
+Columns spanning fewer dimensions than the schema, such as the dimension
+coordinates, repeat their values on many rows; the NumPy writer formats
+each of those values once per tile and reuses the text.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import os
+from collections.abc import Iterable, Mapping
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from casper.metrics import StageMetrics
+from casper.tiling import dimension_sizes
+from casper.zip_writer import WritableStream
+
+# Module constants
+LINE_TERMINATOR = os.linesep.encode("ascii")
+_QUOTE_TRIGGERS = (b",", b'"', b"\n", b"\r")
+# Units datetimes are written in, from the coarsest; "D" writes dates only
+DatetimeUnit = Literal["D", "s", "ms", "us", "ns"]
+DATETIME_UNITS: dict[DatetimeUnit, int] = {
+    "D": 86400 * 10**9,
+    "s": 10**9,
+    "ms": 10**6,
+    "us": 10**3,
+    "ns": 1,
+}
+
+
+def csv_header(ds: xr.Dataset) -> bytes:
+    """Header row naming the dimensions followed by the remaining columns."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator=os.linesep)
+    writer.writerow(list(ds.sizes) + _value_columns(ds))
+    return buffer.getvalue().encode("utf-8")
+
+
+def format_values(
+    values: np.ndarray, float_precision: int | None = None, unit: DatetimeUnit | None = None
+) -> np.ndarray:
+    """
+    Format an array as CSV field bytes, the same way pandas ``to_csv`` does.
+
+    Parameters
+    ----------
+    values
+        One-dimensional array of values
+    float_precision
+        Number of decimal places floating point values are rounded to,
+        or None to keep the shortest round-trip representation
+    unit
+        Unit datetimes are written in, see `datetime_unit`, or None to pick
+        it from ``values``
+
+    Returns
+    -------
+    np.ndarray
+        Array of ``bytes`` fields, with missing values as empty fields
+    """
+    kind = values.dtype.kind
+
+    if kind == "f":
+        if float_precision is not None:
+            values = np.round(values, float_precision)
+        fields = values.astype(bytes)
+        fields[np.isnan(values)] = b""
+        return fields
+
+    if kind in "iub":
+        return values.astype(bytes)
+
+    if kind == "M" and unit is not None:
+        return np.char.encode(_datetime_text(values, unit), "utf-8")
+
+    if kind in "mM":
+        # pandas picks the format from the values it is given
+        fields = np.asarray(pd.Index(values).astype(str), dtype=object)
+        fields[np.isnat(values)] = ""
+        return _quote(np.char.encode(fields.astype(str), "utf-8"))
+
+    fields = np.asarray(values, dtype=object)
+    missing = pd.isna(fields)
+    fields = fields.astype(str)
+    fields[missing] = ""
+    return _quote(np.char.encode(fields, "utf-8"))
+
+
+def datetime_unit(values: np.ndarray) -> DatetimeUnit:
+    """
+    Unit pandas ``to_csv`` writes a datetime column in, given all of its values.
+
+    Columns holding only dates are written as dates, others with the
+    seconds and as many fractional digits as their finest value needs.
+    """
+    nanoseconds = values[~np.isnat(values)].astype("datetime64[ns]").view(np.int64)
+    for unit, step in DATETIME_UNITS.items():
+        if not (nanoseconds % step).any():
+            return unit
+    return "ns"
+
+
+def datetime_units(ds: xr.Dataset, tiles: Iterable[dict[str, slice]]) -> dict[str, DatetimeUnit]:
+    """
+    Unit each datetime column of a schema is written in, see `datetime_unit`.
+
+    pandas picks the format of a datetime column from all of its values,
+    while a tile only holds some of them. The units are picked once from
+    the whole schema, so every tile of a CSV file is written alike.
+    Variables that are not in memory are read one tile at a time.
+
+    Parameters
+    ----------
+    ds
+        Dataset holding a single dimensional schema
+    tiles
+        ``isel`` indexers covering ``ds``
+
+    Returns
+    -------
+    dict[str, DatetimeUnit]
+        Unit of every datetime coordinate and variable
+    """
+    names = [str(name) for name, var in ds.variables.items() if var.dtype.kind == "M"]
+    units = {name: datetime_unit(ds[name].values) for name in names if name in ds.indexes}
+    lazy = [name for name in names if name not in units]
+    if not lazy:
+        return units
+
+    finest = dict.fromkeys(lazy, 0)
+    read: set[tuple] = set()
+    order = list(DATETIME_UNITS)
+    for indexer in tiles:
+        for name in lazy:
+            variable = ds.variables[name]
+            # Variables lacking the sliced dimensions span several tiles
+            selection = {dim: indexer[dim] for dim in map(str, variable.dims) if dim in indexer}
+            key = (name, *((dim, part.start, part.stop) for dim, part in selection.items()))
+            if key in read:
+                continue
+            read.add(key)
+            unit = datetime_unit(variable.isel(selection).values.ravel())
+            finest[name] = max(finest[name], order.index(unit))
+    return units | {name: order[idx] for name, idx in finest.items()}
+
+
+def format_datetimes(df: pd.DataFrame, units: Mapping[str, DatetimeUnit]) -> pd.DataFrame:
+    """
+    Frame with its datetime columns and index levels formatted as text.
+
+    ``to_csv`` picks the datetime format of each frame it writes; formatting
+    the datetimes in the units of the whole schema keeps the format of every
+    tile's frame the same.
+    """
+    df = df.assign(
+        **{
+            name: _datetime_text(df[name].to_numpy(), units[name])
+            for name in df.columns
+            if name in units
+        }
+    )
+    if isinstance(df.index, pd.MultiIndex):
+        # Levels hold the distinct values, so each is formatted once
+        levels = [
+            pd.Index(_datetime_text(level.to_numpy(), units[level.name]))
+            if level.name in units
+            else level
+            for level in df.index.levels
+        ]
+        df.index = df.index.set_levels(levels)
+    elif df.index.name in units:
+        df.index = pd.Index(
+            _datetime_text(df.index.to_numpy(), units[df.index.name]), name=df.index.name
+        )
+    return df
+
+
+def write_csv_numpy(
+    ds: xr.Dataset,
+    variables: list[str],
+    csv_file: WritableStream,
+    tiles: Iterable[dict[str, slice]],
+    float_precision: int | None = None,
+    stage: StageMetrics | None = None,
+    units: Mapping[str, DatetimeUnit] | None = None,
+) -> int:
+    """
+    Write a dimensional schema to an open binary stream, one tile at a time.
+
+    Parameters
+    ----------
+    ds
+        Dataset holding a single dimensional schema, with a coordinate for
+        every dimension
+    variables
+        Variables used to decide which rows hold data
+    csv_file
+        Binary stream the CSV text is written to
+    tiles
+        ``isel`` indexers covering ``ds`` in row order
+    float_precision
+        Number of decimal places floating point values are rounded to
+    stage
+        Stage the read time and bytes are added to
+    units
+        Unit each datetime column is written in, see `datetime_units`; by
+        default picked from ``ds`` before the first tile is written
+
+    Returns
+    -------
+    int
+        Number of data rows written
+    """
+    stage = stage if stage is not None else StageMetrics("schema")
+    if units is None:
+        tiles = list(tiles)
+        units = datetime_units(ds, tiles)
+    dims = list(dimension_sizes(ds))
+    columns = _value_columns(ds)
+    csv_file.write(csv_header(ds))
+    num_rows = 0
+
+    for indexer in tiles:
+        with stage.time("read"):
+            tile = ds.isel(indexer).compute()
+        stage.bytes_read += tile.nbytes
+        rows, positions = valid_rows(tile, variables)
+        if rows.size == 0:
+            continue
+
+        fields = [
+            _format_column(
+                tile[name].variable, dims, rows, positions, float_precision, units.get(name)
+            )
+            for name in dims + columns
+        ]
+
+        csv_file.write(_join_rows(fields))
+        num_rows += rows.size
+
+    return num_rows
+
+
+def valid_rows(tile: xr.Dataset, variables: list[str]) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Rows of a loaded tile where at least one variable holds data.
+
+    Parameters
+    ----------
+    tile
+        Loaded dataset holding a single dimensional schema
+    variables
+        Variables used to decide which rows hold data
+
+    Returns
+    -------
+    tuple
+        Flat indexes of the rows in ``to_dataframe`` order, and the position
+        of each of those rows along every dimension
+    """
+    dims = list(dimension_sizes(tile))
+    shape = tuple(tile.sizes[dim] for dim in dims)
+    valid = np.zeros(int(np.prod(shape)), dtype=bool)
+    for name in variables:
+        variable = tile[name].variable
+        missing = variable.copy(data=_is_missing(variable.values)).set_dims(dict(tile.sizes))
+        valid |= ~missing.transpose(*dims).values.ravel()
+    rows = np.flatnonzero(valid)
+    return rows, dict(zip(dims, np.unravel_index(rows, shape), strict=True))
+
+
+def sparse_dataframe(
+    tile: xr.Dataset, variables: list[str], float_precision: int | None = None
+) -> pd.DataFrame:
+    """
+    DataFrame of the rows of a loaded tile where at least one variable holds data.
+
+    The same frame as ``tile.to_dataframe().dropna(how="all", subset=variables)``,
+    built from only the valid rows, so its cost follows the amount of data
+    rather than the size of the grid.
+
+    Parameters
+    ----------
+    tile
+        Loaded dataset holding a single dimensional schema, with a coordinate
+        for every dimension
+    variables
+        Variables used to decide which rows hold data
+    float_precision
+        Number of decimal places floating point values are rounded to
+
+    Returns
+    -------
+    pd.DataFrame
+        Frame indexed by the dimensions, with one column per coordinate and
+        variable
+    """
+    dims = list(dimension_sizes(tile))
+    if not dims:
+        df = tile.to_dataframe().dropna(how="all", subset=variables)
+        return df.round(float_precision) if float_precision is not None else df
+
+    rows, positions = valid_rows(tile, variables)
+    levels = [_rounded(tile[dim].values[positions[dim]], float_precision) for dim in dims]
+    if len(dims) == 1:
+        index = pd.Index(levels[0], name=dims[0])
+    else:
+        index = pd.MultiIndex.from_arrays(levels, names=dims)
+    columns = {
+        name: _rounded(_gather(tile[name].variable, dims, rows, positions), float_precision)
+        for name in _value_columns(tile)
+    }
+    return pd.DataFrame(columns, index=index)
+
+
+def _gather(
+    variable: xr.Variable, dims: list[str], rows: np.ndarray, positions: dict[str, np.ndarray]
+) -> np.ndarray:
+    """Values of a variable at the given rows; scalars are repeated on every row."""
+    index = tuple(positions[dim] for dim in dims if dim in variable.dims)
+    return np.broadcast_to(_dims_ordered(variable, dims)[index], rows.shape)
+
+
+def _format_column(
+    variable: xr.Variable,
+    dims: list[str],
+    rows: np.ndarray,
+    positions: dict[str, np.ndarray],
+    float_precision: int | None,
+    unit: DatetimeUnit | None,
+) -> np.ndarray:
+    """
+    CSV fields of a variable at the given rows.
+
+    Values repeated across rows, because the variable lacks some of the
+    schema's dimensions, are formatted once and looked up for every row.
+    Only the values used by the rows are formatted; datetimes are written
+    in the unit picked for the whole schema, so every tile formats them
+    alike.
+    """
+    values = _dims_ordered(variable, dims)
+    if variable.ndim == len(dims):
+        return format_values(values.ravel()[rows], float_precision, unit)
+
+    index = tuple(positions[dim] for dim in dims if dim in variable.dims)
+    flat = np.ravel_multi_index(index, values.shape) if index else np.zeros_like(rows)
+    used = np.zeros(values.size, dtype=bool)
+    used[flat] = True
+    fields = format_values(values.ravel()[used], float_precision, unit)
+    # Position of each used value among the formatted ones
+    lookup = np.cumsum(used) - 1
+    return fields[lookup[flat]]
+
+
+def _datetime_text(values: np.ndarray, unit: DatetimeUnit) -> np.ndarray:
+    """Datetimes in ISO format with a space before the time, as pandas writes them."""
+    text = np.char.replace(np.datetime_as_string(values, unit=unit), "T", " ")
+    text[np.isnat(values)] = ""
+    return text
+
+
+def _rounded(values: np.ndarray, float_precision: int | None) -> np.ndarray:
+    """Values rounded to a number of decimal places when they are floating point."""
+    if float_precision is not None and values.dtype.kind == "f":
+        return np.round(values, float_precision)
+    return values
+
+
+def _value_columns(ds: xr.Dataset) -> list[str]:
+    """Non-index columns in the order ``to_dataframe`` uses."""
+    return [str(name) for name in ds.variables if name not in ds.dims]
+
+
+def _dims_ordered(variable: xr.Variable, dims: list[str]) -> np.ndarray:
+    """Values of a variable with its dimensions in schema order."""
+    return variable.transpose(*[dim for dim in dims if dim in variable.dims]).values
+
+
+def _is_missing(values: np.ndarray) -> np.ndarray:
+    """Vectorized equivalent of ``pd.isna`` for the common dtypes."""
+    kind = values.dtype.kind
+    if kind == "f":
+        return np.isnan(values)
+    if kind in "mM":
+        return np.isnat(values)
+    if kind in "iub":
+        return np.zeros(values.shape, dtype=bool)
+    return pd.isna(values)
+
+
+def _quote(fields: np.ndarray) -> np.ndarray:
+    """Quote fields containing delimiters, following ``csv.QUOTE_MINIMAL``."""
+    needs_quotes = np.zeros(fields.shape, dtype=bool)
+    for trigger in _QUOTE_TRIGGERS:
+        needs_quotes |= np.char.find(fields, trigger) >= 0
+    if needs_quotes.any():
+        fields = fields.astype(object)
+        quoted = np.char.replace(fields[needs_quotes].astype(bytes), b'"', b'""')
+        fields[needs_quotes] = np.char.add(np.char.add(b'"', quoted), b'"')
+        fields = fields.astype(bytes)
+    return fields
+
+
+def _join_rows(fields: list[np.ndarray]) -> bytes:
+    """Join per-column fields into CSV rows."""
+    text = fields[0]
+    for column in fields[1:]:
+        text = np.char.add(np.char.add(text, b","), column)
+    text = np.char.add(text, LINE_TERMINATOR)
+    # Fixed-width byte strings are NUL padded, which never appears in CSV text
+    return text.tobytes().replace(b"\x00", b"")
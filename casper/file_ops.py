@@ -2,35 +2,59 @@
 
 from __future__ import annotations
 
+import glob
+import itertools
 import logging
+from collections.abc import Iterator
 from logging import Logger
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import netCDF4 as nc
-import numpy as np
+# netCDF4 and numpy are imported by the functions reading files, so
+# checking an input filename on the command line stays fast
+if TYPE_CHECKING:
+    import netCDF4 as nc
+    import numpy as np
+
+    from casper.session import GranuleSession
 
 module_logger = logging.getLogger(__name__)
 
 # Module constants
 VALID_EXTENSIONS = [".h5", ".nc", ".nc4", ".netcdf"]
+GLOB_CHARACTERS = "*?["
+EMPTY_CHECK_MAX_BYTES = 256 * 1024**2
+CONTIGUOUS_SLAB_BYTES = 4 * 1024**2
 
 
-def valid_workable_file(filename: str, logger: Logger = module_logger) -> bool:
+def valid_workable_file(filename: str | GranuleSession, logger: Logger = module_logger) -> bool:
     """
     Verify file is a valid non-empty netCDF files.
 
+    Parameters
+    ----------
+    filename
+        Name of the file to check, or a session already holding it open
+
     Returns
     -------
     Boolean
         True if valid file that can be converted
 
     """
+    import netCDF4 as nc
+
     try:
-        with nc.Dataset(filename, "r") as dataset:
-            if not _is_file_empty(dataset):
-                logger.debug("File is valid and non-empty: %s", filename)
-            else:
-                logger.debug("File is empty: %s", filename)
+        if isinstance(filename, str | Path):
+            with nc.Dataset(filename, "r") as dataset:
+                is_empty = _is_file_empty(dataset)
+        else:
+            is_empty = filename.is_empty()
+            filename = filename.filename
+        if not is_empty:
+            logger.debug("File is valid and non-empty: %s", filename)
+        else:
+            logger.debug("File is empty: %s", filename)
         return True
     except Exception as e:
         logger.debug("Error opening %s as netCDF: %s", filename, e)
@@ -76,7 +100,38 @@ def valid_input_file(filename: str) -> bool:
     raise ValueError(f"Input path '{path}' is not a valid file")
 
 
-def _is_file_empty(dataset: nc.Dataset | nc.Group) -> bool:
+def expand_input_paths(paths: list[str]) -> list[str]:
+    """
+    Files to convert, from a list of files, glob patterns and directories.
+
+    Parameters
+    ----------
+    paths
+        Files, glob patterns (``**`` matches any number of directories) and
+        directories, whose netCDF files are converted, recursively
+
+    Returns
+    -------
+    list[str]
+        Files in the order given, each once. Patterns matching nothing are
+        kept as given, so they are reported as invalid inputs.
+    """
+    files: list[str] = []
+    for path in paths:
+        if Path(path).is_dir():
+            files.extend(
+                str(file)
+                for file in sorted(Path(path).rglob("*"))
+                if file.is_file() and file.suffix.lower() in VALID_EXTENSIONS
+            )
+        elif any(char in path for char in GLOB_CHARACTERS):
+            files.extend(sorted(glob.glob(path, recursive=True)) or [path])
+        else:
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+
+def _is_file_empty(dataset: nc.Dataset | nc.Group, max_bytes: int = EMPTY_CHECK_MAX_BYTES) -> bool:
     """Check if netCDF dataset is empty.
 
     A dataset is considered empty if all variables are:
@@ -85,39 +140,98 @@ def _is_file_empty(dataset: nc.Dataset | nc.Group) -> bool:
     3. All fill values, OR
     4. All NaN values
 
+    Variables are read one storage chunk at a time and the check stops at
+    the first value that holds data. Coordinate variables and small
+    variables are checked first, as they are the cheapest to read and the
+    most likely to hold data.
+
     Parameters
     ----------
-    parent_group
+    dataset
         netCDF dataset or group to check
+    max_bytes
+        Maximum number of bytes to read. If the limit is reached before any
+        data is found, the dataset is assumed not to be empty.
 
     Returns
     -------
     bool
         True if dataset is empty, False if any variable contains data
     """
-    for _var_name, var in dataset.variables.items():
-        if var.size == 0:
-            continue  # Empty variable, check next one
+    import numpy as np
+
+    bytes_read = 0
+    for var in sorted(_all_variables(dataset), key=_check_order):
+        fill_value = getattr(var, "_FillValue", None)
+        for slab in _storage_chunks(var):
+            if bytes_read >= max_bytes:
+                module_logger.debug(
+                    "Read %d bytes without finding data, assuming not empty", bytes_read
+                )
+                return False
+
+            # Load one chunk of the data
+            var_data = var[slab]
+            bytes_read += np.asarray(var_data).nbytes
+            if _has_data(var_data, fill_value):
+                return False  # Found a non-empty variable
+
+    return True
 
-        # Get fill value if defined
-        fill_or_null = (
-            getattr(var, "_FillValue", np.nan) if "_FillValue" in var.ncattrs() else np.nan
-        )
 
-        # Load the data
-        var_data = var[:]
+def _all_variables(group: nc.Dataset | nc.Group) -> list[nc.Variable]:
+    """All variables of a group and its child groups."""
+    variables = list(group.variables.values())
+    for child_group in group.groups.values():
+        variables.extend(_all_variables(child_group))
+    return variables
+
+
+def _check_order(var: nc.Variable) -> tuple[bool, int]:
+    """Sort key placing coordinate variables first, then smaller variables."""
+    is_coordinate = var.dimensions == (var.name,)
+    return not is_coordinate, var.size
+
+
+def _storage_chunks(var: nc.Variable) -> Iterator[tuple[slice, ...]]:
+    """Slabs covering a variable, aligned with its storage chunks.
+
+    Contiguous variables are read in slabs of roughly CONTIGUOUS_SLAB_BYTES
+    along their first dimension.
+    """
+    import numpy as np
+
+    if var.size == 0:
+        return
+    shape = var.shape
+    if len(shape) == 0:
+        yield ()
+        return
+
+    chunking = var.chunking()
+    if chunking == "contiguous" or chunking is None:
+        # Variable-length strings have no fixed item size
+        itemsize = var.dtype.itemsize if isinstance(var.dtype, np.dtype) else 8
+        row_bytes = max(1, var.size // shape[0] * itemsize)
+        chunk_shape = [max(1, CONTIGUOUS_SLAB_BYTES // row_bytes), *shape[1:]]
+    else:
+        chunk_shape = list(chunking)
+
+    starts = [range(0, size, step) for size, step in zip(shape, chunk_shape, strict=True)]
+    for corner in itertools.product(*starts):
+        yield tuple(
+            slice(start, start + step) for start, step in zip(corner, chunk_shape, strict=True)
+        )
 
-        # Check if variable is non-empty using three different methods
-        # Check 1: Are all values masked?
-        if np.ma.isMaskedArray(var_data) and (
-            not var_data.mask.all() and not np.all(np.isnan(var_data.data))
-        ):
-            return False  # Found a non-empty masked array
 
-        # Check 2: Are all values equal to fill value?
-        # Check 3: Are all values NaN?
-        if not np.all(var_data.data == fill_or_null) and not np.all(np.isnan(var_data.data)):
-            return False  # Found a non-empty variable
+def _has_data(var_data: np.ndarray, fill_value) -> bool:
+    """Check if any value is not masked, NaN or the fill value."""
+    import numpy as np
 
-    # Check all child groups recursively, and return True if all variables and groups are empty.
-    return all(_is_file_empty(child_group) for child_group in dataset.groups.values())
+    present = ~np.ma.getmaskarray(var_data)
+    values = np.ma.getdata(var_data)
+    if values.dtype.kind in "fc":
+        present &= ~np.isnan(values)
+    if fill_value is not None:
+        present &= values != fill_value
+    return bool(present.any())
@@ -26,11 +26,12 @@
 # limitations under the License.
 """A Harmony CLI wrapper around casper"""
 
-from argparse import ArgumentParser
+import sys
+from argparse import ArgumentParser, FileType
 
 import harmony_service_lib
 
-from casper.harmony.service_adapter import CasperAdapter as HarmonyAdapter
+from casper.harmony.worker import run_worker
 
 
 def main(config: harmony_service_lib.util.Config = None) -> None:
@@ -50,8 +51,31 @@ def main(config: harmony_service_lib.util.Config = None) -> None:
         description="Run the CSV Automation Service for Processing & Easy Retrieval function",
     )
     harmony_service_lib.setup_cli(parser)
+    parser.add_argument(
+        "--worker",
+        nargs="?",
+        const=sys.stdin,
+        type=FileType("r"),
+        metavar="PATH",
+        help="keep running and invoke the service for each work item read from PATH, "
+        "or standard input, one JSON object per line; see casper.harmony.worker",
+    )
+    parser.add_argument(
+        "--worker-results",
+        default=sys.stdout,
+        type=FileType("w"),
+        metavar="PATH",
+        help="file a JSON result line is written to for each work item (default: stdout)",
+    )
     args = parser.parse_args()
-    if harmony_service_lib.is_harmony_cli(args):
+
+    # The service, and the scientific stack it needs, is imported once the
+    # arguments are known to be valid
+    from casper.harmony.service_adapter import CasperAdapter as HarmonyAdapter
+
+    if args.worker is not None:
+        run_worker(parser, args, HarmonyAdapter, args.worker, args.worker_results, cfg=config)
+    elif harmony_service_lib.is_harmony_cli(args):
         harmony_service_lib.run_cli(parser, args, HarmonyAdapter, cfg=config)
     else:
         parser.error("Only --harmony CLIs are supported")
@@ -15,22 +15,25 @@ def download_file(
     cfg: dict,
 ) -> str:
     """
-    A method to be executed in a separate process which processes the url_queue
-    and places paths to completed downloads into the path_list. Downloads are
-    handled by harmony.util.download
+    Download a single granule, keeping its original filename. Called from a
+    pool of worker threads so several granules download simultaneously.
+    Downloads are handled by harmony.util.download
 
     Parameters
     ----------
-    url_queue : queue.Queue
-        URLs to process - should be filled from start and only decreases
-    path_list : list
-        paths to completed file downloads
+    url : str
+        URL of the granule to download
     destination_dir : str
         output path for downloaded files
     access_token : str
         access token as provided in Harmony input
     cfg : dict
         Harmony configuration information
+
+    Returns
+    -------
+    str
+        Path to the downloaded file
     """
 
     logger = build_logger(cfg)
@@ -25,9 +25,15 @@
 # either express or implied. See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import time
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
 from pathlib import Path
-from shutil import copyfile
+from shutil import copyfile, rmtree
 from tempfile import TemporaryDirectory
+from typing import Any
 from urllib.parse import urlsplit
 from uuid import uuid4
 
@@ -36,12 +42,27 @@ from harmony_service_lib.util import generate_output_filename, stage
 from pystac import Catalog, Item
 from pystac.item import Asset
 
+from casper.columnar import output_format_for_mime
 from casper.convert_to_csv import convert_to_csv
 from casper.harmony.download_worker import download_file
+from casper.harmony.staging import DEFAULT_PART_SIZE, stage_stream
 from casper.harmony.util import (
-    _get_item_url,
+    _get_netcdf_urls,
     _get_output_date_range,
+    _get_requested_variables,
 )
+from casper.metrics import (
+    METRICS_PROPERTY,
+    ConversionMetrics,
+    MeteredWriter,
+    StageMetrics,
+)
+from casper.output_cache import DEFAULT_OUTPUT_CACHE_SIZE, Checkpoints, OutputCache, output_key
+from casper.schema_cache import DEFAULT_CACHE_SIZE, SchemaPlanCache
+from casper.session import GranuleSession
+from casper.subset import Subset
+from casper.tiling import DEFAULT_MEMORY_BUDGET, parse_byte_size
+from casper.zip_writer import WritableStream
 
 
 class CasperAdapter(BaseHarmonyAdapter):
@@ -65,6 +86,59 @@ class CasperAdapter(BaseHarmonyAdapter):
             The configuration values for this runtime environment.
         """
         super().__init__(message, catalog=catalog, config=config)
+        # Service tuning is read from the container environment
+        self.memory_budget = parse_byte_size(
+            os.environ.get("CASPER_MEMORY_BUDGET", DEFAULT_MEMORY_BUDGET)
+        )
+        self.csv_engine = os.environ.get("CASPER_CSV_ENGINE", "pandas")
+        float_precision = os.environ.get("CASPER_FLOAT_PRECISION")
+        self.float_precision = int(float_precision) if float_precision else None
+        self.workers = int(os.environ.get("CASPER_WORKERS", 1))
+        self.compression_threads = int(os.environ.get("CASPER_COMPRESSION_THREADS", 1))
+        self.download_workers = int(os.environ.get("CASPER_DOWNLOAD_WORKERS", 4))
+        self.streaming_stage = os.environ.get("CASPER_STREAMING_STAGE", "false").lower() == "true"
+        self.upload_part_size = parse_byte_size(
+            os.environ.get("CASPER_UPLOAD_PART_SIZE", DEFAULT_PART_SIZE)
+        )
+        schema_cache_dir = os.environ.get("CASPER_SCHEMA_CACHE_DIR")
+        self.schema_cache = (
+            SchemaPlanCache(
+                schema_cache_dir,
+                parse_byte_size(os.environ.get("CASPER_SCHEMA_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+            )
+            if schema_cache_dir
+            else None
+        )
+        self.profile = os.environ.get("CASPER_PROFILE", "false").lower() == "true"
+        self.metrics_in_catalog = (
+            os.environ.get("CASPER_METRICS_IN_CATALOG", "false").lower() == "true"
+        )
+        self.compression = os.environ.get("CASPER_COMPRESSION", "deflate")
+        compression_level = os.environ.get("CASPER_COMPRESSION_LEVEL")
+        self.compression_level = int(compression_level) if compression_level else None
+        shard_rows = os.environ.get("CASPER_SHARD_ROWS")
+        self.shard_rows = int(shard_rows) if shard_rows else None
+        shard_size = os.environ.get("CASPER_SHARD_SIZE")
+        self.shard_size = parse_byte_size(shard_size) if shard_size else None
+        output_cache_dir = os.environ.get("CASPER_OUTPUT_CACHE_DIR")
+        # Profiled conversions are always run, for the sake of their reports
+        self.output_cache = (
+            OutputCache(
+                output_cache_dir,
+                parse_byte_size(
+                    os.environ.get("CASPER_OUTPUT_CACHE_SIZE", DEFAULT_OUTPUT_CACHE_SIZE)
+                ),
+            )
+            if output_cache_dir and not self.profile
+            else None
+        )
+        self.variables = _get_requested_variables(self.message)
+        # Bounding box and temporal constraints are pushed down into the read
+        self.subset = Subset.from_message(self.message)
+        # Parquet or Arrow IPC files are written when the request asks for them
+        self.output_format = output_format_for_mime(
+            self.message.format.mime if self.message.format else None
+        )
 
     def invoke(self):
         """
@@ -88,65 +162,44 @@ class CasperAdapter(BaseHarmonyAdapter):
 
             # Get all the items from the catalog, including from child or linked catalogs
             items = list(self.get_all_catalog_items(catalog))
-            datetimes = _get_output_date_range(items)
 
             # Just return if catalog contains no items
             if len(items) == 0:
                 return result
 
-            # # --- Get granule filepath (url) ---
-            netcdf_url = _get_item_url(items[0])
-            if netcdf_url is None:
-                raise ValueError("No URL found for item")
-
-            with TemporaryDirectory() as temp_dir:
-                # Download file
-                input_file = download_file(
-                    netcdf_url, temp_dir, self.message.accessToken, self.config
-                )
+            # --- Get granule filepaths (urls) ---
+            netcdf_urls = _get_netcdf_urls(items)
 
-                # Zip filename is the input filename without the file extension
-                zip_file_name = Path(input_file).stem
+            output_items: list[Item | None] = [None] * len(items)
+            with (
+                TemporaryDirectory() as temp_dir,
+                ThreadPoolExecutor(max_workers=self.download_workers) as pool,
+            ):
+                # Bound the downloads in flight or waiting for conversion, so
+                # local disk only ever holds a few granules
+                queued = iter(enumerate(netcdf_urls))
+                pending: dict[Future, int] = {}
+                for _ in range(self.download_workers):
+                    self._submit_download(pool, queued, pending, temp_dir)
 
-                # Create the subdirectory
-                self.logger.info("Running Casper.")
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = pending.pop(future)
+                        input_file, download_stage = future.result()
+                        # Convert each granule as soon as its download lands
+                        output_items[index] = self._process_item(
+                            items[index], input_file, Path(temp_dir) / str(index), download_stage
+                        )
+                        self._submit_download(pool, queued, pending, temp_dir)
 
-                # Use Harmony generated filename
-                zip_file = generate_output_filename(zip_file_name, ext="zip", is_reformatted=True)
-                zip_file = Path(temp_dir) / zip_file
-
-                # --- Run Casper ---
-                convert_to_csv(
-                    input_file,
-                    zip_file,
-                    logger=self.logger,
-                )
-
-                self.logger.info(f"Casper conversion completed. Zip file created {zip_file}")
-
-                staged_url = self._stage(zip_file, zip_file.name, "application/zip")
             # -- Output to STAC catalog --
             result.clear_items()
-            properties = {
-                "start_datetime": datetimes["start_datetime"],
-                "end_datetime": datetimes["end_datetime"],
-            }
-            item = Item(
-                str(uuid4()),
-                None,
-                None,
-                None,
-                properties,
-            )
-
-            asset = Asset(
-                staged_url,
-                title=zip_file.name,
-                media_type="application/zip",
-                roles=["data"],
-            )
-            item.add_asset("data", asset)
-            result.add_item(item)
+            for url, item in zip(netcdf_urls, output_items, strict=True):
+                if item is None:
+                    # Every download is converted or raises, so this is a bug
+                    raise RuntimeError(f"No output item was created for {url}")
+                result.add_item(item)
 
             self.logger.info("STAC catalog creation complete.")
 
@@ -156,6 +209,173 @@ class CasperAdapter(BaseHarmonyAdapter):
             self.logger.error(service_exception, exc_info=1)
             raise service_exception
 
+    def _submit_download(
+        self,
+        pool: ThreadPoolExecutor,
+        queued: Iterator[tuple[int, str]],
+        pending: dict[Future, int],
+        temp_dir: str,
+    ):
+        """Start downloading the next queued granule into its own subdirectory."""
+        for index, url in islice(queued, 1):
+            item_dir = Path(temp_dir) / str(index)
+            item_dir.mkdir()
+            future = pool.submit(self._download, url, item_dir)
+            pending[future] = index
+
+    def _download(self, url: str, item_dir: Path) -> tuple[str, StageMetrics]:
+        """Download a granule, measuring the download stage."""
+        stage = StageMetrics("download")
+        start = time.perf_counter()
+        input_file = download_file(url, str(item_dir), self.message.accessToken, self.config)
+        stage.seconds = time.perf_counter() - start
+        stage.bytes_written = Path(input_file).stat().st_size
+        stage.measure_memory()
+        return input_file, stage
+
+    def _process_item(
+        self, item: Item, input_file: str, item_dir: Path, download_stage: StageMetrics
+    ) -> Item:
+        """
+        Convert one downloaded granule, stage the zip file and describe it
+        with a new STAC item.
+
+        Parameters
+        ----------
+        item : pystac.Item
+            The input item the granule was downloaded from
+        input_file : str
+            Path to the downloaded granule
+        item_dir : Path
+            Working directory for this item, removed once the zip file is staged
+        download_stage : StageMetrics
+            Metrics of the granule's download
+
+        Returns
+        -------
+        pystac.Item
+            Output item with the staged zip file as its data asset
+        """
+        # Zip filename is the input filename without the file extension
+        zip_file_name = Path(input_file).stem
+
+        self.logger.info(f"Running Casper on {Path(input_file).name}.")
+
+        # Use Harmony generated filename
+        zip_name = generate_output_filename(zip_file_name, ext="zip", is_reformatted=True)
+        metrics = ConversionMetrics(Path(input_file).name)
+        metrics.add(download_stage)
+
+        key = self._output_key(input_file) if self.output_cache is not None else None
+        cached = self.output_cache.get(key) if key is not None else None
+        if cached is not None:
+            self.logger.info(f"Zip file found in the output cache {cached}")
+            with metrics.stage("staging") as staging:
+                staging.bytes_written = cached.stat().st_size
+                staged_url = self._stage(cached, zip_name, "application/zip")
+        elif self.streaming_stage and key is None:
+            # Upload the zip file while it is being written; staging covers
+            # the writes to the upload and completing it
+            staging = StageMetrics("staging")
+            with stage_stream(
+                zip_name,
+                "application/zip",
+                self.message.stagingLocation,
+                self.config,
+                self.logger,
+                part_size=self.upload_part_size,
+            ) as (stream, staged_url):
+                self._convert(input_file, MeteredWriter(stream, staging, "upload"), metrics)
+                completing = time.perf_counter()
+            staging.seconds = time.perf_counter() - completing + staging.timings["upload"]
+            staging.measure_memory()
+            metrics.add(staging)
+            self.logger.info(f"Casper conversion completed. Zip file staged {staged_url}")
+        else:
+            # Cached conversions are written locally, to be checkpointed and kept
+            zip_file = item_dir / zip_name
+            checkpoints = self.output_cache.checkpoints(key) if key is not None else None
+            self._convert(input_file, zip_file, metrics, checkpoints)
+            self.logger.info(f"Casper conversion completed. Zip file created {zip_file}")
+            if key is not None:
+                self.output_cache.put(key, zip_file)
+            with metrics.stage("staging") as staging:
+                staging.bytes_written = zip_file.stat().st_size
+                staged_url = self._stage(zip_file, zip_name, "application/zip")
+
+        # The downloaded granule and zip file are no longer needed
+        rmtree(item_dir)
+
+        datetimes = _get_output_date_range([item])
+        properties: dict[str, Any] = {
+            "start_datetime": datetimes["start_datetime"],
+            "end_datetime": datetimes["end_datetime"],
+        }
+        metrics.log(self.logger)
+        if self.metrics_in_catalog:
+            properties[METRICS_PROPERTY] = metrics.to_dict()
+        output_item = Item(
+            str(uuid4()),
+            None,
+            None,
+            None,
+            properties,
+        )
+
+        asset = Asset(
+            staged_url,
+            title=zip_name,
+            media_type="application/zip",
+            roles=["data"],
+        )
+        output_item.add_asset("data", asset)
+        return output_item
+
+    def _convert(
+        self,
+        input_file: str,
+        zip_file: Path | WritableStream,
+        metrics: ConversionMetrics,
+        checkpoints: Checkpoints | None = None,
+    ):
+        """Run casper with the settings from the container environment."""
+        with GranuleSession(input_file, self.logger, self.variables) as session:
+            convert_to_csv(
+                session,
+                zip_file,
+                logger=self.logger,
+                memory_budget=self.memory_budget,
+                engine=self.csv_engine,
+                float_precision=self.float_precision,
+                workers=self.workers,
+                compression_threads=self.compression_threads,
+                schema_cache=self.schema_cache,
+                metrics=metrics,
+                profile=self.profile,
+                output_format=self.output_format,
+                compression=self.compression,
+                compression_level=self.compression_level,
+                subset=self.subset,
+                shard_rows=self.shard_rows,
+                shard_size=self.shard_size,
+                checkpoints=checkpoints,
+            )
+
+    def _output_key(self, input_file: str) -> str:
+        """Output cache key of a granule converted with this request's settings."""
+        return output_key(
+            input_file,
+            engine=self.csv_engine,
+            float_precision=self.float_precision,
+            output_format=self.output_format,
+            compression=self.compression,
+            compression_level=self.compression_level,
+            subset=self.subset,
+            variables=sorted(self.variables) if self.variables else None,
+            shard_rows=self.shard_rows,
+            shard_size=self.shard_size,
+        )
+
     def _stage(self, local_filename: str, remote_filename: str, mime: str) -> str:
         """
         Stages a local file to either to S3 (utilizing harmony.util.stage) or to
@@ -0,0 +1,248 @@
+# Copyright 2024 United States Government as represented by the
+# Administrator of the National Aeronautics and Space Administration. All Rights Reserved.
+#
+# This software calls the following third-party software, which is subject to the terms and
+# conditions of its licensor, as applicable.  Users must license their own copies;
+# the links are provided for convenience only.
+#
+# Harmony-service-lib-py
+# https://www.apache.org/licenses/LICENSE-2.0
+# https://github.com/nasa/harmony-service-lib-py?tab=License-1-ov-file
+#
+# boto3
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Python Standard Library (version 3.10)
+# https://docs.python.org/3/license.html#psf-license
+#
+# The Batchee: Granule batcher service to support concatenation platform is licensed under the
+# Apache License, Version 2.0 (the "License"); you may not use this file except in compliance with
+# the License. You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+"""Streaming staging of output files while they are being written"""
+
+import io
+import os
+from collections import deque
+from collections.abc import Buffer, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from logging import Logger
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import boto3
+from harmony_service_lib.aws import aws_parameters
+from harmony_service_lib.util import Config
+
+from casper.zip_writer import WritableStream
+
+# Module constants
+MIN_PART_SIZE = 5 * 1024**2
+DEFAULT_PART_SIZE = 16 * 1024**2
+DEFAULT_UPLOAD_THREADS = 4
+
+
+class S3MultipartUpload(io.RawIOBase):
+    """
+    Writable stream that uploads to S3 with a multipart upload.
+
+    Written data is cut into parts that are uploaded on a thread pool while
+    later data is still being produced. The object is only created in S3
+    when the stream is closed; `abort` discards the parts uploaded so far.
+
+    Parameters
+    ----------
+    client
+        boto3 S3 client, or any object with the same multipart upload methods
+    bucket
+        Destination bucket
+    key
+        Destination object key
+    mime
+        Content type of the object
+    part_size
+        Size of every part except the last, at least 5 MiB
+    upload_threads
+        Number of parts uploaded concurrently
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        mime: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        upload_threads: int = DEFAULT_UPLOAD_THREADS,
+    ):
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            # Nothing to complete or abort when the stream is garbage collected
+            super().close()
+            raise ValueError(f"Multipart upload parts must be at least {MIN_PART_SIZE} bytes")
+
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.upload_threads = upload_threads
+        self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=mime)[
+            "UploadId"
+        ]
+        self.parts: list[dict] = []
+        self._buffer = bytearray()
+        self._pending: deque[Future[dict]] = deque()
+        self._pool = ThreadPoolExecutor(upload_threads, thread_name_prefix="upload")
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Buffer) -> int:
+        """Buffer data, uploading every full part."""
+        if self.closed:
+            raise ValueError("I/O operation on closed upload")
+        # Counted in bytes, whatever the format of the buffer
+        data = memoryview(data).cast("B")
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            self._submit(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+        return len(data)
+
+    def close(self):
+        """Upload the last part and complete the multipart upload."""
+        if self.closed:
+            return
+        try:
+            # S3 needs at least one part, which may be empty if it is the only one
+            if self._buffer or not (self.parts or self._pending):
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self.parts.append(self._pending.popleft().result())
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self._pool.shutdown()
+            super().close()
+
+    def abort(self):
+        """Discard the upload and any parts already uploaded."""
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown()
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+        )
+        super().close()
+
+    def _submit(self, body: bytes):
+        """Upload a part on the thread pool, keeping a bounded backlog."""
+        part_number = len(self.parts) + len(self._pending) + 1
+        self._pending.append(self._pool.submit(self._upload_part, part_number, body))
+        while len(self._pending) > self.upload_threads:
+            self.parts.append(self._pending.popleft().result())
+
+    def _upload_part(self, part_number: int, body: bytes) -> dict:
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+
+@contextmanager
+def stage_stream(
+    remote_filename: str,
+    mime: str,
+    location: str,
+    cfg: Config,
+    logger: Logger,
+    part_size: int = DEFAULT_PART_SIZE,
+    client=None,
+) -> Iterator[tuple[WritableStream, str]]:
+    """
+    Open a stream that stages a file while it is being written.
+
+    For file:// locations the stream writes straight to the destination
+    file, which is removed if the block raises. For S3 locations finished
+    parts are uploaded in the background with a multipart upload, which
+    completes when the block exits and is aborted if the block raises.
+
+    Parameters
+    ----------
+    remote_filename : string
+        The basename to give to the remote file
+    mime : string
+        The mime type to apply to the staged file
+    location : string
+        The staging location URL, e.g. message.stagingLocation
+    cfg : harmony.util.Config
+        The configuration values for this runtime environment
+    logger : Logger
+        Logger instance for output messages
+    part_size : int
+        Size of the multipart upload parts
+    client
+        S3 client to use instead of one built from cfg, e.g. a local stand-in
+
+    Yields
+    ------
+    tuple[WritableStream, str]
+        The stream to write to and the URL of the staged file
+    """
+    url_components = urlsplit(location)
+
+    if url_components.scheme == "file":
+        dest_path = Path(url_components.path).joinpath(remote_filename)
+        logger.info("Streaming to local filesystem: '%s'", str(dest_path))
+        try:
+            with open(dest_path, "wb") as stream:
+                yield stream, dest_path.as_uri()
+        except BaseException:
+            # Leave no truncated file behind
+            dest_path.unlink(missing_ok=True)
+            raise
+        return
+
+    bucket = url_components.netloc
+    key = url_components.path.lstrip("/") + remote_filename
+
+    if client is None and cfg.env in ["dev", "test"] and not cfg.use_localstack:
+        logger.warning(
+            f"ENV={cfg.env} and not using localstack, so we will not stage {remote_filename} to {key}"
+        )
+        with open(os.devnull, "wb") as stream:
+            yield stream, "http://example.com/" + key
+        return
+
+    if client is None:
+        client = boto3.client(
+            "s3",
+            **aws_parameters(cfg.use_localstack, cfg.localstack_host, cfg.aws_default_region),
+        )
+
+    logger.info("Streaming multipart upload to s3://%s/%s", bucket, key)
+    upload = S3MultipartUpload(client, bucket, key, mime, part_size=part_size)
+    try:
+        yield upload, f"s3://{bucket}/{key}"
+    except BaseException:
+        upload.abort()
+        raise
+    upload.close()
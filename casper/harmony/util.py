@@ -28,6 +28,7 @@
 
 from datetime import datetime
 
+from harmony_service_lib.message import Message
 from pystac import Asset, Item
 
 VALID_EXTENSIONS = (".nc4", ".nc")
@@ -109,4 +110,17 @@ def _get_netcdf_urls(items: list[Item]) -> list[str]:
     if None in catalog_urls:
         raise RuntimeError("Some input granules do not have NetCDF-4 assets.")
 
-    return catalog_urls[0]  # type: ignore[return-value]
+    return catalog_urls  # type: ignore[return-value]
+
+
+def _get_requested_variables(message: Message) -> list[str] | None:
+    """Full paths of the variables named in the message's sources, or None
+    if no variables were requested, in which case all of them are converted.
+
+    """
+    variables = [
+        variable.fullPath or variable.name
+        for source in message.sources or []
+        for variable in source.variables or []
+    ]
+    return variables or None
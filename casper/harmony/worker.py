@@ -0,0 +1,154 @@
+# Copyright 2024 United States Government as represented by the
+# Administrator of the National Aeronautics and Space Administration. All Rights Reserved.
+#
+# This software calls the following third-party software, which is subject to the terms and
+# conditions of its licensor, as applicable.  Users must license their own copies;
+# the links are provided for convenience only.
+#
+# Harmony-service-lib-py
+# https://www.apache.org/licenses/LICENSE-2.0
+# https://github.com/nasa/harmony-service-lib-py?tab=License-1-ov-file
+#
+# Python Standard Library (version 3.10)
+# https://docs.python.org/3/license.html#psf-license
+#
+# The Batchee: Granule batcher service to support concatenation platform is licensed under the
+# Apache License, Version 2.0 (the "License"); you may not use this file except in compliance with
+# the License. You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+"""A long-running worker invoking the service for a stream of work items
+
+Running the service once per work item pays for starting Python and
+importing xarray, netCDF4, pystac and harmony-service-lib every time,
+which dominates the conversion of small granules. The worker keeps one
+process, with its imports, HDF5 library, loggers and configuration, for
+every work item it reads.
+
+Work items are read one JSON object per line, with the values of the
+``--harmony-*`` arguments of a single invocation::
+
+    {"input": {...}, "sources": "/work/1/inputs/catalog.json", "metadata_dir": "/work/1/outputs"}
+
+``input`` is the Harmony message, as an object or a JSON string, and may be
+replaced by ``input_file``; ``data_location`` is optional. One JSON line is
+written per item once it is done, with its ``status`` and, for failures,
+the ``error``.
+"""
+
+import json
+import time
+from argparse import ArgumentParser, Namespace
+from collections.abc import Iterable
+from typing import NamedTuple, TextIO
+
+from harmony_service_lib import run_cli
+from harmony_service_lib.logging import setup_stdout_log_formatting
+from harmony_service_lib.util import Config, config
+
+
+class WorkItem(NamedTuple):
+    """Arguments of a single service invocation."""
+
+    metadata_dir: str
+    input: str | None = None
+    input_file: str | None = None
+    sources: str | None = None
+    data_location: str | None = None
+
+    @classmethod
+    def from_json(cls, line: str) -> "WorkItem":
+        """Parse a work item from a line of JSON."""
+        fields = json.loads(line)
+        if not isinstance(fields, dict):
+            raise ValueError("Work item must be a JSON object")
+        unknown = set(fields) - set(cls._fields)
+        if unknown:
+            raise ValueError(f"Unknown work item fields: {', '.join(sorted(unknown))}")
+        if not fields.get("metadata_dir"):
+            raise ValueError("Work item needs a metadata_dir")
+        if not fields.get("input") and not fields.get("input_file"):
+            raise ValueError("Work item needs an input or an input_file")
+        if isinstance(fields.get("input"), dict):
+            fields["input"] = json.dumps(fields["input"])
+        return cls(**fields)
+
+    def cli_args(self, args: Namespace) -> Namespace:
+        """Command line arguments invoking the service for this item."""
+        return Namespace(
+            **{
+                **vars(args),
+                "harmony_action": "invoke",
+                "harmony_input": self.input,
+                "harmony_input_file": self.input_file,
+                "harmony_sources": self.sources,
+                "harmony_metadata_dir": self.metadata_dir,
+                "harmony_data_location": self.data_location,
+                # Log formatting is set up once for the worker
+                "harmony_wrap_stdout": None,
+            }
+        )
+
+
+def run_worker(
+    parser: ArgumentParser,
+    args: Namespace,
+    adapter_class: type,
+    work_items: Iterable[str],
+    results: TextIO,
+    cfg: Config | None = None,
+) -> int:
+    """
+    Invoke the service for every work item, in a single process.
+
+    A failed item is reported and the worker moves on to the next one.
+
+    Parameters
+    ----------
+    parser : ArgumentParser
+        Parser of the service's command line
+    args : Namespace
+        Parsed command line; the ``--harmony-*`` values of each item replace
+        those given on the command line
+    adapter_class : type
+        Harmony adapter invoked for each item
+    work_items : Iterable[str]
+        Lines holding one JSON work item each, e.g. an open file or stdin;
+        blank lines are skipped
+    results : TextIO
+        Stream one JSON result line is written to per item
+    cfg : harmony_service_lib.util.Config
+        Configuration shared by every item, read from the environment if None
+
+    Returns
+    -------
+    int
+        Number of items that failed
+    """
+    cfg = cfg if cfg is not None else config()
+    if args.harmony_wrap_stdout:
+        setup_stdout_log_formatting(cfg)
+
+    failures = 0
+    for line in work_items:
+        if not line.strip():
+            continue
+        start = time.perf_counter()
+        result: dict[str, str | int] = {}
+        try:
+            item = WorkItem.from_json(line)
+            result["metadata_dir"] = item.metadata_dir
+            run_cli(parser, item.cli_args(args), adapter_class, cfg=cfg)
+            result["status"] = "successful"
+        except Exception as e:
+            # The error is already logged, and written to error.json for
+            # items that got as far as invoking the service
+            failures += 1
+            result.update(status="failed", error=str(e))
+        result["duration_ms"] = round((time.perf_counter() - start) * 1000)
+        results.write(json.dumps(result) + "\n")
+        results.flush()
+    return failures
@@ -0,0 +1,191 @@
+"""Per-stage timing and memory metrics of a granule conversion."""
+
+from __future__ import annotations
+
+import io
+import resource
+import sys
+import time
+from collections.abc import Buffer, Iterator
+from contextlib import contextmanager
+from logging import Logger
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from casper.zip_writer import WritableStream
+
+# Module constants
+METRICS_LOG_KEY = "casper_metrics"
+METRICS_PROPERTY = "casper:metrics"
+
+
+def process_peak_rss() -> int:
+    """
+    Peak resident set size of this process since it started, in bytes.
+
+    The peak never goes down, so in a process converting several granules,
+    e.g. a worker, it includes every granule converted before; see
+    `current_rss` for the memory held now.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss() -> int:
+    """Resident set size of this process now, in bytes, or 0 where it is unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        # Only Linux exposes the current RSS without extra dependencies
+        return 0
+    return pages * resource.getpagesize()
+
+
+class StageMetrics:
+    """
+    Metrics of one stage of a conversion.
+
+    Attributes
+    ----------
+    name
+        Stage name, e.g. "download" or "schema:<csv file>"
+    seconds
+        Wall time of the stage
+    bytes_read
+        Bytes read, decoded in memory for schemas and on disk otherwise
+    bytes_written
+        Bytes written, before compression for zip file members
+    rows
+        CSV rows emitted
+    rss
+        Resident set size of the process at the end of the stage
+    process_peak_rss
+        Peak resident set size of the process since it started, at the end
+        of the stage; it includes earlier granules converted by the process
+    timings
+        Wall time of the parts of the stage, e.g. read, format and compress
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.rows = 0
+        self.rss = 0
+        self.process_peak_rss = 0
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def time(self, part: str) -> Iterator[None]:
+        """Add the wall time of a block to one part of the stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[part] = self.timings.get(part, 0.0) + time.perf_counter() - start
+
+    def measure_memory(self):
+        """Record the memory of the process, at the end of the stage."""
+        self.rss = current_rss()
+        # The kernel updates the two counters lazily, so they may disagree slightly
+        self.process_peak_rss = max(process_peak_rss(), self.rss)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "seconds": round(self.seconds, 6),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "rows": self.rows,
+            "rss": self.rss,
+            "process_peak_rss": self.process_peak_rss,
+            **{f"{part}_seconds": round(seconds, 6) for part, seconds in self.timings.items()},
+        }
+
+
+class ConversionMetrics:
+    """
+    Metrics of every stage of one granule's conversion.
+
+    Parameters
+    ----------
+    granule
+        Name of the granule the metrics describe
+    """
+
+    def __init__(self, granule: str):
+        self.granule = granule
+        self.stages: list[StageMetrics] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageMetrics]:
+        """Measure a block as a stage; the caller adds bytes and rows."""
+        stage = StageMetrics(name)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - start
+            stage.measure_memory()
+            self.stages.append(stage)
+
+    def add(self, stage: StageMetrics):
+        """Add a stage measured elsewhere, e.g. in a worker process."""
+        self.stages.append(stage)
+
+    def to_dict(self) -> dict:
+        return {
+            "granule": self.granule,
+            "seconds": round(sum(stage.seconds for stage in self.stages), 6),
+            "bytes_read": sum(stage.bytes_read for stage in self.stages),
+            "bytes_written": sum(stage.bytes_written for stage in self.stages),
+            "rows": sum(stage.rows for stage in self.stages),
+            "rss": max((stage.rss for stage in self.stages), default=0),
+            "process_peak_rss": max((stage.process_peak_rss for stage in self.stages), default=0),
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+    def log(self, logger: Logger):
+        """Log the metrics as one record, with the details in a structured field."""
+        metrics = self.to_dict()
+        logger.info(
+            f"Casper metrics for {self.granule}: {metrics['seconds']:.2f}s, "
+            f"{metrics['rows']} rows, RSS {metrics['rss'] / 1024**2:.1f} MiB "
+            f"(process peak {metrics['process_peak_rss'] / 1024**2:.1f} MiB)",
+            extra={METRICS_LOG_KEY: metrics},
+        )
+
+
+class MeteredWriter(io.BufferedIOBase):
+    """
+    Writable binary stream counting and timing the writes to another stream.
+
+    Parameters
+    ----------
+    stream
+        Stream the data is written to
+    stage
+        Stage the written bytes and write time are added to
+    part
+        Name of the stage part the write time is added to
+    """
+
+    def __init__(self, stream: WritableStream, stage: StageMetrics, part: str = "compress"):
+        super().__init__()
+        self._stream = stream
+        self._stage = stage
+        self._part = part
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Buffer) -> int:
+        # Counted in bytes, whatever the format of the buffer
+        data = memoryview(data).cast("B")
+        with self._stage.time(self._part):
+            self._stream.write(data)
+        self._stage.bytes_written += len(data)
+        return len(data)
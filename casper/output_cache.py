@@ -0,0 +1,181 @@
+"""Content-addressed cache of converted zip files, and resumable conversions.
+
+A conversion is identified by `output_key`: a hash of the granule's
+content and name, the casper version and the options that change the
+output. Options that only change how the conversion runs, such as the
+memory budget or the number of workers, are left out, so requests that
+differ only in them share one cached zip file.
+
+While a conversion is running, every finished schema file is kept as a
+checkpoint next to the cache. When a conversion is interrupted, e.g. by a
+preempted pod, the next conversion with the same key adds the finished
+files to the zip file as they are and only converts the remaining
+schemas. Checkpoints are removed once the zip file is complete; those of
+abandoned conversions count toward the size of the cache and are evicted
+like zip files.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from itertools import chain
+from pathlib import Path
+from uuid import uuid4
+
+from casper import __version__
+from casper.schema_cache import _evict_least_recently_used
+
+# Module constants
+DEFAULT_OUTPUT_CACHE_SIZE = 10 * 1024**3
+HASH_BLOCK_SIZE = 4 * 1024**2
+CHECKPOINTS_DIR = "checkpoints"
+
+
+def output_key(filename: str | Path, **options) -> str:
+    """
+    Key of the zip file converted from a granule with a set of options.
+
+    The whole granule is read to hash its content, so a changed granule
+    never matches the zip file of an earlier version.
+
+    Parameters
+    ----------
+    filename
+        Granule to convert; its name is part of the key, as it names the
+        files in the zip file
+    options
+        Conversion options changing the output, with JSON serializable
+        values or values whose ``str`` identifies them
+
+    Returns
+    -------
+    str
+        Hex digest identifying the output
+    """
+    digest = hashlib.sha256(
+        json.dumps(
+            {"version": __version__, "name": Path(filename).name, "options": options},
+            sort_keys=True,
+            default=str,
+        ).encode()
+    )
+    with open(filename, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class OutputCache:
+    """
+    Size-bounded cache of converted zip files in a local directory.
+
+    Each zip file is named after its `output_key`. Reading a zip file
+    refreshes its modification time, and the least recently used zip files
+    and checkpoints are evicted once the directory holds more than
+    ``max_bytes``. Files are replaced atomically, so several processes can
+    share a cache.
+
+    Parameters
+    ----------
+    directory
+        Directory holding the cached zip files and the checkpoints of
+        running conversions, created if missing
+    max_bytes
+        Maximum total size of the cached zip files and checkpoints
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int = DEFAULT_OUTPUT_CACHE_SIZE):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Path | None:
+        """Cached zip file for a key, or None if there is none."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, zip_file: str | Path) -> Path:
+        """
+        Store a copy of a converted zip file, evicting old ones if needed.
+
+        Checkpoints left for the key are removed, as the zip file replaces them.
+        """
+        with (
+            open(zip_file, "rb") as source,
+            tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as f,
+        ):
+            shutil.copyfileobj(source, f)
+        os.replace(f.name, self._path(key))
+        shutil.rmtree(self._checkpoints_path(key), ignore_errors=True)
+        _evict_least_recently_used(
+            chain(self.directory.glob("*.zip"), self.directory.glob(f"{CHECKPOINTS_DIR}/*")),
+            self.max_bytes,
+        )
+        return self._path(key)
+
+    def checkpoints(self, key: str) -> Checkpoints:
+        """Checkpoints of the conversion with a key."""
+        return Checkpoints(self._checkpoints_path(key))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.zip"
+
+    def _checkpoints_path(self, key: str) -> Path:
+        return self.directory / CHECKPOINTS_DIR / key
+
+
+class Checkpoints:
+    """
+    Finished schema files of a conversion, kept until its zip file is complete.
+
+    Each schema file is written to a partial file and renamed once it is
+    complete; a small JSON file next to it holds the schema's coordinates
+    for the Readme files and marks it as finished.
+
+    Parameters
+    ----------
+    directory
+        Directory holding the checkpoints, created if missing
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, op_file: str) -> tuple[Path, list[str]] | None:
+        """Finished file and schema coordinates of an output file, or None."""
+        path = self.directory / op_file
+        try:
+            with open(self._marker(op_file)) as f:
+                coords = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return (path, coords) if path.exists() else None
+
+    def partial_path(self, op_file: str) -> Path:
+        """New path an output file is written to before it is finished."""
+        return self.directory / f"{op_file}.{uuid4().hex}.partial"
+
+    def put(self, op_file: str, partial_path: str | Path, coords: list[str]) -> Path:
+        """Mark an output file written to a partial path as finished."""
+        path = self.directory / op_file
+        os.replace(partial_path, path)
+        with tempfile.NamedTemporaryFile("w", dir=self.directory, suffix=".tmp", delete=False) as f:
+            json.dump(coords, f)
+        os.replace(f.name, self._marker(op_file))
+        return path
+
+    def clear(self):
+        """Remove every checkpoint, once the conversion is complete."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _marker(self, op_file: str) -> Path:
+        return self.directory / f"{op_file}.json"
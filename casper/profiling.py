@@ -0,0 +1,84 @@
+"""Opt-in profiling of conversions.
+
+A profiled conversion runs under ``cProfile`` with ``tracemalloc`` tracking
+allocations. The reports are added to the output zip file under
+``profile/``:
+
+- ``casper.prof``: raw profile, for ``pstats``, snakeviz or similar tools
+- ``functions.txt``: functions with the highest cumulative time
+- ``allocations.txt``: source lines holding the most memory at the end of
+  the conversion, and the peak traced memory
+
+Only the converting thread of the main process is profiled; schemas
+converted in worker processes appear as time spent waiting on them.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import marshal
+import pstats
+import tracemalloc
+
+from casper.zip_writer import ZipWriter
+
+# Module constants
+PROFILE_DIR = "profile"
+TOP_FUNCTIONS = 50
+TOP_ALLOCATIONS = 50
+
+
+class ConversionProfile:
+    """Deterministic profile and allocation tracking of a conversion."""
+
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._peak = 0
+        self._running = False
+        self._started_tracemalloc = False
+
+    def start(self):
+        """Start profiling and tracking allocations."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._profiler.enable()
+        self._running = True
+
+    def stop(self):
+        """Stop profiling; stopping twice is harmless."""
+        if not self._running:
+            return
+        self._profiler.disable()
+        self._snapshot = tracemalloc.take_snapshot()
+        self._peak = tracemalloc.get_traced_memory()[1]
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        self._running = False
+
+    def function_report(self, limit: int = TOP_FUNCTIONS) -> str:
+        """Functions with the highest cumulative time."""
+        text = io.StringIO()
+        pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(limit)
+        return text.getvalue()
+
+    def allocation_report(self, limit: int = TOP_ALLOCATIONS) -> str:
+        """Source lines holding the most memory when profiling stopped."""
+        lines = [f"Peak traced memory: {self._peak / 1024**2:.1f} MiB", ""]
+        if self._snapshot is not None:
+            snapshot = self._snapshot.filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)]
+            )
+            for stat in snapshot.statistics("lineno")[:limit]:
+                lines.append(str(stat))
+        return "\n".join(lines) + "\n"
+
+    def write_to(self, zf: ZipWriter):
+        """Add the profile and reports to a zip file."""
+        self.stop()
+        self._profiler.create_stats()
+        zf.writestr(f"{PROFILE_DIR}/casper.prof", marshal.dumps(self._profiler.stats))
+        zf.writestr(f"{PROFILE_DIR}/functions.txt", self.function_report())
+        zf.writestr(f"{PROFILE_DIR}/allocations.txt", self.allocation_report())
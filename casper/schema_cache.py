@@ -0,0 +1,160 @@
+"""Persistent cache of schema plans shared by granules of the same structure.
+
+Every granule of a collection usually has the same groups, variables and
+dimensions, so the way its variables are grouped into dimensional schemas
+and the column order of each CSV file are the same too. A plan discovered
+for one granule is stored on local disk, keyed by a fingerprint of the
+file structure, and reused for every later granule with the same
+fingerprint.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    import netCDF4 as nc
+
+module_logger = logging.getLogger(__name__)
+
+# Module constants
+DEFAULT_CACHE_SIZE = 64 * 1024**2
+# Bumped whenever the plan format or the discovery rules change
+PLAN_VERSION = 1
+# Variable attributes that change how xarray decodes a variable's dimensions
+_STRUCTURAL_ATTRIBUTES = ("coordinates", "_Encoding")
+
+
+class SchemaPlan(NamedTuple):
+    """Variables and CSV columns of one dimensional schema."""
+
+    dims: tuple[str, ...]
+    variables: list[str]
+    columns: list[str]
+
+
+def structure_fingerprint(dataset: nc.Dataset) -> str:
+    """
+    Fingerprint the structure of a granule.
+
+    The fingerprint covers the group, variable and dimension names, the
+    data types, the number of dimensions of each variable and the
+    attributes that affect decoding. Dimension lengths are left out, so
+    granules of one collection that only differ in size share a plan.
+
+    Parameters
+    ----------
+    dataset
+        Open netCDF dataset
+
+    Returns
+    -------
+    str
+        Hex digest identifying the structure
+    """
+    digest = hashlib.sha256(f"casper-schema-plan-{PLAN_VERSION}".encode())
+    for group in _walk_groups(dataset):
+        digest.update(json.dumps(["group", group.path]).encode())
+        for name, var in group.variables.items():
+            attrs = {
+                key: str(var.getncattr(key))
+                for key in _STRUCTURAL_ATTRIBUTES
+                if key in var.ncattrs()
+            }
+            digest.update(json.dumps([name, var.dimensions, str(var.dtype), attrs]).encode())
+    return digest.hexdigest()
+
+
+class SchemaPlanCache:
+    """
+    Size-bounded cache of schema plans in a local directory.
+
+    Each plan is stored as a small JSON file named after its fingerprint.
+    Reading a plan refreshes its modification time, and the least recently
+    used plans are evicted once the directory holds more than ``max_bytes``.
+    Files are replaced atomically, so several processes can share a cache.
+
+    Parameters
+    ----------
+    directory
+        Directory holding the cached plans, created if missing
+    max_bytes
+        Maximum total size of the cached plans
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int = DEFAULT_CACHE_SIZE):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, fingerprint: str) -> list[SchemaPlan] | None:
+        """Cached plan for a fingerprint, or None if there is none."""
+        path = self._path(fingerprint)
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            if path.exists():
+                module_logger.warning("Ignoring unreadable schema plan %s: %s", path, e)
+            return None
+        return [SchemaPlan(tuple(e["dims"]), e["variables"], e["columns"]) for e in entries]
+
+    def put(self, fingerprint: str, plan: list[SchemaPlan]):
+        """Store the plan for a fingerprint, evicting old plans if needed."""
+        entries = [plan_entry._asdict() for plan_entry in plan]
+        with tempfile.NamedTemporaryFile("w", dir=self.directory, suffix=".tmp", delete=False) as f:
+            json.dump(entries, f)
+        os.replace(f.name, self._path(fingerprint))
+        self._evict()
+
+    def _path(self, fingerprint: str) -> Path:
+        return self.directory / f"{fingerprint}.json"
+
+    def _evict(self):
+        """Remove the least recently used plans until the cache fits."""
+        _evict_least_recently_used(self.directory.glob("*.json"), self.max_bytes)
+
+
+def _evict_least_recently_used(paths: Iterable[Path], max_bytes: int):
+    """
+    Remove the least recently used files or directories until they fit.
+
+    A directory holds the total size of the files in it, and was last used
+    when the newest of them was last written.
+    """
+    entries = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            children = [child.stat() for child in path.iterdir()] if path.is_dir() else []
+        except FileNotFoundError:
+            continue
+        size = sum(child.st_size for child in children) if path.is_dir() else stat.st_size
+        used = max([stat.st_mtime, *(child.st_mtime for child in children)])
+        entries.append((used, size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+        total -= size
+
+
+def _walk_groups(group: nc.Dataset | nc.Group) -> Iterator[nc.Dataset | nc.Group]:
+    """A group followed by all of its child groups."""
+    yield group
+    for child in group.groups.values():
+        yield from _walk_groups(child)
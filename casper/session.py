@@ -0,0 +1,165 @@
+"""A granule opened once and shared by every stage of a conversion."""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from functools import cached_property
+from logging import Logger
+from pathlib import Path
+from typing import NamedTuple
+
+import netCDF4 as nc
+import numpy as np
+import xarray as xr
+
+from casper.file_ops import _is_file_empty
+from casper.schema_cache import _walk_groups, structure_fingerprint
+
+module_logger = logging.getLogger(__name__)
+
+
+class VariableInfo(NamedTuple):
+    """Metadata of one decoded variable of a granule."""
+
+    path: str
+    dims: tuple[str, ...]
+    dtype: np.dtype
+    shape: tuple[int, ...]
+    is_coordinate: bool
+
+
+class GranuleSession:
+    """
+    An open NetCDF granule with cached metadata.
+
+    The file is opened once with netCDF4. The xarray datatree used for
+    conversion is built on the same file handle, so groups, variables and
+    attributes are only parsed once whether they are needed for validation,
+    schema discovery, conversion or the Readme files.
+
+    Parameters
+    ----------
+    filename
+        Path of the granule to open
+    logger
+        Logger instance for output messages
+    variables
+        Full paths of the data variables to convert, or None for all of
+        them. Other data variables are dropped when the datatree is built,
+        so they are never decoded; the coordinates of the requested
+        variables are kept.
+    """
+
+    def __init__(
+        self,
+        filename: str | Path,
+        logger: Logger = module_logger,
+        variables: Iterable[str] | None = None,
+    ):
+        self.filename = str(filename)
+        self.logger = logger
+        self.requested_variables = variable_paths(variables) if variables is not None else None
+        self.dataset = nc.Dataset(self.filename, "r")
+
+    def __enter__(self) -> GranuleSession:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def name(self) -> str:
+        """Filename of the granule, without its directory."""
+        return Path(self.filename).name
+
+    @cached_property
+    def tree(self) -> xr.DataTree:
+        """Lazily loaded xarray datatree sharing the session's file handle."""
+        groups = {
+            group.path: xr.open_dataset(
+                xr.backends.NetCDF4DataStore(self.dataset, group=group.path),
+                drop_variables=self._unrequested_variables(group),
+            )
+            for group in _walk_groups(self.dataset)
+        }
+        return xr.DataTree.from_dict(groups)
+
+    @cached_property
+    def variables(self) -> dict[str, VariableInfo]:
+        """Decoded variables of every group, keyed by their full path."""
+        variables = {}
+        for node in self.tree.subtree:
+            prefix = "" if node.path == "/" else node.path
+            ds = node.to_dataset(inherit=False)
+            for name, var in ds.variables.items():
+                path = f"{prefix}/{name}"
+                # netCDF dimension names are always strings
+                dims = tuple(map(str, var.dims))
+                variables[path] = VariableInfo(path, dims, var.dtype, var.shape, name in ds.coords)
+        return variables
+
+    @cached_property
+    def attributes(self) -> dict[str, dict]:
+        """Attributes of every group, keyed by the group path."""
+        return {node.path: dict(node.attrs) for node in self.tree.subtree}
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Fingerprint of the granule structure, see `structure_fingerprint`."""
+        return structure_fingerprint(self.dataset)
+
+    def schemas(self) -> dict[tuple[str, ...], list[str]]:
+        """
+        Group the granule's data variables by their dimensions.
+
+        Returns
+        -------
+        dict[tuple[str, ...], list[str]]
+            Full paths of the variables sharing each dimensional schema
+        """
+        schemas: dict[tuple[str, ...], list[str]] = {}
+        for info in self.variables.values():
+            if not info.is_coordinate:
+                schemas.setdefault(info.dims, []).append(info.path)
+        if self.requested_variables is not None:
+            found = {path for paths in schemas.values() for path in paths}
+            for path in sorted(self.requested_variables - found):
+                self.logger.warning(f"Requested variable {path} is not a data variable")
+        return schemas
+
+    def is_empty(self) -> bool:
+        """Check if every variable of the granule is empty, see `_is_file_empty`."""
+        return _is_file_empty(self.dataset)
+
+    def close(self):
+        """Close the granule."""
+        if self.dataset.isopen():
+            self.dataset.close()
+
+    def _unrequested_variables(self, group: nc.Dataset | nc.Group) -> list[str] | None:
+        """Variables of a group that are neither requested nor coordinates of one."""
+        if self.requested_variables is None:
+            return None
+        prefix = "" if group.path == "/" else group.path
+        requested = [
+            var
+            for name, var in group.variables.items()
+            if f"{prefix}/{name}" in self.requested_variables
+        ]
+        coordinates = {
+            name for var in requested for name in getattr(var, "coordinates", "").split()
+        }
+        return [
+            name
+            for name, var in group.variables.items()
+            if f"{prefix}/{name}" not in self.requested_variables
+            and name not in coordinates
+            # Dimension coordinates index the requested variables
+            and var.dimensions != (name,)
+        ]
+
+
+def variable_paths(variables: Iterable[str]) -> frozenset[str]:
+    """Full paths of variables, e.g. "/product/column" for "product/column"."""
+    return frozenset("/" + variable.strip("/") for variable in variables)
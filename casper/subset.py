@@ -0,0 +1,173 @@
+"""Spatial and temporal subsets pushed down into the read of a granule.
+
+A bounding box and a time range are turned into index selections on the
+granule's dimension coordinates: one-dimensional latitude, longitude and
+time coordinates named after their dimension. Every schema is then
+indexed with the selections of its dimensions before any data is read,
+so only the matching slabs are read and written.
+
+Dimensions without such a coordinate, e.g. the scanlines of a swath with
+two-dimensional latitude and longitude, are not subset.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+if TYPE_CHECKING:
+    from harmony_service_lib.message import Message
+
+# Module constants
+LATITUDE_UNITS = ("degrees_north", "degree_north", "degrees_n", "degree_n")
+LONGITUDE_UNITS = ("degrees_east", "degree_east", "degrees_e", "degree_e")
+LATITUDE_NAMES = ("lat", "latitude")
+LONGITUDE_NAMES = ("lon", "long", "longitude")
+
+
+class Subset(NamedTuple):
+    """
+    Spatial and temporal constraints of a request.
+
+    Attributes
+    ----------
+    bbox
+        West, south, east and north bounds in degrees. West is greater than
+        east for boxes crossing the antimeridian.
+    start
+        Earliest time, inclusive
+    end
+        Latest time, inclusive
+    """
+
+    bbox: tuple[float, float, float, float] | None = None
+    start: pd.Timestamp | None = None
+    end: pd.Timestamp | None = None
+
+    @classmethod
+    def from_message(cls, message: Message) -> Subset | None:
+        """Subset of a Harmony message, or None when it has no bbox or temporal range."""
+        bbox = message.subset.bbox if message.subset is not None else None
+        start = message.temporal.start if message.temporal is not None else None
+        end = message.temporal.end if message.temporal is not None else None
+        if bbox is None and start is None and end is None:
+            return None
+        return cls.create(bbox, start, end)
+
+    @classmethod
+    def create(cls, bbox=None, start: str | None = None, end: str | None = None) -> Subset:
+        """Subset from a [west, south, east, north] list and ISO 8601 times."""
+        if bbox is not None:
+            if len(bbox) != 4:
+                raise ValueError("Bounding box must be [west, south, east, north]")
+            bbox = tuple(float(bound) for bound in bbox)
+            if bbox[1] > bbox[3]:
+                raise ValueError("Bounding box south must not be greater than north")
+        return cls(bbox, _utc_timestamp(start), _utc_timestamp(end))
+
+
+def index_selection(data: xr.DataTree, subset: Subset) -> dict[str, slice | np.ndarray]:
+    """
+    Index selections of the dimensions constrained by a subset.
+
+    Parameters
+    ----------
+    data
+        Tree of the granule; dimension coordinates are read from the
+        shallowest group defining them
+    subset
+        Bounding box and time range to select
+
+    Returns
+    -------
+    dict
+        ``isel`` indexer per dimension name: a slice when the matching
+        indexes are contiguous, otherwise an array of indexes
+    """
+    selection: dict[str, slice | np.ndarray] = {}
+    for node in sorted(data.subtree, key=lambda node: node.path.count("/")):
+        for key, coord in node.to_dataset(inherit=False).coords.items():
+            # netCDF variable names are always strings
+            name = str(key)
+            if coord.dims != (name,) or name in selection:
+                continue
+            mask = _coordinate_mask(name, coord, subset)
+            if mask is not None:
+                selection[name] = _mask_indexer(mask)
+    return selection
+
+
+def subset_dataset(ds: xr.Dataset, selection: dict[str, slice | np.ndarray]) -> xr.Dataset:
+    """Index a schema's lazily loaded dataset with the selections of its dimensions."""
+    indexers = {dim: indexer for dim, indexer in selection.items() if dim in ds.dims}
+    return ds.isel(indexers) if indexers else ds
+
+
+def _coordinate_mask(name: str, coord: xr.DataArray, subset: Subset) -> np.ndarray | None:
+    """Values of a coordinate within the subset, or None if it does not constrain it."""
+    kind = _coordinate_kind(name, coord)
+    if kind == "time" and (subset.start is not None or subset.end is not None):
+        values = coord.values
+        mask = np.ones(values.shape, dtype=bool)
+        if subset.start is not None:
+            mask &= values >= subset.start.to_datetime64()
+        if subset.end is not None:
+            mask &= values <= subset.end.to_datetime64()
+        return mask
+    if subset.bbox is None:
+        return None
+    west, south, east, north = subset.bbox
+    if kind == "latitude":
+        values = coord.values
+        return (values >= south) & (values <= north)
+    if kind == "longitude":
+        if east - west >= 360:
+            return np.ones(coord.shape, dtype=bool)
+        # Compare in [-180, 180) so 0-360 longitudes are handled too
+        values = _wrap_longitude(coord.values)
+        west, east = _wrap_longitude(west), _wrap_longitude(east)
+        if west <= east:
+            return (values >= west) & (values <= east)
+        return (values >= west) | (values <= east)
+    return None
+
+
+def _wrap_longitude(values):
+    """Longitudes in [-180, 180)."""
+    return (values + 180) % 360 - 180
+
+
+def _coordinate_kind(name: str, coord: xr.DataArray) -> str | None:
+    """Whether a dimension coordinate holds latitudes, longitudes or times."""
+    if np.issubdtype(coord.dtype, np.datetime64):
+        return "time"
+    standard_name = str(coord.attrs.get("standard_name", "")).lower()
+    units = str(coord.attrs.get("units", "")).lower()
+    if standard_name == "latitude" or units in LATITUDE_UNITS or name.lower() in LATITUDE_NAMES:
+        return "latitude"
+    if standard_name == "longitude" or units in LONGITUDE_UNITS or name.lower() in LONGITUDE_NAMES:
+        return "longitude"
+    return None
+
+
+def _mask_indexer(mask: np.ndarray) -> slice | np.ndarray:
+    """Slice over the true values of a mask when they are contiguous."""
+    (indexes,) = np.nonzero(mask)
+    if indexes.size == 0:
+        return slice(0, 0)
+    if indexes[-1] - indexes[0] + 1 == indexes.size:
+        return slice(int(indexes[0]), int(indexes[-1]) + 1)
+    return indexes
+
+
+def _utc_timestamp(value: str | None) -> pd.Timestamp | None:
+    """Timezone-naive UTC timestamp, matching decoded CF times."""
+    if value is None:
+        return None
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp
@@ -0,0 +1,272 @@
+"""Memory-budgeted tiling of dimensional schemas."""
+
+from __future__ import annotations
+
+import itertools
+import math
+import re
+from collections.abc import Iterator, Mapping
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import xarray as xr
+
+# Module constants
+DEFAULT_MEMORY_BUDGET = 128 * 1024**2
+# Approximate multiplier from raw array bytes to the DataFrame, index and
+# formatted CSV text built for the same rows.
+FORMATTING_OVERHEAD = 4
+# Bytes per dimension per row for the pandas MultiIndex codes.
+INDEX_BYTES_PER_DIM = 8
+# Longest CSV text of a value, by dtype kind, used to bound shard sizes.
+CSV_VALUE_WIDTHS = {"b": 5, "i": 20, "u": 20, "f": 24, "c": 50, "M": 29, "m": 26}
+DEFAULT_CSV_VALUE_WIDTH = 32
+
+_SIZE_UNITS = {
+    "": 1,
+    "K": 1024,
+    "M": 1024**2,
+    "G": 1024**3,
+    "T": 1024**4,
+}
+_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*$", re.IGNORECASE)
+
+
+def parse_byte_size(value: str | int) -> int:
+    """
+    Parse a byte size such as ``1048576``, ``512K``, ``64M`` or ``1.5GiB``.
+
+    Parameters
+    ----------
+    value
+        Number of bytes, optionally with a binary unit suffix
+
+    Returns
+    -------
+    int
+        Number of bytes
+
+    Raises
+    ------
+    ValueError
+        If the value cannot be parsed or is not positive
+    """
+    if isinstance(value, int):
+        size = value
+    else:
+        match = _SIZE_PATTERN.match(value)
+        if match is None:
+            raise ValueError(f"Invalid byte size: '{value}'")
+        size = int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+    if size <= 0:
+        raise ValueError(f"Byte size must be positive: '{value}'")
+    return size
+
+
+def dimension_sizes(ds: xr.Dataset) -> dict[str, int]:
+    """Length of each dimension of a dataset, in order, keyed by its name."""
+    # xarray types dimension names as Hashable; netCDF names are strings
+    return {str(dim): size for dim, size in ds.sizes.items()}
+
+
+def estimate_row_bytes(ds: xr.Dataset) -> int:
+    """
+    Estimate the memory needed to hold and format one output CSV row.
+
+    Every variable and coordinate contributes one value per row once
+    broadcast against the schema dimensions.
+
+    Parameters
+    ----------
+    ds
+        Dataset holding a single dimensional schema
+
+    Returns
+    -------
+    int
+        Approximate number of bytes per output row
+    """
+    value_bytes = sum(var.dtype.itemsize for var in ds.variables.values())
+    index_bytes = INDEX_BYTES_PER_DIM * len(ds.sizes)
+    return max(1, (value_bytes + index_bytes) * FORMATTING_OVERHEAD)
+
+
+def estimate_csv_row_bytes(ds: xr.Dataset) -> int:
+    """
+    Upper estimate of the CSV text of one output row.
+
+    Every column is assumed to take the longest text of its data type, plus
+    a separator.
+
+    Parameters
+    ----------
+    ds
+        Dataset holding a single dimensional schema
+
+    Returns
+    -------
+    int
+        Approximate maximum number of bytes per CSV row
+    """
+    widths = [
+        CSV_VALUE_WIDTHS.get(var.dtype.kind, DEFAULT_CSV_VALUE_WIDTH) + 1
+        for var in ds.variables.values()
+    ]
+    return max(1, sum(widths))
+
+
+def plan_shards(
+    ds: xr.Dataset,
+    max_rows: int | None = None,
+    max_bytes: int | None = None,
+    chunks: Mapping[str, int] | None = None,
+) -> list[dict[str, slice]]:
+    """
+    Split a dimensional schema into shards of bounded size.
+
+    Shards are contiguous slabs in the C order of the schema dimensions,
+    planned like the tiles of `iter_tiles`, so concatenating them gives the
+    rows of the whole schema in order. Rows are only dropped after
+    sharding, so shards hold at most ``max_rows`` rows and, going by
+    `estimate_csv_row_bytes`, roughly ``max_bytes`` bytes of CSV text.
+
+    Parameters
+    ----------
+    ds
+        Dataset holding a single dimensional schema
+    max_rows
+        Maximum number of rows per shard, or None for no row limit
+    max_bytes
+        Approximate maximum number of bytes per shard, or None for no size limit
+    chunks
+        Length of the on-disk chunks along each dimension; shards start on
+        chunk boundaries where the limits allow
+
+    Returns
+    -------
+    list[dict[str, slice]]
+        ``isel`` indexer of each shard
+    """
+    rows = max_rows if max_rows is not None else math.prod(ds.sizes.values())
+    if max_bytes is not None:
+        rows = min(rows, max_bytes // estimate_csv_row_bytes(ds))
+    return list(iter_tiles(dimension_sizes(ds), 1, max(1, rows), chunks))
+
+
+def iter_tiles(
+    sizes: Mapping[str, int],
+    row_bytes: int,
+    memory_budget: int,
+    chunks: Mapping[str, int] | None = None,
+) -> Iterator[dict[str, slice]]:
+    """
+    Plan the tiles used to read and write a dimensional schema.
+
+    Tiles follow the C order of ``sizes`` so rows are emitted in the same
+    order as a single ``to_dataframe`` call. Trailing dimensions that fit
+    in the budget are read whole; the first dimension that does not fit is
+    sliced into as many rows as the budget allows, and any dimensions ahead
+    of it are iterated one index at a time. With storage chunk lengths, the
+    slab length is rounded down to whole chunks when it spans at least one,
+    so every tile starts on a chunk boundary.
+
+    Parameters
+    ----------
+    sizes
+        Dimension names and lengths, in output order
+    row_bytes
+        Approximate bytes per output row, see `estimate_row_bytes`
+    memory_budget
+        Approximate number of bytes a single tile may use
+    chunks
+        Length of the on-disk chunks along each dimension, see
+        `casper.chunking`
+
+    Yields
+    ------
+    dict[str, slice]
+        ``isel`` indexer for each tile
+    """
+    dims = list(sizes)
+    shape = [sizes[dim] for dim in dims]
+    split, step = _split_point(shape, row_bytes, memory_budget)
+    if split >= 0 and chunks:
+        step = _align_step(step, chunks.get(dims[split], 1))
+
+    if split < 0:
+        yield {}
+        return
+
+    split_dim = dims[split]
+    outer_ranges = [range(size) for size in shape[:split]]
+
+    for outer in itertools.product(*outer_ranges):
+        indexer = {dim: slice(i, i + 1) for dim, i in zip(dims[:split], outer, strict=True)}
+        for start in range(0, shape[split], step):
+            yield {**indexer, split_dim: slice(start, start + step)}
+
+
+def count_tiles(
+    sizes: Mapping[str, int],
+    row_bytes: int,
+    memory_budget: int,
+    chunks: Mapping[str, int] | None = None,
+) -> int:
+    """Number of tiles `iter_tiles` yields for the same arguments."""
+    dims = list(sizes)
+    shape = list(sizes.values())
+    split, step = _split_point(shape, row_bytes, memory_budget)
+    if split < 0:
+        return 1
+    if chunks:
+        step = _align_step(step, chunks.get(dims[split], 1))
+    return math.prod(shape[:split]) * math.ceil(shape[split] / step)
+
+
+def split_dimension(
+    sizes: Mapping[str, int],
+    row_bytes: int,
+    memory_budget: int,
+    chunks: Mapping[str, int] | None = None,
+) -> tuple[str | None, int]:
+    """
+    Dimension `iter_tiles` slices and the slab length along it.
+
+    Returns
+    -------
+    tuple[str | None, int]
+        Name of the sliced dimension and the slab length, or ``(None, 0)``
+        when the schema is read as a single tile
+    """
+    dims = list(sizes)
+    split, step = _split_point([sizes[dim] for dim in dims], row_bytes, memory_budget)
+    if split < 0:
+        return None, 0
+    if chunks:
+        step = _align_step(step, chunks.get(dims[split], 1))
+    return dims[split], step
+
+
+def _align_step(step: int, chunk: int) -> int:
+    """Round a slab length down to whole chunks, if it spans at least one."""
+    return step // chunk * chunk if step >= chunk else step
+
+
+def _split_point(shape: list[int], row_bytes: int, memory_budget: int) -> tuple[int, int]:
+    """Find the axis to slice and the slab length along it.
+
+    Returns ``(-1, 0)`` when the whole schema fits in a single tile.
+    """
+    rows_budget = max(1, memory_budget // row_bytes)
+
+    # Walk inwards from the last dimension while whole trailing blocks fit
+    split = len(shape)
+    trailing_rows = 1
+    while split > 0 and trailing_rows * shape[split - 1] <= rows_budget:
+        trailing_rows *= shape[split - 1]
+        split -= 1
+
+    if split == 0:
+        return -1, 0
+    return split - 1, max(1, rows_budget // trailing_rows)
@@ -0,0 +1,446 @@
+"""Zip64 archive writer with multithreaded DEFLATE compression.
+
+`zipfile.ZipFile` compresses every member through a single zlib stream on
+the thread that writes it. `ZipWriter` instead splits each member into
+blocks that are deflated concurrently on a thread pool (zlib releases the
+GIL) and writes the pre-compressed blocks into a standard Zip64 archive.
+
+Every block except the last ends with a sync flush, so the concatenated
+blocks form a single valid DEFLATE stream. Each block is primed with the
+last 32 KiB of the block before it, so the compression ratio stays close
+to that of a single stream.
+
+Members can also be stored uncompressed, or compressed with Zstandard
+(zip method 93) when either the standard library ``compression.zstd``
+module (Python 3.14+) or the ``zstandard`` package is available. Zstandard
+members are compressed as a single stream, which is fast enough that they
+do not use the thread pool.
+"""
+
+from __future__ import annotations
+
+import io
+import struct
+import time
+import zlib
+from collections import deque
+from collections.abc import Buffer
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Protocol
+
+# Module constants
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP_ZSTANDARD = 93
+COMPRESSION_METHODS = {"stored": ZIP_STORED, "deflate": ZIP_DEFLATED, "zstd": ZIP_ZSTANDARD}
+COMPRESSION_LEVELS = {ZIP_DEFLATED: range(1, 10), ZIP_ZSTANDARD: range(1, 23)}
+BLOCK_SIZE = 1024**2
+DEFLATE_WINDOW = 32 * 1024
+COPY_BUFFER_SIZE = 1024**2
+
+_ZIP64_VERSION = 45
+_ZSTANDARD_VERSION = 63
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP_FILECOUNT_LIMIT = 0xFFFF
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_UNIX_SYSTEM = 3
+_FILE_ATTRIBUTES = (0o100644 & 0xFFFF) << 16
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHLLLHH")
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_DATA_DESCRIPTOR = struct.Struct("<4sLQQ")
+_ZIP64_END = struct.Struct("<4sQHHLLQQQQ")
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_END_OF_CENTRAL_DIR = struct.Struct("<4sHHHHLLH")
+
+
+class ZipMember:
+    """Metadata of a member written to a `ZipWriter` archive."""
+
+    def __init__(self, name: str, compress_type: int, header_offset: int):
+        self.filename = name
+        self.compress_type = compress_type
+        self.header_offset = header_offset
+        self.date_time = time.localtime(time.time())[:6]
+        self.crc = 0
+        self.compress_size = 0
+        self.file_size = 0
+
+    @property
+    def version(self) -> int:
+        """Zip specification version needed to extract the member."""
+        return _ZSTANDARD_VERSION if self.compress_type == ZIP_ZSTANDARD else _ZIP64_VERSION
+
+    @property
+    def dos_time(self) -> tuple[int, int]:
+        """Modification date and time in MS-DOS format."""
+        year, month, day, hour, minute, second = self.date_time
+        return (
+            (year - 1980) << 9 | month << 5 | day,
+            hour << 11 | minute << 5 | second // 2,
+        )
+
+
+class WritableStream(Protocol):
+    """Writable binary stream, e.g. an open file, a zip file member or an upload."""
+
+    def write(self, data: Buffer, /) -> int: ...
+
+    def flush(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class ZipWriter:
+    """
+    Write a Zip64 archive, compressing members on a thread pool.
+
+    Parameters
+    ----------
+    file
+        Path of the archive to create, or a writable binary stream. The
+        stream does not need to be seekable.
+    compression_threads
+        Number of threads deflating blocks concurrently. With a single
+        thread each member is compressed as one zlib stream.
+    compresslevel
+        Compression level, 1-9 for DEFLATE and 1-22 for Zstandard, or None
+        for the codec's default
+    compression
+        Compression method of members opened without one, one of ZIP_STORED,
+        ZIP_DEFLATED or ZIP_ZSTANDARD
+    """
+
+    def __init__(
+        self,
+        file: str | Path | WritableStream,
+        compression_threads: int = 1,
+        compresslevel: int | None = None,
+        compression: int = ZIP_DEFLATED,
+    ):
+        if compression_threads < 1:
+            raise ValueError("Number of compression threads must be at least 1")
+        _check_compression(compression, compresslevel)
+
+        if isinstance(file, str | Path):
+            self.fp: WritableStream = open(file, "wb")  # noqa: SIM115
+            self._close_fp = True
+        else:
+            self.fp = file
+            self._close_fp = False
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.members: list[ZipMember] = []
+        self._offset = 0
+        self._writing = False
+        self._pool = (
+            ThreadPoolExecutor(compression_threads, thread_name_prefix="deflate")
+            if compression_threads > 1
+            else None
+        )
+        self._compression_threads = compression_threads
+
+    def __enter__(self) -> ZipWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, name: str, compress_type: int | None = None) -> ZipMemberWriter:
+        """Open a new member for writing, see `ZipMemberWriter`."""
+        if self._writing:
+            raise ValueError("Another member is still being written")
+        if compress_type is None:
+            compress_type = self.compression
+        elif compress_type != self.compression:
+            _check_compression(compress_type, None)
+
+        member = ZipMember(name, compress_type, self._offset)
+        self._write(_local_header(member))
+        self._writing = True
+        return ZipMemberWriter(self, member)
+
+    def writestr(self, name: str, data: bytes | str, compress_type: int | None = None):
+        """Write a member from bytes or UTF-8 text."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.open(name, compress_type) as member:
+            member.write(data)
+
+    def write(self, filename: str | Path, arcname: str, compress_type: int | None = None):
+        """Write a member from the contents of a local file."""
+        with open(filename, "rb") as src, self.open(arcname, compress_type) as member:
+            if member.compress_type == ZIP_STORED:
+                # Stored members are copied through one reused buffer
+                buffer = bytearray(COPY_BUFFER_SIZE)
+                view = memoryview(buffer)
+                while size := src.readinto(buffer):
+                    member.write(view[:size])
+            else:
+                while block := src.read(COPY_BUFFER_SIZE):
+                    member.write(block)
+
+    def namelist(self) -> list[str]:
+        """Names of the members written so far."""
+        return [member.filename for member in self.members]
+
+    def close(self):
+        """Write the central directory and release the file and threads."""
+        if self.fp is None:
+            return
+        try:
+            self._write_central_directory()
+            self.fp.flush()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+            if self._close_fp:
+                self.fp.close()
+            self.fp = None
+
+    def _write(self, data: bytes | memoryview):
+        self.fp.write(data)
+        self._offset += len(data)
+
+    def _finish_member(self, member: ZipMember):
+        self._write(
+            _DATA_DESCRIPTOR.pack(b"PK\x07\x08", member.crc, member.compress_size, member.file_size)
+        )
+        self.members.append(member)
+        self._writing = False
+
+    def _write_central_directory(self):
+        start = self._offset
+        for member in self.members:
+            self._write(_central_header(member))
+        size = self._offset - start
+        count = len(self.members)
+
+        if count > _ZIP_FILECOUNT_LIMIT or start > _ZIP64_LIMIT or size > _ZIP64_LIMIT:
+            zip64_end = self._offset
+            self._write(
+                _ZIP64_END.pack(
+                    b"PK\x06\x06",
+                    _ZIP64_END.size - 12,
+                    _ZIP64_VERSION,
+                    _ZIP64_VERSION,
+                    0,
+                    0,
+                    count,
+                    count,
+                    size,
+                    start,
+                )
+            )
+            self._write(_ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, zip64_end, 1))
+            count = min(count, _ZIP_FILECOUNT_LIMIT)
+            size = min(size, _ZIP64_LIMIT)
+            start = min(start, _ZIP64_LIMIT)
+
+        self._write(_END_OF_CENTRAL_DIR.pack(b"PK\x05\x06", 0, 0, count, count, size, start, 0))
+
+
+class ZipMemberWriter(io.BufferedIOBase):
+    """
+    Writable binary stream for one member of a `ZipWriter` archive.
+
+    Data is buffered into blocks; full blocks are compressed on the
+    archive's thread pool while later data is still being produced, and
+    compressed blocks are written to the archive in order.
+    """
+
+    def __init__(self, archive: ZipWriter, member: ZipMember):
+        super().__init__()
+        self._archive = archive
+        self._member = member
+        self._buffer = bytearray()
+        self._window = b""
+        self._pending: deque[Future[bytes]] = deque()
+        self._compressor = None
+        if member.compress_type == ZIP_ZSTANDARD:
+            self._compressor = _zstd_compressor(archive.compresslevel)
+        elif member.compress_type == ZIP_DEFLATED and archive._pool is None:
+            self._compressor = zlib.compressobj(
+                _zlib_level(archive.compresslevel), zlib.DEFLATED, -15
+            )
+
+    @property
+    def compress_type(self) -> int:
+        return self._member.compress_type
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Buffer) -> int:
+        """Add uncompressed data to the member."""
+        if self.closed:
+            raise ValueError("I/O operation on closed member")
+        # Counted in bytes, whatever the format of the buffer
+        data = memoryview(data).cast("B")
+        self._member.crc = zlib.crc32(data, self._member.crc)
+        self._member.file_size += len(data)
+
+        if self._member.compress_type == ZIP_STORED:
+            # Written as is; the archive's stream copies it before returning
+            self._emit(data)
+        elif self._compressor is not None:
+            self._emit(self._compressor.compress(data))
+        else:
+            self._buffer += data
+            while len(self._buffer) >= BLOCK_SIZE:
+                self._submit(bytes(self._buffer[:BLOCK_SIZE]), final=False)
+                del self._buffer[:BLOCK_SIZE]
+        return len(data)
+
+    def close(self):
+        """Flush the remaining data and write the member's data descriptor."""
+        if self.closed:
+            return
+        if self._compressor is not None:
+            self._emit(self._compressor.flush())
+        elif self._member.compress_type == ZIP_DEFLATED:
+            self._submit(bytes(self._buffer), final=True)
+            while self._pending:
+                self._emit(self._pending.popleft().result())
+        self._archive._finish_member(self._member)
+        super().close()
+
+    def _submit(self, block: bytes, final: bool):
+        """Compress a block on the thread pool, keeping a bounded backlog."""
+        pool = self._archive._pool
+        if pool is None:
+            # Members of single threaded archives use a compressor instead
+            raise RuntimeError("Blocks are only deflated on the archive's thread pool")
+        self._pending.append(
+            pool.submit(
+                _deflate_block, block, self._window, _zlib_level(self._archive.compresslevel), final
+            )
+        )
+        self._window = block[-DEFLATE_WINDOW:]
+        while len(self._pending) > 2 * self._archive._compression_threads:
+            self._emit(self._pending.popleft().result())
+
+    def _emit(self, compressed: bytes | memoryview):
+        self._member.compress_size += len(compressed)
+        self._archive._write(compressed)
+
+
+def zstd_available() -> bool:
+    """Whether Zstandard compression is available."""
+    try:
+        _zstd_compressor(None)
+    except ValueError:
+        return False
+    return True
+
+
+def _zstd_compressor(level: int | None):
+    """Zstandard compressor from the standard library or the zstandard package."""
+    try:
+        from compression import zstd
+    except ImportError:
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(
+                "Zstandard compression needs Python 3.14 or the zstandard package"
+            ) from None
+        kwargs = {} if level is None else {"level": level}
+        return zstandard.ZstdCompressor(**kwargs).compressobj()
+    return zstd.ZstdCompressor(level)
+
+
+def _zlib_level(level: int | None) -> int:
+    return zlib.Z_DEFAULT_COMPRESSION if level is None else level
+
+
+def _check_compression(compress_type: int, level: int | None):
+    """Raise a ValueError for an unsupported compression method or level."""
+    if compress_type not in COMPRESSION_METHODS.values():
+        raise ValueError(f"Unsupported compression method: {compress_type}")
+    if level is not None and level not in COMPRESSION_LEVELS.get(compress_type, ()):
+        raise ValueError(f"Unsupported compression level {level} for method {compress_type}")
+    if compress_type == ZIP_ZSTANDARD:
+        _zstd_compressor(level)
+
+
+def _deflate_block(block: bytes, window: bytes, level: int, final: bool) -> bytes:
+    """Raw-deflate one block, primed with the data that precedes it."""
+    if window:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=window)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    flush_mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+    return compressor.compress(block) + compressor.flush(flush_mode)
+
+
+def _local_header(member: ZipMember) -> bytes:
+    """Local file header; sizes follow the data in a Zip64 data descriptor."""
+    name = member.filename.encode("utf-8")
+    extra = struct.pack("<HHQQ", 1, 16, 0, 0)
+    dos_date, dos_time = member.dos_time
+    return (
+        _LOCAL_HEADER.pack(
+            b"PK\x03\x04",
+            member.version,
+            _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8,
+            member.compress_type,
+            dos_time,
+            dos_date,
+            0,
+            _ZIP64_LIMIT,
+            _ZIP64_LIMIT,
+            len(name),
+            len(extra),
+        )
+        + name
+        + extra
+    )
+
+
+def _central_header(member: ZipMember) -> bytes:
+    """Central directory record, with Zip64 fields only where needed."""
+    name = member.filename.encode("utf-8")
+    zip64_fields = []
+    file_size, compress_size, offset = member.file_size, member.compress_size, member.header_offset
+    if file_size > _ZIP64_LIMIT:
+        zip64_fields.append(file_size)
+        file_size = _ZIP64_LIMIT
+    if compress_size > _ZIP64_LIMIT:
+        zip64_fields.append(compress_size)
+        compress_size = _ZIP64_LIMIT
+    if offset > _ZIP64_LIMIT:
+        zip64_fields.append(offset)
+        offset = _ZIP64_LIMIT
+    extra = b""
+    if zip64_fields:
+        extra = struct.pack(f"<HH{len(zip64_fields)}Q", 1, 8 * len(zip64_fields), *zip64_fields)
+
+    dos_date, dos_time = member.dos_time
+    return (
+        _CENTRAL_HEADER.pack(
+            b"PK\x01\x02",
+            member.version,
+            _UNIX_SYSTEM,
+            member.version,
+            0,
+            _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8,
+            member.compress_type,
+            dos_time,
+            dos_date,
+            member.crc,
+            compress_size,
+            file_size,
+            len(name),
+            len(extra),
+            0,
+            0,
+            0,
+            _FILE_ATTRIBUTES,
+            offset,
+        )
+        + name
+        + extra
+    )
@@ -2,9 +2,9 @@
 set -e
 
 if [ "$1" = 'casper' ]; then
-  exec uv run casper "$@"
+  exec uv run --no-sync casper "$@"
 elif [ "$1" = 'casper_harmony' ]; then
-  exec uv run casper_harmony "$@"
+  exec uv run --no-sync casper_harmony "$@"
 else
-  exec uv run casper_harmony "$@"
+  exec uv run --no-sync casper_harmony "$@"
 fi
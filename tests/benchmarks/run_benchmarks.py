@@ -0,0 +1,274 @@
+"""Benchmark casper on synthetic granules.
+
+Each scenario writes one synthetic granule, then every target runs in a
+fresh process so its peak RSS is measured on its own:
+
+- ``valid_workable_file``: open and emptiness check
+- ``convert_to_csv``: conversion to a local zip file
+- ``process_file``: the Harmony adapter with file:// staging
+
+Results are written as JSON and can be compared against an earlier run::
+
+    uv run python -m tests.benchmarks.run_benchmarks --output before.json
+    uv run python -m tests.benchmarks.run_benchmarks --compare before.json
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+
+from tests.benchmarks.synthetic import GranuleSpec, write_granule
+
+# Module constants
+SCENARIOS: dict[str, GranuleSpec] = {
+    "baseline": GranuleSpec(),
+    "many_variables": GranuleSpec(variables=200, lat=60, lon=120, chunks=(1, 60, 120)),
+    "deep_groups": GranuleSpec(group_depth=5, variables=30),
+    "large_grid": GranuleSpec(variables=4, time=2, lat=360, lon=720, chunks=(1, 180, 360)),
+    "sparse": GranuleSpec(fill_ratio=0.95),
+    "uncompressed": GranuleSpec(compression=None, chunks=None),
+}
+TARGETS = ("valid_workable_file", "convert_to_csv", "process_file")
+DEFAULT_TOLERANCE = 0.2
+MB = 1e6
+
+
+def run_case(target: str, granule: str, work_dir: str, engine: str) -> dict:
+    """
+    Run one benchmark target on a granule and measure it.
+
+    Runs in a worker process, so the peak RSS covers this target only.
+
+    Returns
+    -------
+    dict
+        Wall time, input and output bytes, rows written and peak RSS
+    """
+    os.environ["CASPER_CSV_ENGINE"] = engine
+    work_path = Path(work_dir)
+    work_path.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    if target == "valid_workable_file":
+        from casper.file_ops import valid_workable_file
+
+        valid_workable_file(granule)
+        zip_files = []
+    elif target == "convert_to_csv":
+        from casper.convert_to_csv import convert_to_csv
+
+        zip_files = [work_path / "output.zip"]
+        convert_to_csv(granule, zip_files[0], engine=engine)
+    elif target == "process_file":
+        zip_files = _run_adapter(granule, work_path)
+    else:
+        raise ValueError(f"Unknown benchmark target: {target}")
+    seconds = time.perf_counter() - start
+
+    rows, csv_bytes = 0, 0
+    for zip_file in zip_files:
+        with ZipFile(zip_file) as zf:
+            for info in zf.infolist():
+                if info.filename.endswith(".csv"):
+                    csv_bytes += info.file_size
+                    with zf.open(info) as member:
+                        rows += sum(1 for _ in member) - 1
+
+    bytes_in = Path(granule).stat().st_size
+    return {
+        "seconds": seconds,
+        "rows": rows,
+        "bytes_in": bytes_in,
+        "bytes_out": csv_bytes,
+        "zip_bytes": sum(Path(zip_file).stat().st_size for zip_file in zip_files),
+        "rows_per_s": rows / seconds,
+        "mb_in_per_s": bytes_in / MB / seconds,
+        "mb_out_per_s": csv_bytes / MB / seconds,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / MB,
+    }
+
+
+def _run_adapter(granule: str, work_path: Path) -> list[Path]:
+    """Convert a granule with the Harmony adapter, staging to a local directory."""
+    from harmony_service_lib.message import Message
+    from harmony_service_lib.util import config
+    from pystac import Asset, Catalog, Item
+
+    from casper.harmony.service_adapter import CasperAdapter
+
+    staging_dir = work_path / "staging"
+    staging_dir.mkdir(exist_ok=True)
+    message = Message(
+        {
+            "sources": [{"collection": "C0000-BENCHMARK", "shortName": "SYNTHETIC"}],
+            "format": {"mime": "text/csv"},
+            "stagingLocation": staging_dir.as_uri() + "/",
+            "accessToken": "fake-token",
+            "user": "casper-benchmark",
+            "requestId": "00000000-0000-0000-0000-000000000000",
+        }
+    )
+    catalog = Catalog("input", "Benchmark input")
+    item = Item("granule", None, None, datetime(2000, 1, 1, tzinfo=UTC), {})
+    item.add_asset(
+        "data",
+        Asset(Path(granule).as_uri(), media_type="application/x-netcdf4", roles=["data"]),
+    )
+    catalog.add_item(item)
+
+    adapter = CasperAdapter(message, catalog=catalog, config=config(validate=False))
+    adapter.process_file(adapter.catalog)
+    return sorted(staging_dir.glob("*.zip"))
+
+
+def run_benchmarks(
+    scenarios: list[str], targets: list[str], work_dir: Path, engine: str = "pandas"
+) -> list[dict]:
+    """
+    Run every target on the granule of every scenario.
+
+    Returns
+    -------
+    list[dict]
+        One result per scenario and target, see `run_case`
+    """
+    results = []
+    mp_context = multiprocessing.get_context("spawn")
+    for scenario in scenarios:
+        spec = SCENARIOS[scenario]
+        granule = write_granule(work_dir / f"{scenario}.nc4", spec)
+        for target in targets:
+            with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as pool:
+                metrics = pool.submit(
+                    run_case, target, str(granule), str(work_dir / scenario / target), engine
+                ).result()
+            results.append({"scenario": scenario, "target": target, **metrics})
+            print(_format_row(results[-1]), flush=True)
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """
+    Compare results with an earlier run.
+
+    Returns
+    -------
+    list[str]
+        Description of every wall time or peak RSS more than ``tolerance``
+        above the baseline
+    """
+    previous = {(r["scenario"], r["target"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["target"]))
+        if before is None:
+            continue
+        for metric in ("seconds", "peak_rss_mb"):
+            if result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{result['scenario']}/{result['target']}: {metric} "
+                    f"{before[metric]:.2f} -> {result[metric]:.2f}"
+                )
+    return regressions
+
+
+def _format_row(result: dict) -> str:
+    return (
+        f"{result['scenario']:<16} {result['target']:<20} {result['seconds']:>8.2f}s "
+        f"{result['rows_per_s']:>12,.0f} rows/s {result['mb_in_per_s']:>8.1f} MB/s in "
+        f"{result['mb_out_per_s']:>8.1f} MB/s out {result['peak_rss_mb']:>8.1f} MB peak RSS"
+    )
+
+
+def _environment() -> dict:
+    """Details of the machine and code the benchmarks ran on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point of the benchmark runner."""
+    parser = ArgumentParser(description="Benchmark casper on synthetic granules")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="Scenario to run, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--target",
+        action="append",
+        choices=TARGETS,
+        help="Target to run, may be repeated (default: all)",
+    )
+    parser.add_argument("--engine", default="pandas", help="CSV engine used for conversion")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark-results") / f"{datetime.now(UTC):%Y%m%dT%H%M%SZ}.json",
+        help="File the results are written to",
+    )
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Relative slowdown or memory growth reported as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    with TemporaryDirectory() as work_dir:
+        results = run_benchmarks(
+            args.scenario or list(SCENARIOS),
+            args.target or list(TARGETS),
+            Path(work_dir),
+            args.engine,
+        )
+
+    print()
+    for result in results:
+        print(_format_row(result))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"environment": _environment(), "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
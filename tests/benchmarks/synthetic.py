@@ -0,0 +1,114 @@
+"""Parametric synthetic NetCDF4 granules for benchmarking casper."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+import netCDF4 as nc
+import numpy as np
+
+if TYPE_CHECKING:
+    from netCDF4 import CompressionLevel, CompressionType
+
+# Module constants
+FILL_VALUE = np.float32(-9999.0)
+
+
+class GranuleSpec(NamedTuple):
+    """
+    Shape of a synthetic granule.
+
+    Coordinates live in the root group. Data variables are spread evenly
+    over a chain of ``group_depth`` nested groups (the root group when the
+    depth is 0). The first ``surface_variables`` use the (lat, lon) schema
+    and the rest the (time, lat, lon) schema. Chunks are clipped to the
+    dimension sizes.
+    """
+
+    group_depth: int = 1
+    variables: int = 20
+    surface_variables: int = 2
+    time: int = 1
+    lat: int = 180
+    lon: int = 360
+    fill_ratio: float = 0.5
+    compression: CompressionType | None = "zlib"
+    complevel: CompressionLevel = 4
+    chunks: tuple[int, int, int] | None = (1, 90, 180)
+
+    @property
+    def rows(self) -> int:
+        """Rows of the largest schema, before rows without data are dropped."""
+        return self.time * self.lat * self.lon
+
+
+def write_granule(path: str | Path, spec: GranuleSpec, seed: int = 0) -> Path:
+    """
+    Write a synthetic granule.
+
+    Parameters
+    ----------
+    path
+        Path of the NetCDF4 file to create
+    spec
+        Structure, sizes, fill ratio and storage options of the granule
+    seed
+        Seed of the random values and fill pattern
+
+    Returns
+    -------
+    Path
+        Path of the file written
+    """
+    rng = np.random.default_rng(seed)
+    path = Path(path)
+    with nc.Dataset(path, "w", format="NETCDF4") as dataset:
+        dataset.title = "casper synthetic benchmark granule"
+        dataset.createDimension("time", spec.time)
+        dataset.createDimension("latitude", spec.lat)
+        dataset.createDimension("longitude", spec.lon)
+
+        time = dataset.createVariable("time", "f8", ("time",))
+        time.units = "seconds since 2000-01-01"
+        time[:] = np.arange(spec.time) * 3600.0
+        dataset.createVariable("latitude", "f4", ("latitude",))[:] = np.linspace(
+            -90, 90, spec.lat, dtype="f4"
+        )
+        dataset.createVariable("longitude", "f4", ("longitude",))[:] = np.linspace(
+            -180, 180, spec.lon, dtype="f4"
+        )
+
+        groups = [dataset]
+        for depth in range(spec.group_depth):
+            groups.append(groups[-1].createGroup(f"group{depth}"))
+        groups = groups[1:] or groups
+
+        for idx in range(spec.variables):
+            group = groups[idx % len(groups)]
+            dims: tuple[str, ...]
+            chunks: tuple[int, ...] | None
+            if idx < spec.surface_variables:
+                dims = ("latitude", "longitude")
+                chunks = spec.chunks[1:] if spec.chunks else None
+            else:
+                dims = ("time", "latitude", "longitude")
+                chunks = spec.chunks
+            shape = tuple(len(dataset.dimensions[dim]) for dim in dims)
+            if chunks is not None:
+                chunks = tuple(min(chunk, size) for chunk, size in zip(chunks, shape, strict=True))
+            var = group.createVariable(
+                f"var{idx:04d}",
+                "f4",
+                dims,
+                fill_value=FILL_VALUE,
+                compression=spec.compression,
+                complevel=spec.complevel,
+                contiguous=spec.chunks is None and spec.compression is None,
+                chunksizes=chunks,
+            )
+            var.units = "1"
+            values = rng.random(shape, dtype="f4")
+            values[rng.random(shape) < spec.fill_ratio] = FILL_VALUE
+            var[:] = values
+    return path
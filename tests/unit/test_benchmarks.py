@@ -0,0 +1,43 @@
+import netCDF4 as nc
+import numpy as np
+
+from tests.benchmarks.run_benchmarks import compare, run_case
+from tests.benchmarks.synthetic import FILL_VALUE, GranuleSpec, write_granule
+
+
+def test_write_granule(tmp_path):
+    spec = GranuleSpec(group_depth=3, variables=6, time=2, lat=4, lon=5, fill_ratio=0.5)
+    path = write_granule(tmp_path / "granule.nc4", spec)
+
+    with nc.Dataset(path) as dataset:
+        group = dataset["group0/group1/group2"]
+        assert group.path == "/group0/group1/group2"
+        assert dataset["group0/var0000"].dimensions == ("latitude", "longitude")
+        var = dataset["group0/group1/group2/var0005"]
+        assert var.dimensions == ("time", "latitude", "longitude")
+        assert var.filters()["zlib"]
+        assert var.chunking() == [1, 4, 5]
+
+        values = var[:]
+        assert np.ma.getmaskarray(values).any()
+        assert not np.ma.getmaskarray(values).all()
+        assert var._FillValue == FILL_VALUE
+
+
+def test_run_case_convert_to_csv(tmp_path):
+    spec = GranuleSpec(variables=3, surface_variables=0, lat=6, lon=8, fill_ratio=0.0, chunks=None)
+    granule = write_granule(tmp_path / "granule.nc4", spec)
+
+    result = run_case("convert_to_csv", str(granule), str(tmp_path / "work"), "numpy")
+
+    assert result["rows"] == spec.rows
+    assert result["bytes_out"] > 0
+    assert result["peak_rss_mb"] > 0
+
+
+def test_compare_flags_regressions():
+    baseline = [{"scenario": "a", "target": "t", "seconds": 1.0, "peak_rss_mb": 100.0}]
+    results = [{"scenario": "a", "target": "t", "seconds": 1.5, "peak_rss_mb": 105.0}]
+
+    assert compare(results, baseline, tolerance=0.2) == ["a/t: seconds 1.00 -> 1.50"]
+    assert compare(results, baseline, tolerance=0.6) == []
@@ -0,0 +1,121 @@
+import logging
+from zipfile import ZipFile
+
+import netCDF4 as nc
+import numpy as np
+import pytest
+import xarray as xr
+
+from casper.chunking import ChunkLayout, cache_chunks, schema_chunks, tune_chunk_caches
+from casper.convert_to_csv import _schema_slab, convert_to_csv
+from casper.session import GranuleSession
+
+module_logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def chunked_granule(tmp_path):
+    path = tmp_path / "chunked.nc4"
+    with nc.Dataset(path, "w") as dataset:
+        for dim, size in {"time": 4, "lat": 40, "lon": 60}.items():
+            dataset.createDimension(dim, size)
+            dataset.createVariable(dim, "f8", (dim,))[:] = np.arange(size)
+        dims = ("time", "lat", "lon")
+        for name, chunks in [("a", (2, 10, 60)), ("b", (1, 20, 30))]:
+            var = dataset.createVariable(name, "f4", dims, compression="zlib", chunksizes=chunks)
+            var[:] = np.ones((4, 40, 60), dtype="f4")
+        dataset.createVariable("c", "f4", dims, contiguous=True)[:] = np.ones((4, 40, 60))
+    return path
+
+
+def test_chunk_layout(chunked_granule):
+    with nc.Dataset(chunked_granule) as dataset:
+        a, b, c = (ChunkLayout.of(dataset[name]) for name in "abc")
+
+    assert a == ChunkLayout({"time": 2, "lat": 10, "lon": 60}, 4)
+    assert a.chunk_bytes == 2 * 10 * 60 * 4
+    assert c.chunks is None
+    assert schema_chunks(("time", "lat", "lon"), [a, b, c]) == {"time": 2, "lat": 20, "lon": 60}
+
+
+def test_cache_chunks():
+    sizes = {"time": 4, "lat": 40, "lon": 60}
+    a = ChunkLayout({"time": 2, "lat": 10, "lon": 60}, 4)
+    b = ChunkLayout({"time": 1, "lat": 20, "lon": 30}, 4)
+
+    assert cache_chunks(a, sizes, None, 0) == 0
+    # Each time index is read separately, so the chunks of a whole time
+    # chunk are read twice
+    assert cache_chunks(a, sizes, "lat", 20) == 4
+    # Aligned tiles read every chunk once
+    assert cache_chunks(b, sizes, "lat", 20) == 0
+    # Unaligned tiles share the chunks on their boundaries
+    assert cache_chunks(b, sizes, "lat", 10) == 2 * 2
+
+
+def test_tune_chunk_caches(chunked_granule):
+    xr.set_options(use_new_combine_kwarg_defaults=True)
+    vvs = ["/a", "/b", "/c"]
+    with GranuleSession(chunked_granule) as session:
+        ds, _ = _schema_slab(session.tree, ("time", "lat", "lon"), vvs, None, {})
+        default = session.dataset["b"].get_var_chunk_cache()
+        # Tiles of 20 latitudes, see estimate_row_bytes
+        budget = 20 * 60 * (3 * 4 + 3 * 8 + 3 * 8) * 4
+
+        chunks = tune_chunk_caches(session, ds, vvs, budget, module_logger)
+        assert chunks == {"time": 2, "lat": 20, "lon": 60}
+        size, slots, _ = session.dataset["a"].get_var_chunk_cache()
+        assert size == 4 * 2 * 10 * 60 * 4
+        assert slots >= 1009
+        assert session.dataset["b"].get_var_chunk_cache() == default
+
+        # Caches that do not fit the budget keep the default
+        session.dataset["a"].set_var_chunk_cache(*default)
+        tune_chunk_caches(session, ds, vvs, budget // 8, module_logger)
+        assert session.dataset["a"].get_var_chunk_cache() == default
+
+
+@pytest.mark.parametrize("engine, shard_rows", [("pandas", None), ("numpy", None), ("numpy", 2)])
+def test_convert_granule_with_string_variable(tmp_path, engine, shard_rows):
+    path = tmp_path / "strings.nc4"
+    with nc.Dataset(path, "w") as dataset:
+        dataset.createDimension("x", 3)
+        dataset.createVariable("x", "f8", ("x",))[:] = np.arange(3)
+        dataset.createVariable("val", "f4", ("x",))[:] = [1.5, 2.5, 3.5]
+        name = dataset.createVariable("name", str, ("x",))
+        for idx, value in enumerate(["a", "b", "c"]):
+            name[idx] = value
+
+    with GranuleSession(path) as session:
+        convert_to_csv(
+            session, tmp_path / "strings.zip", module_logger, engine=engine, shard_rows=shard_rows
+        )
+
+    lines = []
+    with ZipFile(tmp_path / "strings.zip") as zf:
+        for csv_name in sorted(name for name in zf.namelist() if name.endswith(".csv")):
+            header, *rows = zf.read(csv_name).decode().splitlines()
+            lines = (lines or [header]) + rows
+    assert lines == ["x,/val,/name", "0.0,1.5,a", "1.0,2.5,b", "2.0,3.5,c"]
+
+
+@pytest.mark.parametrize("engine, shard_rows", [("pandas", None), ("numpy", None), ("numpy", 2)])
+def test_convert_netcdf3_granule(tmp_path, engine, shard_rows):
+    path = tmp_path / "classic.nc"
+    with nc.Dataset(path, "w", format="NETCDF3_CLASSIC") as dataset:
+        dataset.createDimension("x", 3)
+        dataset.createVariable("x", "f8", ("x",))[:] = np.arange(3)
+        dataset.createVariable("val", "f4", ("x",))[:] = [1.5, 2.5, 3.5]
+
+    with GranuleSession(path) as session:
+        assert ChunkLayout.of(session.dataset["val"]) == ChunkLayout(None, 4)
+        convert_to_csv(
+            session, tmp_path / "classic.zip", module_logger, engine=engine, shard_rows=shard_rows
+        )
+
+    lines = []
+    with ZipFile(tmp_path / "classic.zip") as zf:
+        for csv_name in sorted(name for name in zf.namelist() if name.endswith(".csv")):
+            header, *rows = zf.read(csv_name).decode().splitlines()
+            lines = (lines or [header]) + rows
+    assert lines == ["x,/val", "0.0,1.5", "1.0,2.5", "2.0,3.5"]
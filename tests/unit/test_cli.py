@@ -1,14 +1,19 @@
-import os
+import shutil
 import sys
 from tempfile import TemporaryDirectory
 from unittest.mock import patch
 
+import pytest
+
 import casper.cli
 
 from .. import data_for_tests_dir
 
+TEST_DIR = data_for_tests_dir / "unit-test-data"
+TEST_FILE = "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+
 
-def test_cli():
+def test_cli(monkeypatch):
     fname = str(
         data_for_tests_dir
         / "unit-test-data"
@@ -21,5 +26,47 @@ def test_cli():
     ]
 
     with TemporaryDirectory() as temp_dir, patch.object(sys, "argv", test_args):
-        os.chdir(temp_dir)
+        monkeypatch.chdir(temp_dir)
+        casper.cli.main()
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_cli_batch(tmp_path, monkeypatch, capsys, jobs):
+    granules = tmp_path / "granules"
+    (granules / "day").mkdir(parents=True)
+    for name in ["day/A.nc4", "day/B.nc4", "C.nc4"]:
+        shutil.copyfile(TEST_DIR / TEST_FILE, granules / name)
+    (granules / "notes.txt").write_text("not a granule")
+    # Same zip file name as day/A.nc4
+    shutil.copyfile(TEST_DIR / TEST_FILE, granules / "A.h5")
+
+    test_args = [
+        "casper",
+        str(granules / "day"),
+        str(granules / "*.nc4"),
+        str(granules / "notes.txt"),
+        str(granules / "A.h5"),
+        "--jobs",
+        jobs,
+    ]
+    monkeypatch.chdir(tmp_path)
+    with patch.object(sys, "argv", test_args), pytest.raises(SystemExit) as exit_info:
         casper.cli.main()
+
+    assert exit_info.value.code == 1
+    assert sorted(path.name for path in tmp_path.glob("*.zip")) == ["A.zip", "B.zip", "C.zip"]
+    summary = capsys.readouterr().out.splitlines()
+    assert "Converted 3 of 5 files" in summary
+    statuses = summary[summary.index("Converted 3 of 5 files") + 1 :]
+    assert [line.split()[0] for line in statuses] == ["ok"] * 3 + ["failed"] * 2
+    assert "A.zip is already written for" in summary[-1]
+
+
+def test_run_batch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (result,) = casper.cli.run_batch([str(TEST_DIR / TEST_FILE)], float_precision=3)
+    assert result.error is None
+    assert (tmp_path / result.zip_file).exists()
+
+    with pytest.raises(ValueError):
+        casper.cli.run_batch([str(TEST_DIR / TEST_FILE)], jobs=0)
@@ -0,0 +1,104 @@
+import io
+from zipfile import ZIP_STORED, ZipFile
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from casper.columnar import FILE_KINDS, output_format_for_mime, write_schema_table
+from casper.convert_to_csv import convert_to_csv
+
+from .. import data_for_tests_dir
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+TEST_DIR = data_for_tests_dir / "unit-test-data"
+TEST_FILE = "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+
+
+def _read_table(data, output_format):
+    if output_format == "parquet":
+        return pq.read_table(io.BytesIO(data))
+    return pa.ipc.open_file(pa.BufferReader(data)).read_all()
+
+
+@pytest.mark.parametrize(
+    "output_format, memory_budget, workers",
+    [("parquet", None, 1), ("arrow", None, 1), ("parquet", 4096, 1), ("arrow", 4096, 2)],
+)
+def test_columnar_matches_csv(tmp_path, output_format, memory_budget, workers):
+    zip_file = tmp_path / "columnar.zip"
+    kwargs = {"memory_budget": memory_budget} if memory_budget else {}
+    assert (
+        convert_to_csv(
+            str(TEST_DIR / TEST_FILE),
+            zip_file,
+            output_format=output_format,
+            workers=workers,
+            **kwargs,
+        )
+        == 2
+    )
+
+    with ZipFile(zip_file) as zf:
+        readme = zf.read("Readme.md").decode()
+        assert readme.startswith(f"# 2 {FILE_KINDS[output_format]} files created")
+        for idx in range(2):
+            name = f"{TEST_FILE}-{idx}_reformatted.{output_format}"
+            assert zf.getinfo(name).compress_type == ZIP_STORED
+            table = _read_table(zf.read(name), output_format)
+            expected = pd.read_csv(TEST_DIR / f"{TEST_FILE}-{idx}_reformatted.csv")
+
+            assert table.column_names == list(expected.columns)
+            assert table.schema.metadata[b"casper:dimensions"]
+            actual = table.to_pandas()
+            assert len(actual) == len(expected)
+            for column in expected.columns:
+                if column == "time":
+                    assert (actual[column] == pd.to_datetime(expected[column])).all()
+                else:
+                    np.testing.assert_allclose(
+                        actual[column].astype("f8"), expected[column], rtol=1e-6
+                    )
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_columnar_types_from_dataset(output_format):
+    ds = xr.Dataset(
+        {
+            "val": ("x", np.arange(6, dtype="f4")),
+            "name": ("x", np.array([None, None, None, "d", "e", "f"], dtype=object)),
+        },
+        coords={"x": np.arange(6)},
+    )
+    stream = io.BytesIO()
+    # The first tile has no names to infer their type from
+    tiles = [{"x": slice(0, 3)}, {"x": slice(3, 6)}]
+    write_schema_table(ds, ["val"], stream, output_format, tiles)
+
+    table = _read_table(stream.getvalue(), output_format)
+    assert table.schema.field("name").type == pa.large_string()
+    assert table.column("name").to_pylist() == [None, None, None, "d", "e", "f"]
+
+
+def test_conversion_invalid_format():
+    with pytest.raises(ValueError):
+        convert_to_csv("unused.nc", "unused.zip", output_format="xlsx")
+
+
+@pytest.mark.parametrize(
+    "mime, output_format",
+    [
+        (None, "csv"),
+        ("text/csv", "csv"),
+        ("application/x-parquet", "parquet"),
+        ("application/vnd.apache.parquet", "parquet"),
+        ("application/vnd.apache.arrow.file", "arrow"),
+        ("Application/Vnd.Apache.Arrow.Stream; charset=binary", "arrow"),
+        ("application/x-netcdf4", "csv"),
+    ],
+)
+def test_output_format_for_mime(mime, output_format):
+    assert output_format_for_mime(mime) == output_format
@@ -0,0 +1,156 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from casper import csv_writer
+from casper.csv_writer import format_values, sparse_dataframe, write_csv_numpy
+from casper.tiling import iter_tiles
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        np.array([1.5, np.nan, 1e-5, 1e16, 0.1 + 0.2, -np.inf]),
+        np.array([62.811535, np.nan, 1e-7], dtype=np.float32),
+        np.array([-3, 0, 7], dtype=np.int16),
+        np.array([True, False]),
+        np.array(["2025-09-12", "2025-09-13"], dtype="datetime64[ns]"),
+        np.array(["2025-09-12T21:04:53.022017536", "NaT"], dtype="datetime64[ns]"),
+        np.array(["plain", 'with "quotes"', "a,b", None], dtype=object),
+    ],
+)
+def test_format_values_matches_pandas(values):
+    # A leading index column keeps pandas from quoting lone empty fields
+    expected = pd.DataFrame({"v": values}).to_csv(header=False).splitlines()
+    fields = format_values(values)
+    assert [f"{i},{field.decode()}" for i, field in enumerate(fields)] == expected
+
+
+def test_format_values_float_precision():
+    fields = format_values(np.array([1.23456, 2.0, np.nan]), float_precision=2)
+    assert fields.tolist() == [b"1.23", b"2.0", b""]
+
+
+def test_write_csv_numpy_matches_pandas():
+    data = np.arange(4 * 3 * 5, dtype=np.float64).reshape(4, 3, 5)
+    data[0] = np.nan
+    data[2, 1, 3] = np.nan
+    ds = xr.Dataset(
+        {
+            "a": (("t", "y", "x"), data),
+            "b": (("t", "y", "x"), data.astype(np.float32) / 3),
+        },
+        coords={
+            "t": pd.date_range("2025-01-01", periods=4, freq="h"),
+            "y": [10.5, 11.5, 12.5],
+            "x": np.arange(5),
+            "lat": (("y", "x"), np.linspace(-1, 1, 15).reshape(3, 5)),
+        },
+    )
+    ds = ds[["t", "y", "x", "lat", "a", "b"]]
+    expected = ds.to_dataframe().dropna(how="all", subset=["a", "b"]).to_csv().encode()
+
+    for budget in [1, 64, 10**9]:
+        stream = io.BytesIO()
+        tiles = iter_tiles(ds.sizes, 1, budget)
+        num_rows = write_csv_numpy(ds, ["a", "b"], stream, tiles)
+        assert stream.getvalue() == expected
+        assert num_rows == 44
+
+
+def test_format_values_datetime_unit():
+    values = np.array(["2025-09-12", "2025-09-12T01:00", "NaT"], dtype="datetime64[ns]")
+
+    assert format_values(values[:1]).tolist() == [b"2025-09-12"]
+    assert format_values(values[:1], unit="s").tolist() == [b"2025-09-12 00:00:00"]
+    assert format_values(values, unit="ms").tolist() == [
+        b"2025-09-12 00:00:00.000",
+        b"2025-09-12 01:00:00.000",
+        b"",
+    ]
+
+
+def test_write_csv_numpy_datetime_format_across_tiles():
+    data = np.arange(4 * 3, dtype=np.float64).reshape(4, 3)
+    times = np.array([0, 1, 24, 25], dtype="timedelta64[h]") + np.datetime64("2025-01-01", "ns")
+    ds = xr.Dataset(
+        {"a": (("t", "x"), data), "seen": (("t", "x"), times[:, None] + np.zeros((1, 3), "m8[h]"))},
+        coords={"t": times, "x": np.arange(3)},
+    )
+    expected = ds.to_dataframe().to_csv().encode()
+
+    # One time per tile, so only some tiles hold times of day
+    stream = io.BytesIO()
+    write_csv_numpy(ds, ["a"], stream, iter_tiles(ds.sizes, 1, 3))
+    assert stream.getvalue() == expected
+    assert b"\n2025-01-01 00:00:00,0,0.0,2025-01-01 00:00:00\n" in expected
+
+
+def _rounded(da, float_precision):
+    return da.variable.copy(data=np.round(da.values, float_precision))
+
+
+@pytest.mark.parametrize("float_precision", [None, 2])
+def test_sparse_dataframe_matches_dropna(float_precision):
+    rng = np.random.default_rng(0)
+    data = rng.random((6, 20, 30))
+    # Mostly fill, as in swath and partial-coverage products
+    data[rng.random(data.shape) < 0.9] = np.nan
+    ds = xr.Dataset(
+        {
+            "a": (("t", "y", "x"), data),
+            "b": (("y", "x"), np.full((20, 30), np.nan, dtype=np.float32)),
+            "flag": ((), np.int8(1)),
+        },
+        coords={
+            "t": pd.date_range("2025-01-01", periods=6, freq="h"),
+            "y": np.linspace(10, 12, 20),
+            "x": np.arange(30),
+            "lat": (("y", "x"), rng.random((20, 30))),
+            "name": ("t", ["a", "b,c", "d", "e", "f", "g"]),
+        },
+    )
+    dense = ds.to_dataframe().dropna(how="all", subset=["a", "b"])
+    for tile in [ds, ds.isel(t=0), ds.isel(t=0, y=0)]:
+        sparse = sparse_dataframe(tile, ["a", "b"], float_precision)
+        if float_precision is not None:
+            # Coordinates are rounded too, dimensions included
+            tile = tile.assign_coords(
+                {name: _rounded(tile[name], float_precision) for name in ["y", "lat"]}
+            ).assign({name: _rounded(tile[name], float_precision) for name in ["a", "b"]})
+        expected = tile.to_dataframe().dropna(how="all", subset=["a", "b"])
+        pd.testing.assert_frame_equal(sparse, expected)
+        assert sparse.to_csv() == expected.to_csv()
+    assert len(sparse_dataframe(ds, ["a", "b"])) == len(dense) < data.size / 5
+
+
+def test_write_csv_numpy_formats_repeated_coordinates_once(monkeypatch):
+    data = np.full((4, 50, 60), np.nan)
+    data[[0, 2]] = 1.0
+    ds = xr.Dataset(
+        {"a": (("t", "y", "x"), data), "flag": ((), np.int8(3))},
+        coords={
+            "t": pd.date_range("2025-01-01", periods=4, freq="D"),
+            "y": np.linspace(0, 1, 50),
+            "x": np.linspace(0, 1, 60),
+            "lat": (("y", "x"), np.linspace(-1, 1, 3000).reshape(50, 60)),
+        },
+    )
+    ds = ds[["t", "y", "x", "lat", "a", "flag"]]
+    expected = ds.to_dataframe().dropna(how="all", subset=["a"]).to_csv().encode()
+
+    formatted = []
+    monkeypatch.setattr(
+        csv_writer,
+        "format_values",
+        lambda values, *args: formatted.append(values.size) or format_values(values, *args),
+    )
+    stream = io.BytesIO()
+    write_csv_numpy(ds, ["a"], stream, iter_tiles(ds.sizes, 1, 10**9))
+    assert stream.getvalue() == expected
+    assert b"2025-01-03," in expected and b"00:00" not in expected
+    # t, y, x, lat and flag are formatted once per distinct value
+    assert sorted(formatted) == [1, 2, 50, 60, 3000, 6000]
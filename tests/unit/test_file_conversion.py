@@ -1,19 +1,39 @@
+import json
 import logging
+import marshal
 from os import listdir
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from zipfile import ZipFile
+from zipfile import ZIP_STORED, ZipFile
+
+import netCDF4 as nc
+import numpy as np
+import pytest
+import xarray as xr
 
 from casper.convert_to_csv import (
     convert_to_csv,
+    schema_dataset,
 )
+from casper.tiling import DEFAULT_MEMORY_BUDGET
 
 from .. import data_for_tests_dir
 
 module_logger = logging.getLogger(__name__)
 
 
-def test_coversion():
+@pytest.mark.parametrize(
+    "memory_budget, engine, workers, compression_threads",
+    [
+        (DEFAULT_MEMORY_BUDGET, "pandas", 1, 1),
+        (4096, "pandas", 1, 1),
+        (DEFAULT_MEMORY_BUDGET, "numpy", 1, 1),
+        (4096, "numpy", 1, 1),
+        (DEFAULT_MEMORY_BUDGET, "pandas", 2, 1),
+        (4096, "numpy", 1, 4),
+    ],
+)
+def test_coversion(memory_budget, engine, workers, compression_threads):
     fname = str(
         data_for_tests_dir
         / "unit-test-data"
@@ -30,6 +50,10 @@ def test_coversion():
             fname,
             zip_file,
             logger=module_logger,
+            memory_budget=memory_budget,
+            engine=engine,
+            workers=workers,
+            compression_threads=compression_threads,
         )
         assert num_csv_files == 2
         # Extract converted files and compare to test files in unit-test-data
@@ -43,6 +67,191 @@ def test_coversion():
         )
         assert op_files == test_files
         for f in test_files:
-            f = Path(f"{temp_dir}") / f"{f}"
+            f1 = Path(f"{temp_dir}") / f"{f}"
             f2 = Path(f"{test_data_dir}") / f"{f}"
-            assert f.read_bytes() == f2.read_bytes()
+            if f.endswith(".json"):
+                assert json.loads(f1.read_text()) == json.loads(f2.read_text())
+            else:
+                assert f1.read_bytes() == f2.read_bytes()
+
+
+def test_conversion_float_precision():
+    fname = str(
+        data_for_tests_dir
+        / "unit-test-data"
+        / "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+    )
+
+    with TemporaryDirectory() as temp_dir:
+        outputs = {}
+        for engine in ["pandas", "numpy"]:
+            zip_file = f"{temp_dir}/{engine}.zip"
+            convert_to_csv(fname, zip_file, engine=engine, float_precision=2)
+            with ZipFile(zip_file, "r") as zip_ref:
+                outputs[engine] = {
+                    name: zip_ref.read(name) for name in zip_ref.namelist() if "csv" in name
+                }
+
+        assert outputs["pandas"] == outputs["numpy"]
+        rows = outputs["numpy"][next(iter(outputs["numpy"]))].decode().splitlines()
+        assert rows[1] == "41.21,-86.77,3.67"
+
+
+def test_conversion_stored(tmp_path):
+    test_data_dir = data_for_tests_dir / "unit-test-data"
+    fname = test_data_dir / "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+    zip_file = tmp_path / "stored.zip"
+    convert_to_csv(str(fname), zip_file, compression="stored")
+
+    with ZipFile(zip_file) as zip_ref:
+        for info in zip_ref.infolist():
+            assert info.compress_type == ZIP_STORED
+            if info.filename.endswith(".csv"):
+                assert zip_ref.read(info) == (test_data_dir / info.filename).read_bytes()
+
+
+def test_conversion_invalid_compression():
+    with pytest.raises(ValueError):
+        convert_to_csv("unused.nc", "unused.zip", compression="bzip2")
+
+
+@pytest.mark.parametrize(
+    "shards, engine, workers",
+    [
+        ({"shard_rows": 500}, "pandas", 1),
+        ({"shard_rows": 500}, "numpy", 2),
+        ({"shard_size": 64 * 1024}, "pandas", 2),
+    ],
+)
+def test_conversion_shards(tmp_path, shards, engine, workers):
+    test_data_dir = data_for_tests_dir / "unit-test-data"
+    input_filename = "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+    zip_file = tmp_path / "sharded.zip"
+    num_files = convert_to_csv(
+        str(test_data_dir / input_filename), zip_file, engine=engine, workers=workers, **shards
+    )
+
+    with ZipFile(zip_file) as zip_ref:
+        readme = json.loads(zip_ref.read("Readme.json"))
+        schema_files = [name for name in readme if name.endswith(".csv")]
+        assert num_files == sum(len(readme[name]["shards"]) for name in schema_files)
+        assert num_files > len(schema_files) == 2
+        assert f"# {num_files} CSV files created" in zip_ref.read("Readme.md").decode()
+
+        for idx, name in enumerate(schema_files):
+            shard_files = readme[name]["shards"]
+            assert shard_files[0] == name == f"{input_filename}-{idx}-0_reformatted.csv"
+            expected = (test_data_dir / f"{input_filename}-{idx}_reformatted.csv").read_bytes()
+            header, _, _ = expected.partition(b"\n")
+            rows = []
+            for shard_file in shard_files:
+                shard = zip_ref.read(shard_file).splitlines(keepends=True)
+                # Every shard has its own header
+                assert shard[0].rstrip() == header
+                if "shard_rows" in shards:
+                    assert len(shard) - 1 <= shards["shard_rows"]
+                else:
+                    assert len(b"".join(shard)) <= shards["shard_size"]
+                rows.extend(shard[1:])
+            assert header + b"\n" + b"".join(rows) == expected
+
+
+@pytest.mark.parametrize("engine", ["pandas", "numpy"])
+def test_conversion_datetime_format_across_tiles(tmp_path, engine):
+    path = tmp_path / "hourly.nc4"
+    with nc.Dataset(path, "w") as dataset:
+        for dim, size in {"time": 4, "y": 30, "x": 30}.items():
+            dataset.createDimension(dim, size)
+            dataset.createVariable(dim, "f8", (dim,))[:] = np.arange(size)
+        dataset["time"].units = "hours since 2020-01-01"
+        dataset.createVariable("val", "f4", ("time", "y", "x"))[:] = np.ones((4, 30, 30))
+        observed = dataset.createVariable("observed", "f8", ("y", "x"))
+        observed.units = "days since 2020-01-01"
+        # Only the last row of the grid has a time of day
+        observed[:] = np.where(np.arange(30)[:, None] == 29, 1.5, 1.0) * np.ones((30, 30))
+    with xr.open_dataset(path) as ds:
+        expected = {
+            f"/{name}": ds[[name]].to_dataframe().to_csv().splitlines()[1:]
+            for name in ["val", "observed"]
+        }
+
+    zip_file = tmp_path / "hourly.zip"
+    # Times at midnight and not are in separate tiles
+    convert_to_csv(str(path), zip_file, memory_budget=4096, engine=engine)
+
+    with ZipFile(zip_file) as zip_ref:
+        for name in zip_ref.namelist():
+            if name.endswith(".csv"):
+                header, *rows = zip_ref.read(name).decode().splitlines()
+                assert rows == expected[header.split(",")[-1]]
+    assert expected["/val"][0] == "2020-01-01 00:00:00,0.0,0.0,1.0"
+    assert expected["/observed"][0] == "0.0,0.0,2020-01-02 00:00:00"
+
+
+def test_conversion_invalid_engine():
+    with pytest.raises(ValueError):
+        convert_to_csv("unused.nc", "unused.zip", engine="polars")
+
+
+def test_conversion_invalid_workers():
+    with pytest.raises(ValueError):
+        convert_to_csv("unused.nc", "unused.zip", workers=0)
+
+
+def _combined(data, dims, vvs):
+    ds = xr.combine_by_coords([data[vv].rename(vv) for vv in vvs])
+    return ds[list(dims) + list(ds.coords) + vvs]
+
+
+def test_schema_dataset_shared_indexes():
+    xr.set_options(use_new_combine_kwarg_defaults=True)
+    x = {"x": [0.0, 1.0, 2.0]}
+    data = xr.DataTree.from_dict(
+        {
+            "/": xr.Dataset(coords=x),
+            "/a": xr.Dataset({"u": ("x", [1, 2, 3]), "v": ("x", [4.0, 5.0, 6.0])}),
+            "/b": xr.Dataset({"w": ("x", [7, 8, 9])}, coords={"label": ("x", ["p", "q", "r"])}),
+        }
+    )
+    vvs = ["/a/u", "/a/v", "/b/w"]
+
+    assert schema_dataset(data, ("x",), vvs).identical(_combined(data, ("x",), vvs))
+
+
+def test_schema_dataset_falls_back_to_combine():
+    xr.set_options(use_new_combine_kwarg_defaults=True)
+    data = xr.DataTree.from_dict(
+        {
+            # Only one of the groups has an index along x
+            "/a": xr.Dataset({"u": ("x", [1, 2, 3])}, coords={"x": [10, 20, 30]}),
+            "/b": xr.Dataset({"u": ("x", [4, 5, 6])}),
+        }
+    )
+    vvs = ["/a/u", "/b/u"]
+
+    ds = schema_dataset(data, ("x",), vvs)
+    assert ds.identical(_combined(data, ("x",), vvs))
+    np.testing.assert_array_equal(ds["x"], [10, 20, 30])
+
+
+def test_conversion_profile(tmp_path):
+    fname = str(
+        data_for_tests_dir
+        / "unit-test-data"
+        / "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+    )
+    zip_file = tmp_path / "profiled.zip"
+    convert_to_csv(fname, zip_file, module_logger, profile=True)
+
+    with ZipFile(zip_file) as zf:
+        names = zf.namelist()
+        assert names[-3:] == [
+            "profile/casper.prof",
+            "profile/functions.txt",
+            "profile/allocations.txt",
+        ]
+        assert len([name for name in names if name.endswith(".csv")]) == 2
+        assert "write_schema_csv" in zf.read("profile/functions.txt").decode()
+        assert zf.read("profile/allocations.txt").startswith(b"Peak traced memory")
+        stats = marshal.loads(zf.read("profile/casper.prof"))
+        assert any(func[2] == "write_schema_csv" for func in stats)
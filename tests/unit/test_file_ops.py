@@ -1,6 +1,12 @@
 import logging
 
+import netCDF4 as nc
+import numpy as np
+
 from casper.file_ops import (
+    _is_file_empty,
+    _storage_chunks,
+    expand_input_paths,
     valid_input_file,
     valid_workable_file,
 )
@@ -27,3 +33,80 @@ def test_valid_input_file():
         / "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
     )
     assert valid_input_file(path_to_test_data_file)
+
+
+def test_expand_input_paths(tmp_path):
+    for name in ["a.nc", "b.nc4", "notes.txt", "day/c.h5", "day/d.nc"]:
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).touch()
+
+    assert expand_input_paths([str(tmp_path)]) == [
+        str(tmp_path / name) for name in ["a.nc", "b.nc4", "day/c.h5", "day/d.nc"]
+    ]
+    assert expand_input_paths(
+        [str(tmp_path / "day" / "d.nc"), str(tmp_path / "**" / "*.nc"), "missing.nc"]
+    ) == [str(tmp_path / "day" / "d.nc"), str(tmp_path / "a.nc"), "missing.nc"]
+    assert expand_input_paths([str(tmp_path / "*.hdf")]) == [str(tmp_path / "*.hdf")]
+
+
+def _write_granule(path, values, chunksizes=None):
+    """Write a small grouped granule with one data variable."""
+    with nc.Dataset(path, "w") as dataset:
+        dataset.createDimension("y", values.shape[0])
+        dataset.createDimension("x", values.shape[1])
+        group = dataset.createGroup("product")
+        var = group.createVariable(
+            "data", "f4", ("y", "x"), fill_value=-999.0, chunksizes=chunksizes
+        )
+        var[:] = values
+
+
+def test_is_file_empty_all_fill(tmp_path):
+    path = tmp_path / "empty.nc"
+    _write_granule(path, np.full((40, 30), -999.0, dtype=np.float32), chunksizes=(10, 10))
+
+    with nc.Dataset(path) as dataset:
+        assert _is_file_empty(dataset)
+
+
+def test_is_file_empty_nan(tmp_path):
+    path = tmp_path / "nan.nc"
+    _write_granule(path, np.full((4, 3), np.nan, dtype=np.float32))
+
+    with nc.Dataset(path) as dataset:
+        assert _is_file_empty(dataset)
+
+
+def test_is_file_empty_data_in_last_chunk(tmp_path):
+    path = tmp_path / "last_chunk.nc"
+    values = np.full((40, 30), -999.0, dtype=np.float32)
+    values[-1, -1] = 1.5
+    _write_granule(path, values, chunksizes=(10, 10))
+
+    with nc.Dataset(path) as dataset:
+        assert not _is_file_empty(dataset)
+
+
+def test_is_file_empty_stops_at_byte_limit(tmp_path):
+    path = tmp_path / "large.nc"
+    _write_granule(path, np.full((40, 30), -999.0, dtype=np.float32), chunksizes=(10, 10))
+
+    with nc.Dataset(path) as dataset:
+        # Reading stops before the data can be shown to be empty
+        assert not _is_file_empty(dataset, max_bytes=1000)
+
+
+def test_storage_chunks_cover_variable(tmp_path):
+    path = tmp_path / "chunks.nc"
+    values = np.arange(25 * 7, dtype=np.float32).reshape(25, 7)
+    _write_granule(path, values, chunksizes=(10, 4))
+
+    with nc.Dataset(path) as dataset:
+        var = dataset["product/data"]
+        slabs = list(_storage_chunks(var))
+        assert len(slabs) == 6
+        assert slabs[0] == (slice(0, 10), slice(0, 4))
+        covered = np.zeros(values.shape, dtype=int)
+        for slab in slabs:
+            covered[slab] += 1
+        assert (covered == 1).all()
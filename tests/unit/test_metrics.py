@@ -0,0 +1,72 @@
+import logging
+from zipfile import ZipFile
+
+import pytest
+
+from casper.convert_to_csv import convert_to_csv
+from casper.metrics import METRICS_LOG_KEY, ConversionMetrics
+
+from .. import data_for_tests_dir
+
+module_logger = logging.getLogger(__name__)
+
+test_file = str(
+    data_for_tests_dir / "unit-test-data" / "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+)
+
+
+def test_conversion_metrics_stage():
+    metrics = ConversionMetrics("granule.nc4")
+    with metrics.stage("schema:a.csv") as stage:
+        with stage.time("read"):
+            stage.bytes_read += 10
+        stage.rows = 3
+
+    summary = metrics.to_dict()
+    assert summary["granule"] == "granule.nc4"
+    assert summary["rows"] == 3
+    assert summary["bytes_read"] == 10
+    assert summary["process_peak_rss"] >= summary["rss"] > 0
+    (stage,) = summary["stages"]
+    assert stage["name"] == "schema:a.csv"
+    assert stage["read_seconds"] <= stage["seconds"]
+
+
+def test_conversion_metrics_log():
+    metrics = ConversionMetrics("granule.nc4")
+    with metrics.stage("open"):
+        pass
+
+    records = []
+    logger = logging.getLogger(f"{__name__}.log")
+    logger.setLevel(logging.INFO)
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    metrics.log(logger)
+    logger.removeHandler(handler)
+
+    (record,) = records
+    assert getattr(record, METRICS_LOG_KEY)["stages"][0]["name"] == "open"
+
+
+@pytest.mark.parametrize("engine, workers", [("pandas", 1), ("numpy", 1), ("pandas", 2)])
+def test_convert_to_csv_metrics(tmp_path, engine, workers):
+    metrics = ConversionMetrics("granule")
+    zip_file = tmp_path / "out.zip"
+    convert_to_csv(
+        test_file, zip_file, module_logger, engine=engine, workers=workers, metrics=metrics
+    )
+
+    stages = {stage.name: stage for stage in metrics.stages}
+    csv_stages = [stage for name, stage in stages.items() if name.startswith("schema:")]
+    assert {"open", "schema_discovery", "readme"} <= set(stages)
+    assert len(csv_stages) == 2
+
+    with ZipFile(zip_file) as zf:
+        for stage in csv_stages:
+            csv_text = zf.read(stage.name.removeprefix("schema:"))
+            assert stage.rows == csv_text.count(b"\n") - 1
+            assert stage.bytes_written == len(csv_text)
+            assert stage.bytes_read > 0
+            assert {"read", "format", "compress"} <= set(stage.timings)
@@ -0,0 +1,133 @@
+import os
+import shutil
+from zipfile import ZipFile
+
+import pytest
+
+from casper import cli
+from casper import convert_to_csv as conversion
+from casper.convert_to_csv import convert_to_csv
+from casper.output_cache import OutputCache, output_key
+from casper.session import GranuleSession
+
+from .. import data_for_tests_dir
+
+TEST_FILE = "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+
+
+@pytest.fixture
+def granule(tmp_path):
+    path = tmp_path / TEST_FILE
+    shutil.copyfile(data_for_tests_dir / "unit-test-data" / TEST_FILE, path)
+    return path
+
+
+def _members(zip_file):
+    with ZipFile(zip_file) as zf:
+        return {name: zf.read(name) for name in zf.namelist() if name.endswith(".csv")}
+
+
+def test_output_key(granule, tmp_path):
+    key = output_key(granule, engine="numpy", float_precision=None)
+
+    assert output_key(granule, float_precision=None, engine="numpy") == key
+    assert output_key(granule, engine="pandas", float_precision=None) != key
+
+    renamed = tmp_path / "renamed.nc4"
+    shutil.copyfile(granule, renamed)
+    assert output_key(renamed, engine="numpy", float_precision=None) != key
+
+    with open(granule, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 1]))
+    assert output_key(granule, engine="numpy", float_precision=None) != key
+
+
+def test_output_cache_evicts_least_recently_used(tmp_path):
+    (tmp_path / "a.zip").write_bytes(b"a" * 10)
+    cache = OutputCache(tmp_path / "cache", max_bytes=15)
+    cache.put("old", tmp_path / "a.zip")
+    os.utime(cache.get("old"), (0, 0))
+    cache.put("new", tmp_path / "a.zip")
+
+    assert cache.get("old") is None
+    assert cache.get("new").read_bytes() == b"a" * 10
+
+
+def test_output_cache_evicts_abandoned_checkpoints(tmp_path):
+    (tmp_path / "a.zip").write_bytes(b"a" * 10)
+    cache = OutputCache(tmp_path / "cache", max_bytes=25)
+    abandoned = cache.checkpoints("abandoned")
+    partial = abandoned.partial_path("a.csv")
+    partial.write_bytes(b"a" * 10)
+    os.utime(partial, (0, 0))
+    os.utime(abandoned.directory, (0, 0))
+    cache.put("old", tmp_path / "a.zip")
+    # Checkpoints of a key are replaced by its zip file
+    cache.checkpoints("new").partial_path("a.csv").write_bytes(b"a" * 10)
+    cache.put("new", tmp_path / "a.zip")
+
+    assert not abandoned.directory.exists()
+    assert not (cache.directory / "checkpoints" / "new").exists()
+    assert cache.get("old") is not None and cache.get("new") is not None
+
+
+def test_run_casper_serves_cached_zip_file(granule, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "cache"
+    zip_file = cli.run_casper(str(granule), engine="numpy", output_cache_dir=str(cache_dir))
+    expected = _members(zip_file)
+    os.remove(zip_file)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Cached conversion converted again")
+
+    monkeypatch.setattr(conversion, "convert_to_csv", fail)
+    assert cli.run_casper(str(granule), engine="numpy", output_cache_dir=str(cache_dir))
+    assert _members(zip_file) == expected
+    # Checkpoints are removed once a conversion is complete
+    assert not any((cache_dir / "checkpoints").iterdir())
+
+    # Other options are a different conversion
+    with pytest.raises(AssertionError):
+        cli.run_casper(str(granule), engine="pandas", output_cache_dir=str(cache_dir))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_interrupted_conversion_resumes(granule, tmp_path, monkeypatch, workers):
+    with GranuleSession(str(granule)) as session:
+        convert_to_csv(session, tmp_path / "expected.zip", engine="numpy")
+    expected = _members(tmp_path / "expected.zip")
+
+    checkpoints = OutputCache(tmp_path / "cache").checkpoints("key")
+    write_schema_csv = conversion.write_schema_csv
+    written = []
+
+    def interrupt_second_schema(*args, **kwargs):
+        written.append(args[1])
+        if len(written) == 2:
+            raise KeyboardInterrupt
+        return write_schema_csv(*args, **kwargs)
+
+    monkeypatch.setattr(conversion, "write_schema_csv", interrupt_second_schema)
+    with pytest.raises(KeyboardInterrupt), GranuleSession(str(granule)) as session:
+        convert_to_csv(session, tmp_path / "out.zip", engine="numpy", checkpoints=checkpoints)
+    # Only the first schema was finished
+    assert [name for name in expected if checkpoints.get(name)] == list(expected)[:1]
+
+    written.clear()
+    with GranuleSession(str(granule)) as session:
+        convert_to_csv(
+            session,
+            tmp_path / "out.zip",
+            engine="numpy",
+            workers=workers,
+            checkpoints=checkpoints,
+        )
+
+    assert _members(tmp_path / "out.zip") == expected
+    # Only the interrupted schema was converted again, in this process or a worker
+    assert len(written) == (1 if workers == 1 else 0)
+    assert not checkpoints.directory.exists()
@@ -0,0 +1,97 @@
+import logging
+import os
+from zipfile import ZipFile
+
+import netCDF4 as nc
+import numpy as np
+
+from casper.convert_to_csv import convert_to_csv
+from casper.schema_cache import SchemaPlan, SchemaPlanCache, structure_fingerprint
+from casper.session import GranuleSession
+
+from .. import data_for_tests_dir
+
+module_logger = logging.getLogger(__name__)
+
+test_file = str(
+    data_for_tests_dir / "unit-test-data" / "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+)
+
+
+def _write_granule(path, size, dtype="f4"):
+    with nc.Dataset(path, "w") as dataset:
+        dataset.createDimension("x", size)
+        dataset.createVariable("x", "f8", ("x",))[:] = np.arange(size)
+        dataset.createGroup("product").createVariable("value", dtype, ("x",))[:] = np.ones(size)
+
+
+def test_fingerprint_ignores_dimension_lengths(tmp_path):
+    _write_granule(tmp_path / "a.nc4", 3)
+    _write_granule(tmp_path / "b.nc4", 7)
+    _write_granule(tmp_path / "c.nc4", 3, dtype="i4")
+
+    fingerprints = []
+    for name in ["a.nc4", "b.nc4", "c.nc4"]:
+        with nc.Dataset(tmp_path / name) as dataset:
+            fingerprints.append(structure_fingerprint(dataset))
+
+    assert fingerprints[0] == fingerprints[1]
+    assert fingerprints[0] != fingerprints[2]
+
+
+def test_schema_plan_cache_round_trip(tmp_path):
+    cache = SchemaPlanCache(tmp_path / "plans")
+    plan = [SchemaPlan(("x",), ["/product/value"], ["x", "x", "/product/value"])]
+
+    assert cache.get("abc") is None
+    cache.put("abc", plan)
+    assert cache.get("abc") == plan
+
+
+def test_schema_plan_cache_evicts_least_recently_used(tmp_path):
+    cache = SchemaPlanCache(tmp_path)
+    plan = [SchemaPlan(("x",), ["/value"], ["x", "/value"])]
+    cache.put("old", plan)
+    cache.put("used", plan)
+    os.utime(tmp_path / "old.json", (0, 0))
+    os.utime(tmp_path / "used.json", (0, 1))
+    assert cache.get("used") == plan
+
+    # Room for two plans only
+    cache.max_bytes = 2 * (tmp_path / "used.json").stat().st_size
+    cache.put("new", plan)
+
+    assert cache.get("old") is None
+    assert cache.get("used") == plan
+    assert cache.get("new") == plan
+
+
+def test_convert_with_schema_cache_hit(monkeypatch, tmp_path):
+    cache = SchemaPlanCache(tmp_path / "plans")
+
+    assert convert_to_csv(test_file, tmp_path / "miss.zip", module_logger, schema_cache=cache) == 2
+    assert len(list((tmp_path / "plans").glob("*.json"))) == 1
+
+    # A cache hit never runs schema discovery
+    def discover(self):
+        raise AssertionError("Schema discovery ran on a cache hit")
+
+    monkeypatch.setattr(GranuleSession, "schemas", discover)
+    assert convert_to_csv(test_file, tmp_path / "hit.zip", module_logger, schema_cache=cache) == 2
+
+    with ZipFile(tmp_path / "miss.zip") as miss, ZipFile(tmp_path / "hit.zip") as hit:
+        assert miss.namelist() == hit.namelist()
+        for name in miss.namelist():
+            assert miss.read(name) == hit.read(name)
+
+
+def test_convert_requested_variables_bypasses_cache(tmp_path):
+    cache = SchemaPlanCache(tmp_path / "plans")
+    assert convert_to_csv(test_file, tmp_path / "full.zip", module_logger, schema_cache=cache) == 2
+
+    # Requested variables are discovered rather than read from the full plan
+    num_files = convert_to_csv(
+        test_file, tmp_path / "some.zip", module_logger, schema_cache=cache, variables=["weight"]
+    )
+    assert num_files == 1
+    assert len(list((tmp_path / "plans").glob("*.json"))) == 1
@@ -0,0 +1,192 @@
+import shutil
+from datetime import UTC, datetime
+from zipfile import ZipFile
+
+import pytest
+from harmony_service_lib.message import Message, Subset, Temporal, Variable
+from harmony_service_lib.util import config
+from pystac import Asset, Catalog, Item
+
+from casper.harmony import service_adapter
+from casper.harmony.service_adapter import CasperAdapter
+from casper.metrics import METRICS_PROPERTY
+
+from .. import data_for_tests_dir
+
+TEST_FILE = "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+
+
+def _message(staging_dir, mime="text/csv"):
+    return Message(
+        {
+            "sources": [{"collection": "C1234-TEST", "shortName": "TEMPO_HCHO_L3"}],
+            "format": {"mime": mime},
+            "stagingLocation": staging_dir.as_uri() + "/",
+            "accessToken": "fake-token",
+            "user": "casper-test",
+            "requestId": "00000000-0000-0000-0000-000000000000",
+        }
+    )
+
+
+def _catalog(granules):
+    catalog = Catalog("input", "Input catalog")
+    for idx, granule in enumerate(granules):
+        item = Item(
+            f"item-{idx}",
+            None,
+            None,
+            datetime(2025, 9, 12, 21 + idx, tzinfo=UTC),
+            {},
+        )
+        item.add_asset(
+            "data",
+            Asset(granule.as_uri(), media_type="application/x-netcdf4", roles=["data"]),
+        )
+        catalog.add_item(item)
+    return catalog
+
+
+@pytest.fixture
+def granules(tmp_path):
+    paths = []
+    for idx in range(3):
+        granule_dir = tmp_path / "input" / str(idx)
+        granule_dir.mkdir(parents=True)
+        paths.append(granule_dir / TEST_FILE.replace("S012", f"S01{idx}"))
+        shutil.copyfile(data_for_tests_dir / "unit-test-data" / TEST_FILE, paths[-1])
+    return paths
+
+
+@pytest.mark.parametrize(
+    "download_workers, streaming_stage", [("1", "false"), ("2", "false"), ("2", "true")]
+)
+def test_process_file_converts_every_item(
+    tmp_path, granules, monkeypatch, download_workers, streaming_stage
+):
+    monkeypatch.setenv("CASPER_DOWNLOAD_WORKERS", download_workers)
+    monkeypatch.setenv("CASPER_STREAMING_STAGE", streaming_stage)
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+
+    adapter = CasperAdapter(
+        _message(staging_dir), catalog=_catalog(granules), config=config(validate=False)
+    )
+    result = adapter.process_file(adapter.catalog)
+
+    output_items = list(result.get_items())
+    assert len(output_items) == len(granules)
+    for idx, (granule, item) in enumerate(zip(granules, output_items, strict=True)):
+        assert item.properties["start_datetime"] == f"2025-09-12T{21 + idx}:00:00+00:00"
+        asset = item.assets["data"]
+        assert asset.media_type == "application/zip"
+        assert asset.title == f"{granule.stem}_reformatted.zip"
+        with ZipFile(staging_dir / asset.title) as zip_ref:
+            assert len([name for name in zip_ref.namelist() if name.endswith(".csv")]) == 2
+
+
+def test_process_file_empty_catalog(tmp_path):
+    adapter = CasperAdapter(
+        _message(tmp_path), catalog=Catalog("input", "Empty"), config=config(validate=False)
+    )
+    result = adapter.process_file(adapter.catalog)
+    assert list(result.get_items()) == []
+
+
+def test_process_file_metrics_in_catalog(tmp_path, granules, monkeypatch):
+    monkeypatch.setenv("CASPER_METRICS_IN_CATALOG", "true")
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+
+    adapter = CasperAdapter(
+        _message(staging_dir), catalog=_catalog(granules[:1]), config=config(validate=False)
+    )
+    result = adapter.process_file(adapter.catalog)
+
+    (item,) = result.get_items()
+    metrics = item.properties[METRICS_PROPERTY]
+    assert metrics["granule"] == granules[0].name
+    stages = [stage["name"] for stage in metrics["stages"]]
+    assert stages[:3] == ["download", "open", "schema_discovery"]
+    assert stages[-2:] == ["readme", "staging"]
+    assert metrics["rows"] > 0
+
+
+def test_process_file_parquet_mime(tmp_path, granules):
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+
+    adapter = CasperAdapter(
+        _message(staging_dir, "application/x-parquet"),
+        catalog=_catalog(granules[:1]),
+        config=config(validate=False),
+    )
+    assert adapter.output_format == "parquet"
+    result = adapter.process_file(adapter.catalog)
+
+    (item,) = result.get_items()
+    with ZipFile(staging_dir / item.assets["data"].title) as zip_ref:
+        names = zip_ref.namelist()
+    assert len([name for name in names if name.endswith(".parquet")]) == 2
+    assert not [name for name in names if name.endswith(".csv")]
+
+
+def test_process_file_subset(tmp_path, granules):
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+    message = _message(staging_dir)
+    message.subset = Subset({"bbox": [-86.5, 41.3, -86.0, 41.5]})
+    message.temporal = Temporal({"start": "2025-09-12T00:00:00Z", "end": "2025-09-12T23:59:59Z"})
+
+    adapter = CasperAdapter(message, catalog=_catalog(granules[:1]), config=config(validate=False))
+    result = adapter.process_file(adapter.catalog)
+
+    (item,) = result.get_items()
+    with ZipFile(staging_dir / item.assets["data"].title) as zip_ref:
+        for name in zip_ref.namelist():
+            if name.endswith(".csv"):
+                rows = zip_ref.read(name).decode().splitlines()
+                assert 1 < len(rows) < 2997
+
+
+def test_process_file_requested_variables(tmp_path, granules):
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+    message = _message(staging_dir)
+    message.sources[0].variables = [
+        Variable({"id": "V1-TEST", "name": "weight", "fullPath": "weight"})
+    ]
+
+    adapter = CasperAdapter(message, catalog=_catalog(granules[:1]), config=config(validate=False))
+    assert adapter.variables == ["weight"]
+    result = adapter.process_file(adapter.catalog)
+
+    (item,) = result.get_items()
+    with ZipFile(staging_dir / item.assets["data"].title) as zip_ref:
+        (csv_file,) = [name for name in zip_ref.namelist() if name.endswith(".csv")]
+        assert zip_ref.read(csv_file).decode().startswith("latitude,longitude,/weight\n")
+
+
+def test_process_file_output_cache(tmp_path, granules, monkeypatch):
+    monkeypatch.setenv("CASPER_OUTPUT_CACHE_DIR", str(tmp_path / "cache"))
+    # Cached conversions are written locally, even when streaming is enabled
+    monkeypatch.setenv("CASPER_STREAMING_STAGE", "true")
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+
+    def process(granule):
+        adapter = CasperAdapter(
+            _message(staging_dir), catalog=_catalog([granule]), config=config(validate=False)
+        )
+        (item,) = adapter.process_file(adapter.catalog).get_items()
+        with ZipFile(staging_dir / item.assets["data"].title) as zip_ref:
+            return {name: zip_ref.read(name) for name in zip_ref.namelist()}
+
+    expected = process(granules[0])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Cached conversion converted again")
+
+    monkeypatch.setattr(service_adapter, "convert_to_csv", fail)
+    shutil.copyfile(granules[0], granules[1].parent / granules[0].name)
+    assert process(granules[1].parent / granules[0].name) == expected
@@ -0,0 +1,112 @@
+import json
+import logging
+import sys
+from types import SimpleNamespace
+from zipfile import ZipFile
+
+import pytest
+import xarray as xr
+
+from casper.convert_to_csv import convert_to_csv
+from casper.file_ops import valid_workable_file
+from casper.session import GranuleSession
+
+from .. import data_for_tests_dir
+
+module_logger = logging.getLogger(__name__)
+
+test_file = str(
+    data_for_tests_dir / "unit-test-data" / "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+)
+
+
+def test_session_metadata():
+    with open(data_for_tests_dir / "unit-test-data" / "Readme.json") as f:
+        readme = json.load(f)
+
+    with GranuleSession(test_file) as session:
+        schemas = session.schemas()
+        assert list(schemas.values()) == [
+            readme[op_file]["variables"] for op_file in readme if op_file.endswith(".csv")
+        ]
+        assert list(schemas) == [("latitude", "longitude"), ("time", "latitude", "longitude")]
+
+        assert session.variables["/latitude"].is_coordinate
+        assert not session.variables["/weight"].is_coordinate
+        assert session.variables["/weight"].dims == ("latitude", "longitude")
+
+        attrs = {k: str(v) for k, v in session.attributes["/"].items()}
+        assert readme[f"{session.name} Global Attributes:"] == dict(sorted(attrs.items()))
+        assert session.tree["/product"].attrs == session.attributes["/product"]
+
+        assert valid_workable_file(session)
+        assert not session.is_empty()
+
+    assert not session.dataset.isopen()
+
+
+def test_session_opens_file_once(monkeypatch, tmp_path):
+    with GranuleSession(test_file, module_logger) as session:
+        # Any other attempt to open the granule fails
+        def reopen(*args, **kwargs):
+            raise AssertionError("Granule opened again")
+
+        monkeypatch.setattr(xr.backends.NetCDF4DataStore, "open", reopen)
+        with monkeypatch.context() as m:
+            # file_ops imports netCDF4 when it is called
+            m.setitem(sys.modules, "netCDF4", SimpleNamespace(Dataset=reopen))
+            assert valid_workable_file(session, module_logger)
+        num_files = convert_to_csv(session, tmp_path / "out.zip", module_logger)
+        # Converting with a session leaves it open for the caller
+        assert session.dataset.isopen()
+
+    assert num_files == 2
+    with ZipFile(tmp_path / "out.zip") as zf:
+        assert "Readme.json" in zf.namelist()
+
+
+def test_session_invalid_file(tmp_path):
+    not_netcdf = tmp_path / "granule.nc4"
+    not_netcdf.write_text("not a netCDF file")
+
+    with pytest.raises(OSError):
+        GranuleSession(not_netcdf)
+
+
+def test_session_requested_variables(monkeypatch):
+    warnings = []
+    logger = logging.getLogger(f"{__name__}.requested")
+    monkeypatch.setattr(logger, "warning", warnings.append)
+
+    requested = ["product/vertical_column", "/weight", "/product/missing"]
+    with GranuleSession(test_file, logger, variables=requested) as session:
+        assert session.schemas() == {
+            ("latitude", "longitude"): ["/weight"],
+            ("time", "latitude", "longitude"): ["/product/vertical_column"],
+        }
+        # Unrequested variables are never decoded
+        assert "vertical_column_uncertainty" not in session.tree["/product"].variables
+        assert "/support_data/amf" not in session.variables
+        assert {"/latitude", "/longitude", "/time"} <= set(session.variables)
+
+    assert warnings == ["Requested variable /product/missing is not a data variable"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_conversion_requested_variables(tmp_path, workers):
+    variables = ["/product/vertical_column", "/support_data/amf"]
+    convert_to_csv(test_file, tmp_path / "out.zip", workers=workers, variables=variables)
+
+    test_data_dir = data_for_tests_dir / "unit-test-data"
+    with ZipFile(tmp_path / "out.zip") as zf:
+        csv_files = [name for name in zf.namelist() if name.endswith(".csv")]
+        assert len(csv_files) == 1
+        rows = zf.read(csv_files[0]).decode().splitlines()
+        readme = json.loads(zf.read("Readme.json"))
+
+    # Same values as the full conversion's schema, restricted to the requested columns
+    full = (test_data_dir / csv_files[0].replace("-0_", "-1_")).read_text().splitlines()
+    header = full[0].split(",")
+    keep = [header.index(column) for column in ["time", "latitude", "longitude", *variables]]
+    assert rows == [",".join(row.split(",")[idx] for idx in keep) for row in full]
+    assert readme[csv_files[0]]["variables"] == variables
@@ -0,0 +1,141 @@
+import io
+import logging
+import threading
+import zipfile
+
+import pytest
+from harmony_service_lib.util import config
+
+from casper.harmony.staging import MIN_PART_SIZE, S3MultipartUpload, stage_stream
+from casper.zip_writer import ZipWriter
+
+module_logger = logging.getLogger(__name__)
+
+
+class LocalS3:
+    """In-memory stand-in for the boto3 S3 multipart upload API."""
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.uploads: dict[str, dict] = {}
+        self.aborted: list[str] = []
+        self._lock = threading.Lock()
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {"key": (Bucket, Key), "parts": {}, "mime": ContentType}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.uploads[UploadId]["parts"][PartNumber] = Body
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload = self.uploads.pop(UploadId)
+        parts = MultipartUpload["Parts"]
+        assert [part["PartNumber"] for part in parts] == list(range(1, len(parts) + 1))
+        assert sorted(upload["parts"]) == [part["PartNumber"] for part in parts]
+        self.objects[(Bucket, Key)] = b"".join(
+            upload["parts"][part["PartNumber"]] for part in parts
+        )
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+        self.aborted.append(UploadId)
+
+
+def test_multipart_upload_parts():
+    client = LocalS3()
+    data = bytes(range(256)) * (MIN_PART_SIZE // 256 * 3 + 100)
+
+    upload = S3MultipartUpload(client, "bucket", "out.zip", "application/zip", MIN_PART_SIZE, 2)
+    for start in range(0, len(data), 999_983):
+        upload.write(data[start : start + 999_983])
+    upload.close()
+
+    assert len(upload.parts) == 4
+    assert client.objects[("bucket", "out.zip")] == data
+    assert client.uploads == {}
+
+
+def test_multipart_upload_empty_object():
+    client = LocalS3()
+    S3MultipartUpload(client, "bucket", "empty", "text/plain", MIN_PART_SIZE).close()
+    assert client.objects[("bucket", "empty")] == b""
+
+
+def test_multipart_upload_part_size():
+    with pytest.raises(ValueError):
+        S3MultipartUpload(LocalS3(), "bucket", "key", "text/plain", part_size=1024)
+
+
+def test_stage_stream_s3_zip():
+    client = LocalS3()
+    csv_text = b"".join(f"{i},{i / 7}\n".encode() for i in range(500_000))
+
+    with (
+        stage_stream(
+            "out.zip",
+            "application/zip",
+            "s3://bucket/public/job/",
+            config(validate=False),
+            module_logger,
+            part_size=MIN_PART_SIZE,
+            client=client,
+        ) as (stream, url),
+        ZipWriter(stream, compression_threads=2) as zf,
+    ):
+        zf.writestr("data.csv", csv_text)
+
+    assert url == "s3://bucket/public/job/out.zip"
+    staged = client.objects[("bucket", "public/job/out.zip")]
+    with zipfile.ZipFile(io.BytesIO(staged)) as zip_ref:
+        assert zip_ref.read("data.csv") == csv_text
+
+
+def test_stage_stream_aborts_on_error():
+    client = LocalS3()
+    with (
+        pytest.raises(RuntimeError),
+        stage_stream(
+            "out.zip",
+            "application/zip",
+            "s3://bucket/job/",
+            config(validate=False),
+            module_logger,
+            client=client,
+        ) as (stream, _),
+    ):
+        stream.write(b"partial")
+        raise RuntimeError("conversion failed")
+
+    assert client.aborted == ["upload-0"]
+    assert client.objects == {}
+
+
+def test_stage_stream_local(tmp_path):
+    with stage_stream(
+        "out.zip", "application/zip", tmp_path.as_uri() + "/", config(validate=False), module_logger
+    ) as (stream, url):
+        stream.write(b"zip bytes")
+
+    assert url == (tmp_path / "out.zip").as_uri()
+    assert (tmp_path / "out.zip").read_bytes() == b"zip bytes"
+
+
+def test_stage_stream_local_removes_file_on_error(tmp_path):
+    with (
+        pytest.raises(RuntimeError),
+        stage_stream(
+            "out.zip",
+            "application/zip",
+            tmp_path.as_uri() + "/",
+            config(validate=False),
+            module_logger,
+        ) as (stream, _),
+    ):
+        stream.write(b"partial")
+        raise RuntimeError("conversion failed")
+
+    assert not (tmp_path / "out.zip").exists()
@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Modules only the conversion itself needs
+HEAVY_MODULES = ("numpy", "pandas", "xarray", "netCDF4", "pyarrow")
+# Generous wall time budgets for a cold import, in seconds; importing the
+# scientific stack takes several times longer. Wall times vary too much on
+# shared runners, so they are only checked when CASPER_IMPORT_BUDGETS is set.
+IMPORT_BUDGETS = {"casper.cli": 1.0, "casper.harmony.cli": 2.5}
+
+_MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+{code}
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def _measure(module, code=""):
+    result = subprocess.run(
+        [sys.executable, "-c", _MEASURE.format(module=module, code=code, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", IMPORT_BUDGETS)
+def test_entry_point_skips_heavy_imports(module):
+    assert _measure(module)["heavy"] == []
+
+
+@pytest.mark.skipif(
+    not os.environ.get("CASPER_IMPORT_BUDGETS"), reason="CASPER_IMPORT_BUDGETS is not set"
+)
+@pytest.mark.parametrize("module", IMPORT_BUDGETS)
+def test_entry_point_import_budget(module):
+    assert _measure(module)["elapsed"] < IMPORT_BUDGETS[module]
+
+
+def test_invalid_input_file_skips_heavy_imports(tmp_path):
+    code = f"""
+sys.argv = ["casper", {str(tmp_path / "granule.txt")!r}]
+try:
+    casper.cli.main()
+except SystemExit:
+    pass
+"""
+    (tmp_path / "granule.txt").write_text("not netCDF")
+    assert _measure("casper.cli", code)["heavy"] == []
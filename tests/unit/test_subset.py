@@ -0,0 +1,113 @@
+from zipfile import ZipFile
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from harmony_service_lib.message import Message
+
+from casper.convert_to_csv import convert_to_csv
+from casper.metrics import ConversionMetrics
+from casper.subset import Subset, index_selection
+
+from .. import data_for_tests_dir
+
+TEST_DIR = data_for_tests_dir / "unit-test-data"
+TEST_FILE = "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+
+
+def _tree(lon):
+    return xr.DataTree.from_dict(
+        {
+            "/": xr.Dataset(
+                coords={
+                    "lat": ("lat", np.arange(-80.0, 90.0, 20.0), {"units": "degrees_north"}),
+                    "lon": ("lon", lon),
+                    "time": pd.date_range("2025-01-01", periods=4, freq="D"),
+                    "level": [1, 2, 3],
+                }
+            ),
+            "/data": xr.Dataset({"v": (("lat", "lon"), np.zeros((9, len(lon))))}),
+        }
+    )
+
+
+def test_index_selection():
+    data = _tree(np.arange(-180.0, 180.0, 45.0))
+    subset = Subset.create([-50, -30, 50, 30], "2025-01-02T00:00:00Z", "2025-01-03")
+
+    selection = index_selection(data, subset)
+    assert selection == {
+        "lat": slice(3, 6),
+        "lon": slice(3, 6),
+        "time": slice(1, 3),
+    }
+
+
+def test_index_selection_antimeridian_and_0_360():
+    subset = Subset.create([170, -90, -170, 90])
+
+    selection = index_selection(_tree(np.arange(-180.0, 180.0, 10.0)), subset)
+    np.testing.assert_array_equal(selection["lon"], [0, 1, 35])
+    assert selection["lat"] == slice(0, 9)
+
+    selection = index_selection(_tree(np.arange(0.0, 360.0, 10.0)), subset)
+    assert selection["lon"] == slice(17, 20)
+
+
+def test_index_selection_empty():
+    selection = index_selection(_tree(np.arange(0.0, 90.0, 10.0)), Subset.create(end="2000-01-01"))
+    assert selection == {"time": slice(0, 0)}
+
+
+def test_subset_from_message():
+    message = Message(
+        {
+            "subset": {"bbox": [-87, 41.3, -86, 41.5]},
+            "temporal": {"start": "2025-09-12T00:00:00Z", "end": "2025-09-13T00:00:00Z"},
+        }
+    )
+    assert Subset.from_message(message) == Subset(
+        (-87.0, 41.3, -86.0, 41.5),
+        pd.Timestamp("2025-09-12"),
+        pd.Timestamp("2025-09-13"),
+    )
+    assert Subset.from_message(Message({"format": {"mime": "text/csv"}})) is None
+
+
+@pytest.mark.parametrize("bbox", [[0, 0, 1], [0, 10, 1, 0]])
+def test_subset_invalid_bbox(bbox):
+    with pytest.raises(ValueError):
+        Subset.create(bbox)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_conversion_reads_only_the_subset(tmp_path, workers):
+    bbox = (-86.5, 41.3, -86.0, 41.5)
+    outputs, bytes_read = {}, {}
+    for name, subset in [("full", None), ("subset", Subset.create(bbox))]:
+        metrics = ConversionMetrics(TEST_FILE)
+        zip_file = tmp_path / f"{name}.zip"
+        convert_to_csv(
+            str(TEST_DIR / TEST_FILE), zip_file, workers=workers, metrics=metrics, subset=subset
+        )
+        bytes_read[name] = metrics.to_dict()["bytes_read"]
+        with ZipFile(zip_file) as zip_ref:
+            outputs[name] = {
+                name: zip_ref.read(name).decode().splitlines()
+                for name in zip_ref.namelist()
+                if name.endswith(".csv")
+            }
+
+    assert bytes_read["subset"] < bytes_read["full"] / 4
+    for csv_name, full in outputs["full"].items():
+        header = full[0].split(",")
+        lat, lon = header.index("latitude"), header.index("longitude")
+        expected = [full[0]] + [
+            row
+            for row in full[1:]
+            if bbox[1] <= float(row.split(",")[lat]) <= bbox[3]
+            and bbox[0] <= float(row.split(",")[lon]) <= bbox[2]
+        ]
+        assert 1 < len(expected) < len(full)
+        assert outputs["subset"][csv_name] == expected
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from casper.tiling import (
+    FORMATTING_OVERHEAD,
+    count_tiles,
+    estimate_csv_row_bytes,
+    estimate_row_bytes,
+    iter_tiles,
+    parse_byte_size,
+    plan_shards,
+    split_dimension,
+)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("1024", 1024),
+        ("512K", 512 * 1024),
+        ("64M", 64 * 1024**2),
+        ("1.5GiB", int(1.5 * 1024**3)),
+        ("2gb", 2 * 1024**3),
+        (4096, 4096),
+    ],
+)
+def test_parse_byte_size(value, expected):
+    assert parse_byte_size(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "lots", "12X", "0", -1])
+def test_parse_byte_size_invalid(value):
+    with pytest.raises(ValueError):
+        parse_byte_size(value)
+
+
+def test_estimate_row_bytes():
+    ds = xr.Dataset(
+        {"a": (("x", "y"), np.zeros((2, 3), dtype=np.float32))},
+        coords={"x": np.arange(2, dtype=np.int64), "y": np.arange(3, dtype=np.float64)},
+    )
+    assert estimate_row_bytes(ds) == (4 + 8 + 8 + 2 * 8) * FORMATTING_OVERHEAD
+
+
+def test_single_tile_when_schema_fits():
+    assert list(iter_tiles({"x": 10, "y": 20}, 1, 200)) == [{}]
+    assert count_tiles({"x": 10, "y": 20}, 1, 200) == 1
+
+
+def test_tiles_slice_leading_dimension():
+    tiles = list(iter_tiles({"x": 10, "y": 20}, 1, 60))
+    assert tiles == [
+        {"x": slice(0, 3)},
+        {"x": slice(3, 6)},
+        {"x": slice(6, 9)},
+        {"x": slice(9, 12)},
+    ]
+    assert count_tiles({"x": 10, "y": 20}, 1, 60) == len(tiles)
+
+
+def test_tiles_slice_inner_dimension():
+    sizes = {"t": 2, "x": 3, "y": 100}
+    tiles = list(iter_tiles(sizes, 1, 40))
+    assert tiles[:4] == [
+        {"t": slice(0, 1), "x": slice(0, 1), "y": slice(0, 40)},
+        {"t": slice(0, 1), "x": slice(0, 1), "y": slice(40, 80)},
+        {"t": slice(0, 1), "x": slice(0, 1), "y": slice(80, 120)},
+        {"t": slice(0, 1), "x": slice(1, 2), "y": slice(0, 40)},
+    ]
+    assert len(tiles) == count_tiles(sizes, 1, 40) == 18
+
+
+def test_tiles_cover_schema_in_order():
+    sizes = {"t": 3, "x": 7, "y": 5}
+    data = np.arange(3 * 7 * 5).reshape(3, 7, 5)
+    ds = xr.Dataset({"v": (("t", "x", "y"), data)})
+    for budget in [1, 4, 12, 40, 1000]:
+        values = np.concatenate(
+            [ds.isel(indexer)["v"].values.ravel() for indexer in iter_tiles(sizes, 1, budget)]
+        )
+        np.testing.assert_array_equal(values, data.ravel())
+
+
+def test_plan_shards():
+    ds = xr.Dataset(
+        {"a": (("x", "y"), np.zeros((10, 20), dtype=np.float32))},
+        coords={"x": np.arange(10), "y": np.arange(20.0)},
+    )
+    # Three columns of at most 20, 24 and 24 characters, each with a separator
+    assert estimate_csv_row_bytes(ds) == 21 + 25 + 25
+
+    assert plan_shards(ds) == [{}]
+    assert plan_shards(ds, max_rows=200) == [{}]
+    assert plan_shards(ds, max_rows=60) == [{"x": slice(i, i + 3)} for i in range(0, 10, 3)]
+    assert plan_shards(ds, max_rows=10) == [
+        {"x": slice(x, x + 1), "y": slice(y, y + 10)} for x in range(10) for y in (0, 10)
+    ]
+    assert plan_shards(ds, max_bytes=100 * 71) == [{"x": slice(0, 5)}, {"x": slice(5, 10)}]
+    assert plan_shards(ds, max_rows=100, max_bytes=50 * 71) == plan_shards(ds, max_rows=50)
+
+
+def test_tiles_align_to_chunks():
+    sizes = {"x": 10, "y": 20}
+    # 3 rows of x fit the budget, rounded down to whole chunks of 2
+    assert list(iter_tiles(sizes, 1, 60, {"x": 2})) == [
+        {"x": slice(i, i + 2)} for i in range(0, 10, 2)
+    ]
+    assert count_tiles(sizes, 1, 60, {"x": 2}) == 5
+    assert split_dimension(sizes, 1, 60, {"x": 2}) == ("x", 2)
+    # Chunks longer than a tile leave the slab length alone
+    assert split_dimension(sizes, 1, 60, {"x": 4}) == ("x", 3)
+    assert split_dimension(sizes, 1, 200, {"x": 4}) == (None, 0)
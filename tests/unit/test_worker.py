@@ -0,0 +1,113 @@
+import io
+import json
+import shutil
+import sys
+from datetime import UTC, datetime
+
+import pytest
+from harmony_service_lib.util import config
+from pystac import Asset, Catalog, CatalogType, Item
+
+from casper.harmony import cli
+from casper.harmony.worker import WorkItem
+
+from .. import data_for_tests_dir
+
+TEST_FILE = "TEMPO_HCHO_L3_V04_20250912T210435Z_S012_subsetted.nc4"
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    """Two work items' inputs, in the layout Harmony hands them to a service."""
+    # Lets harmony-service-lib read the STAC catalogs without AWS settings
+    monkeypatch.setenv("ENV", "test")
+    (tmp_path / "staging").mkdir()
+    for idx in range(2):
+        granule = tmp_path / "granules" / str(idx) / TEST_FILE.replace("S012", f"S01{idx}")
+        granule.parent.mkdir(parents=True)
+        shutil.copyfile(data_for_tests_dir / "unit-test-data" / TEST_FILE, granule)
+
+        catalog = Catalog("input", "Input catalog")
+        item = Item(f"item-{idx}", None, None, datetime(2025, 9, 12, 21, tzinfo=UTC), {})
+        item.add_asset("data", Asset(granule.as_uri(), roles=["data"]))
+        catalog.add_item(item)
+        catalog.normalize_and_save(str(tmp_path / "inputs" / str(idx)), CatalogType.SELF_CONTAINED)
+    return tmp_path
+
+
+def _work_item(work_dir, idx, **fields):
+    message = {
+        "sources": [{"collection": "C1234-TEST", "shortName": "TEMPO_HCHO_L3"}],
+        "format": {"mime": "text/csv"},
+        "stagingLocation": (work_dir / "staging").as_uri() + "/",
+        "user": "casper-test",
+        "requestId": f"00000000-0000-0000-0000-00000000000{idx}",
+    }
+    return json.dumps(
+        {
+            "input": message,
+            "sources": str(work_dir / "inputs" / str(idx) / "catalog.json"),
+            "metadata_dir": str(work_dir / "outputs" / str(idx)),
+            **fields,
+        }
+    )
+
+
+def test_worker_invokes_every_item(work_dir, monkeypatch):
+    work_items = work_dir / "work-items.jsonl"
+    work_items.write_text(
+        "\n".join(
+            [
+                _work_item(work_dir, 0),
+                "",
+                "not json",
+                _work_item(work_dir, 2),
+                _work_item(work_dir, 1),
+            ]
+        )
+        + "\n"
+    )
+    results = work_dir / "results.jsonl"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["casper_harmony", "--worker", str(work_items), "--worker-results", str(results)],
+    )
+
+    cli.main(config(validate=False))
+
+    lines = [json.loads(line) for line in results.read_text().splitlines()]
+    assert [line["status"] for line in lines] == ["successful", "failed", "failed", "successful"]
+    assert "error" in lines[1]
+    # Item 2 has no STAC catalog
+    assert lines[2]["metadata_dir"].endswith("2") and "catalog.json" in lines[2]["error"]
+    for idx in range(2):
+        outputs = work_dir / "outputs" / str(idx)
+        assert (outputs / "catalog.json").exists()
+        assert not (outputs / "error.json").exists()
+    assert len(list((work_dir / "staging").glob("*.zip"))) == 2
+
+
+def test_worker_reads_stdin(work_dir, monkeypatch):
+    monkeypatch.setattr(sys, "stdin", io.StringIO(_work_item(work_dir, 0) + "\n"))
+    monkeypatch.setattr(sys, "stdout", io.StringIO())
+    monkeypatch.setattr(sys, "argv", ["casper_harmony", "--worker"])
+
+    cli.main(config(validate=False))
+
+    (line,) = sys.stdout.getvalue().splitlines()
+    assert json.loads(line)["status"] == "successful"
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "[]",
+        '{"input": "{}"}',
+        '{"metadata_dir": "/tmp/out"}',
+        '{"input": "{}", "metadata_dir": "/tmp/out", "queue": "x"}',
+    ],
+)
+def test_work_item_invalid(line):
+    with pytest.raises(ValueError):
+        WorkItem.from_json(line)
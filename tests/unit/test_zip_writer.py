@@ -0,0 +1,168 @@
+import io
+import os
+import random
+import shutil
+import subprocess
+import zipfile
+import zlib
+
+import pytest
+
+import casper.zip_writer
+from casper.zip_writer import ZIP_DEFLATED, ZIP_STORED, ZIP_ZSTANDARD, ZipWriter, zstd_available
+
+
+def _csv_text(num_rows: int) -> bytes:
+    return b"".join(f"{i},{i * 0.25},{i % 7}\n".encode() for i in range(num_rows))
+
+
+@pytest.mark.parametrize("compression_threads", [1, 4])
+def test_zip_writer_round_trip(tmp_path, compression_threads):
+    csv_text = _csv_text(200_000)
+    zip_path = tmp_path / "out.zip"
+
+    with ZipWriter(zip_path, compression_threads=compression_threads) as zf:
+        with zf.open("data.csv") as member:
+            # Uneven writes exercise block boundaries
+            for start in range(0, len(csv_text), 100_003):
+                member.write(csv_text[start : start + 100_003])
+        zf.writestr("Readme.md", "# Readme\n")
+        zf.writestr("stored.txt", b"not compressed", compress_type=ZIP_STORED)
+
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        assert zip_ref.testzip() is None
+        assert zip_ref.namelist() == ["data.csv", "Readme.md", "stored.txt"]
+        assert zip_ref.read("data.csv") == csv_text
+        assert zip_ref.read("Readme.md") == b"# Readme\n"
+        assert zip_ref.read("stored.txt") == b"not compressed"
+        info = zip_ref.getinfo("data.csv")
+        assert info.compress_type == ZIP_DEFLATED
+        assert info.compress_size < len(csv_text) // 2
+        assert zip_ref.getinfo("stored.txt").compress_type == ZIP_STORED
+
+    if shutil.which("unzip"):
+        subprocess.run(["unzip", "-tq", str(zip_path)], check=True)
+
+
+def test_parallel_blocks_form_one_deflate_stream(monkeypatch):
+    monkeypatch.setattr(casper.zip_writer, "BLOCK_SIZE", 4096)
+    csv_text = _csv_text(20_000)
+    stream = io.BytesIO()
+
+    with ZipWriter(stream, compression_threads=3) as zf, zf.open("data.csv") as member:
+        member.write(csv_text)
+
+    zf_member = zf.members[0]
+    assert zf_member.file_size == len(csv_text)
+    assert zf_member.crc == zlib.crc32(csv_text)
+    with zipfile.ZipFile(stream) as zip_ref:
+        assert zip_ref.read("data.csv") == csv_text
+
+
+def test_zip_writer_to_unseekable_stream(tmp_path):
+    read_fd, write_fd = os.pipe()
+    csv_text = _csv_text(1000)
+    with os.fdopen(write_fd, "wb") as pipe_out, ZipWriter(pipe_out, compression_threads=2) as zf:
+        zf.writestr("data.csv", csv_text)
+    with os.fdopen(read_fd, "rb") as pipe_in:
+        archive = pipe_in.read()
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zip_ref:
+        assert zip_ref.read("data.csv") == csv_text
+
+
+def test_zip64_end_of_central_directory(monkeypatch):
+    monkeypatch.setattr(casper.zip_writer, "_ZIP_FILECOUNT_LIMIT", 2)
+    stream = io.BytesIO()
+    with ZipWriter(stream) as zf:
+        for i in range(3):
+            zf.writestr(f"{i}.txt", str(i))
+
+    assert b"PK\x06\x06" in stream.getvalue()
+    with zipfile.ZipFile(stream) as zip_ref:
+        assert [zip_ref.read(f"{i}.txt") for i in range(3)] == [b"0", b"1", b"2"]
+
+
+def test_zip_writer_one_member_at_a_time():
+    with ZipWriter(io.BytesIO()) as zf, zf.open("a.txt"), pytest.raises(ValueError):
+        zf.open("b.txt")
+
+
+def test_zip_writer_invalid_threads():
+    with pytest.raises(ValueError):
+        ZipWriter(io.BytesIO(), compression_threads=0)
+
+
+@pytest.mark.parametrize("compression_threads", [1, 3])
+def test_stored_archive_skips_compression(tmp_path, monkeypatch, compression_threads):
+    def fail(*args, **kwargs):
+        raise AssertionError("stored members must not be compressed")
+
+    monkeypatch.setattr(casper.zip_writer, "COPY_BUFFER_SIZE", 4096)
+    monkeypatch.setattr(casper.zip_writer.zlib, "compressobj", fail)
+    monkeypatch.setattr(casper.zip_writer, "_deflate_block", fail)
+    csv_text = _csv_text(5000)
+    src = tmp_path / "data.csv"
+    src.write_bytes(csv_text)
+    stream = io.BytesIO()
+
+    with ZipWriter(stream, compression_threads, compression=ZIP_STORED) as zf:
+        # The reused copy buffer must not leak between chunks
+        zf.write(src, "data.csv")
+        zf.writestr("Readme.md", "# Readme\n")
+
+    member = zf.members[0]
+    assert member.compress_size == member.file_size == len(csv_text)
+    assert member.crc == zlib.crc32(csv_text)
+    with zipfile.ZipFile(stream) as zip_ref:
+        assert zip_ref.testzip() is None
+        assert zip_ref.read("data.csv") == csv_text
+        assert {info.compress_type for info in zip_ref.infolist()} == {ZIP_STORED}
+
+
+def test_deflate_compression_level():
+    rng = random.Random(0)
+    csv_text = b"".join(
+        f"{rng.random():.6f},{rng.randrange(100)}\n".encode() for _ in range(50_000)
+    )
+    sizes = {}
+    for level in (1, 9):
+        stream = io.BytesIO()
+        with ZipWriter(stream, compresslevel=level) as zf:
+            zf.writestr("data.csv", csv_text)
+        sizes[level] = zf.members[0].compress_size
+        with zipfile.ZipFile(stream) as zip_ref:
+            assert zip_ref.read("data.csv") == csv_text
+
+    assert sizes[9] < sizes[1]
+
+
+@pytest.mark.parametrize(
+    "compression, compresslevel",
+    [(ZIP_DEFLATED, 0), (ZIP_DEFLATED, 10), (ZIP_STORED, 5), (ZIP_ZSTANDARD, 23), (12, None)],
+)
+def test_zip_writer_invalid_compression(compression, compresslevel):
+    with pytest.raises(ValueError):
+        ZipWriter(io.BytesIO(), compresslevel=compresslevel, compression=compression)
+
+
+@pytest.mark.skipif(not zstd_available(), reason="Zstandard is not available")
+def test_zstandard_members():
+    csv_text = _csv_text(50_000)
+    stream = io.BytesIO()
+    with ZipWriter(stream, compression_threads=2, compression=ZIP_ZSTANDARD) as zf:
+        zf.writestr("data.csv", csv_text)
+
+    member = zf.members[0]
+    assert member.version == 63
+    assert member.compress_size < len(csv_text) // 2
+    if not hasattr(zipfile, "ZIP_ZSTANDARD"):
+        pytest.skip("zipfile cannot read Zstandard members")
+    with zipfile.ZipFile(stream) as zip_ref:
+        assert zip_ref.read("data.csv") == csv_text
+
+
+@pytest.mark.skipif(zstd_available(), reason="Zstandard is available")
+def test_zstandard_unavailable():
+    with pytest.raises(ValueError, match="zstandard"):
+        ZipWriter(io.BytesIO(), compression=ZIP_ZSTANDARD)